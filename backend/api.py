@@ -5,24 +5,66 @@ Couches: API → Services → Database
 from flask import Flask, jsonify, request
 from flask_cors import CORS
 from datetime import datetime, date
+from typing import Optional
 import os
 import sys
 
 # Ajouter le répertoire backend au path
 sys.path.append(os.path.dirname(__file__))
 
-from database import DatabaseManager
+from database import DatabaseManager, FAVORITE_COLUMNS
 from services.meal_service import MealService
 from services.plan_service import PlanService
+from services.shopping_service import ShoppingListService, DEFAULT_SERVINGS
 from models import UserPreferences, CuisineType, BudgetLevel
+from security import require_admin
+from http_cache import conditional
+from metrics import instrument_app, render_metrics
+from tracing import install_tracing
+from serialization import (install_json_provider, api_meal_rows, meal_rows, format_meal, stream_response,
+                           parse_fields, field_columns, project_fields, MEAL_FIELDS, PLAN_FIELDS)
 
 app = Flask(__name__)
 CORS(app)
+install_json_provider(app)
+instrument_app(app)
+install_tracing(app)
 
 # Initialisation des services
 db_manager = DatabaseManager()
 meal_service = MealService(db_manager)
 plan_service = PlanService(db_manager)
+shopping_service = ShoppingListService(db_manager)
+
+# Index de récence chargé au démarrage du worker
+db_manager.recency_index.load()
+
+# Reconstruction périodique de l'index de recommandation (optionnelle)
+if os.getenv('RECOMMENDATION_REBUILD_ENABLED', 'false').lower() == 'true':
+    from services.recommendation_index import IndexRebuilder
+    IndexRebuilder(db_manager, float(os.getenv('RECOMMENDATION_REBUILD_INTERVAL', '3600'))).start()
+
+# Profilage statistique permanent des requêtes (optionnel)
+sampling_profiler = None
+if os.getenv('SAMPLING_PROFILER_ENABLED', 'false').lower() == 'true':
+    from sampling_profiler import SamplingProfiler
+    sampling_profiler = SamplingProfiler()
+    sampling_profiler.install(app)
+    sampling_profiler.start()
+
+# Pré-génération des brouillons pendant les heures creuses (optionnelle)
+if os.getenv('DRAFT_SCHEDULER_ENABLED', 'false').lower() == 'true':
+    from services.draft_service import DraftScheduler
+    DraftScheduler(db_manager).start()
+
+# Nombre maximal de variations renvoyées par requête
+MAX_VARIATIONS = 20
+
+# Nombre maximal de sous-requêtes d'un appel /api/batch
+MAX_BATCH_REQUESTS = 20
+
+# En-têtes de la requête /api/batch transmis à chaque sous-requête
+BATCH_INHERITED_HEADERS = ('X-Admin-Token',)
 
 def validate_required_fields(data: dict, required_fields: list) -> tuple[bool, str]:
     """Valide que tous les champs requis sont présents"""
@@ -31,67 +73,62 @@ def validate_required_fields(data: dict, required_fields: list) -> tuple[bool, s
         return False, f"Champs manquants: {', '.join(missing_fields)}"
     return True, ""
 
+def requested_fields(allowed) -> tuple[Optional[list], str]:
+    """Champs demandés par ?fields= (None : tous), ou message d'erreur"""
+    try:
+        return parse_fields(request.args.get('fields'), allowed), ""
+    except ValueError as e:
+        return None, str(e)
+
+def parse_preferences(preferences_data: dict) -> UserPreferences:
+    """Convertit les préférences reçues en UserPreferences"""
+    return UserPreferences(
+        cuisines=[CuisineType(c) for c in preferences_data.get('cuisines', ['cameroun'])],
+        budget=BudgetLevel(preferences_data.get('budget', 'modéré')),
+        light=preferences_data.get('light', False),
+        vegetarian=preferences_data.get('vegetarian', False)
+    )
+
+def table_validator(*tables: str):
+    """Validateurs HTTP d'une réponse qui ne dépend que de tables entières"""
+    def validator(*args, **kwargs):
+        versions = db_manager.get_table_versions(list(tables))
+        etag = '-'.join(f"{table}.{versions[table][0]}" for table in tables)
+        return etag, max(versions[table][1] for table in tables)
+    return validator
+
+def plan_validator(plan_id: int):
+    """Validateurs HTTP d'une réponse qui ne dépend que d'un plan et de ses repas"""
+    version = db_manager.get_plan_content_version(plan_id)
+    return (f"plan-{plan_id}.{version[0]}", version[1]) if version else None
+
+def shopping_list_validator(plan_id: int):
+    """Validateur de la liste de courses (dépend aussi des ingrédients et des portions)"""
+    servings = request.args.get('servings', DEFAULT_SERVINGS, type=int)
+    etag = shopping_service.get_plan_etag(plan_id, servings)
+    return (etag, None) if etag else None
+
 def format_meal_response(meal_data: dict) -> dict:
     """Formate une réponse de repas pour l'API"""
-    # Déterminer le type de repas basé sur meal_type
-    meal_type_map = {
-        'Petit-déjeuner': 'DÉJEUNER',
-        'Déjeuner': 'DÉJEUNER', 
-        'Dîner': 'DÎNER'
-    }
-    
-    meal_type = meal_type_map.get(meal_data.get('meal_type', 'Dîner'), 'DÎNER')
-    
-    # Heure par défaut selon le type
-    time_map = {
-        'DÉJEUNER': '12:00',
-        'DÎNER': '19:00'
-    }
-    
-    return {
-        'id': meal_data['id'],
-        'type': meal_type,
-        'time': time_map.get(meal_type, '19:00'),
-        'name': meal_data['recipe_name'],
-        'calories': f"{meal_data['prep_time'] * 10 + meal_data['cook_time'] * 5} kcal" if meal_data['prep_time'] and meal_data['cook_time'] else "N/A",
-        'weight': f"{meal_data['prep_time'] * 15} gm" if meal_data['prep_time'] else "N/A",
-        'image': meal_data['image_url'] or None,
-        'isEditable': True,
-        'jowId': meal_data['jow_recipe_id'],
-        'url': meal_data['jow_recipe_url'],
-        'videoUrl': meal_data.get('video_url'),
-        'ingredient': meal_data['main_ingredient'],
-        'cuisine': meal_data['cuisine_type'],
-        'prepTime': meal_data['prep_time'],
-        'cookTime': meal_data['cook_time'],
-        'isFavorite': bool(meal_data['is_favorite']),
-        'rating': meal_data['rating'] or 0,
-        'notes': meal_data['notes'],
-        'dayOfWeek': meal_data['day_of_week'],
-        'mealType': meal_data.get('meal_type', 'Dîner')
-    }
+    return format_meal(meal_data)
 
 # ============================================================================
 # ENDPOINTS PLANS
 # ============================================================================
 
 @app.route('/api/plans', methods=['GET'])
+@conditional(table_validator('weekly_plans'))
 def get_plans():
     """Récupère tous les plans hebdomadaires"""
     try:
-        plans_data = plan_service.get_plans()
+        fields, error = requested_fields(PLAN_FIELDS)
+        if error:
+            return jsonify({'error': error}), 400
+        fields = fields or list(PLAN_FIELDS)
         # Formater les plans pour correspondre au format frontend
-        formatted_plans = []
-        for plan in plans_data:
-            formatted_plans.append({
-                'id': plan['id'],
-                'planName': plan['plan_name'],
-                'weekStartDate': plan['week_start_date'],
-                'totalBudgetEstimate': plan['total_budget_estimate'],
-                'generatedByAi': bool(plan['generated_by_ai']),
-                'createdAt': plan['created_at']
-            })
-        return jsonify(formatted_plans)
+        format_plan = project_fields(fields, PLAN_FIELDS)
+        plans_data = plan_service.get_plans(columns=field_columns(fields, PLAN_FIELDS))
+        return jsonify([format_plan(plan) for plan in plans_data])
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -108,16 +145,7 @@ def create_plan():
             return jsonify({'error': error_msg}), 400
         
         # Conversion des préférences
-        preferences_data = data.get('preferences', {})
-        cuisines = [CuisineType(c) for c in preferences_data.get('cuisines', ['cameroun'])]
-        budget = BudgetLevel(preferences_data.get('budget', 'modéré'))
-        
-        preferences = UserPreferences(
-            cuisines=cuisines,
-            budget=budget,
-            light=preferences_data.get('light', False),
-            vegetarian=preferences_data.get('vegetarian', False)
-        )
+        preferences = parse_preferences(data.get('preferences', {}))
         
         # Création du plan
         plan_id = plan_service.create_plan(
@@ -133,6 +161,7 @@ def create_plan():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/plans/<int:plan_id>', methods=['GET'])
+@conditional(table_validator('weekly_plans'))
 def get_plan(plan_id):
     """Récupère un plan par son ID"""
     try:
@@ -164,17 +193,41 @@ def get_plan_statistics(plan_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/plans/analysis', methods=['POST'])
+def analyze_plans():
+    """Analyse (statistiques, budget, score qualité) de plusieurs plans en une requête"""
+    try:
+        data = request.get_json(silent=True) or {}
+        plan_ids = data.get('planIds')
+        if plan_ids is None:
+            plan_ids = [plan['id'] for plan in plan_service.get_plans(data.get('limit', 100))]
+        
+        if not isinstance(plan_ids, list) or not all(isinstance(i, int) for i in plan_ids):
+            return jsonify({'error': 'planIds doit être une liste d\'entiers'}), 400
+        if len(plan_ids) > 1000:
+            return jsonify({'error': 'Maximum 1000 plans par requête'}), 400
+        
+        analyses = plan_service.analyze_plans(plan_ids)
+        return jsonify({str(plan_id): analysis for plan_id, analysis in analyses.items()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ============================================================================
 # ENDPOINTS REPAS
 # ============================================================================
 
 @app.route('/api/plans/<int:plan_id>/meals', methods=['GET'])
+@conditional(plan_validator)
 def get_plan_meals(plan_id):
-    """Récupère les repas d'un plan"""
+    """Récupère les repas d'un plan (?fields= : champs à renvoyer)"""
     try:
-        meals_data = meal_service.get_meals_by_plan(plan_id)
-        meals = [format_meal_response(meal) for meal in meals_data]
-        return jsonify(meals)
+        fields, error = requested_fields(MEAL_FIELDS)
+        if error:
+            return jsonify({'error': error}), 400
+        if fields is None:
+            return jsonify(meal_service.get_meals_by_plan(plan_id, api_meal_rows))
+        return jsonify(meal_service.get_meals_by_plan(plan_id, meal_rows(fields),
+                                                      field_columns(fields, MEAL_FIELDS)))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -250,12 +303,17 @@ def delete_meal(meal_id):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/meals', methods=['GET'])
+@conditional(table_validator('meal_slots'), negotiated=True)
 def get_all_meals():
-    """Récupère tous les repas"""
+    """Récupère tous les repas (?fields= : champs à renvoyer)"""
     try:
-        meals_data = meal_service.get_all_meals()
-        meals = [format_meal_response(meal) for meal in meals_data]
-        return jsonify(meals)
+        fields, error = requested_fields(MEAL_FIELDS)
+        if error:
+            return jsonify({'error': error}), 400
+        if fields is None:
+            return stream_response(meal_service.iter_all_meals(api_meal_rows))
+        return stream_response(meal_service.iter_all_meals(meal_rows(fields),
+                                                           columns=field_columns(fields, MEAL_FIELDS)))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -307,6 +365,7 @@ def get_current_meal():
 # ============================================================================
 
 @app.route('/api/statistics', methods=['GET'])
+@conditional(table_validator('weekly_plans', 'meal_slots'))
 def get_statistics():
     """Récupère les statistiques globales"""
     try:
@@ -326,11 +385,40 @@ def get_statistics():
 # ============================================================================
 
 @app.route('/api/plans/<int:plan_id>/shopping-list', methods=['GET'])
+@conditional(shopping_list_validator)
 def get_shopping_list(plan_id):
-    """Génère une liste de courses pour un plan"""
+    """Génère une liste de courses pour un plan (?servings= portions par repas)"""
+    try:
+        servings = request.args.get('servings', DEFAULT_SERVINGS, type=int)
+        if servings < 1:
+            return jsonify({'error': 'servings doit être positif'}), 400
+        
+        result = shopping_service.get_plan_list(plan_id, servings)
+        if result is None:
+            return jsonify({'error': 'Plan non trouvé'}), 404
+        shopping_list, etag = result
+        response = jsonify(shopping_list)
+        response.set_etag(etag)
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/shopping-list', methods=['GET'])
+def get_shopping_list_for_range():
+    """Liste de courses de tous les repas planifiés entre ?start= et ?end= (AAAA-MM-JJ)"""
     try:
-        ingredients = meal_service.generate_shopping_list(plan_id)
-        return jsonify(ingredients)
+        try:
+            start_date = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.args['end'], '%Y-%m-%d').date()
+        except (KeyError, ValueError):
+            return jsonify({'error': 'Paramètres start et end requis (AAAA-MM-JJ)'}), 400
+        if end_date < start_date:
+            return jsonify({'error': 'end doit suivre start'}), 400
+        
+        servings = request.args.get('servings', DEFAULT_SERVINGS, type=int)
+        if servings < 1:
+            return jsonify({'error': 'servings doit être positif'}), 400
+        return jsonify(shopping_service.get_range_list(start_date, end_date, servings))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -339,19 +427,14 @@ def get_shopping_list(plan_id):
 # ============================================================================
 
 @app.route('/api/favorites', methods=['GET'])
+@conditional(table_validator('favorites'), negotiated=True)
 def get_favorites():
-    """Récupère les favoris"""
+    """Récupère les favoris (?fields= : colonnes à renvoyer)"""
     try:
-        with db_manager.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT jow_recipe_id, recipe_name, main_ingredient, cuisine_type, 
-                       image_url, added_date
-                FROM favorites
-                ORDER BY added_date DESC
-            """)
-            favorites = [dict(row) for row in cursor.fetchall()]
-            return jsonify(favorites)
+        fields, error = requested_fields(FAVORITE_COLUMNS)
+        if error:
+            return jsonify({'error': error}), 400
+        return stream_response(meal_service.iter_favorites(columns=fields or FAVORITE_COLUMNS))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -367,10 +450,87 @@ def remove_from_favorites(meal_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ============================================================================
+# ENDPOINT BATCH
+# ============================================================================
+
+def run_sub_request(item: dict, inherited_headers: dict) -> dict:
+    """Exécute une sous-requête de /api/batch sur les routes de l'application"""
+    if not isinstance(item, dict):
+        return {'status': 400, 'body': {'error': 'Sous-requête invalide'}}
+    path = str(item.get('path', ''))
+    method = str(item.get('method', 'GET')).upper()
+    if not path.startswith('/api/') or path.split('?')[0].rstrip('/') == '/api/batch':
+        return {'status': 400, 'body': {'error': f"Chemin invalide: {path}"}}
+
+    headers = dict(inherited_headers)
+    headers.update(item.get('headers') or {})
+    body = {'json': item['body']} if item.get('body') is not None else {}
+    try:
+        with app.test_request_context(path, method=method, headers=headers, **body):
+            response = app.full_dispatch_request()
+    except Exception as e:
+        print(f"Erreur sous-requête {method} {path}: {e}")
+        return {'status': 500, 'body': {'error': str(e)}}
+
+    result = {
+        'status': response.status_code,
+        'body': response.get_json(silent=True) if response.is_json else (response.get_data(as_text=True) or None)
+    }
+    if 'ETag' in response.headers:
+        result['etag'] = response.headers['ETag']
+    return result
+
+@app.route('/api/batch', methods=['POST'])
+def batch_requests():
+    """Exécute plusieurs requêtes en un appel, sur une seule connexion à la base.
+    
+    Corps: {"requests": [{"method": "GET", "path": "/api/plans", "body": {...}, "headers": {...}}]}
+    Réponse: un résultat {status, body, etag} par sous-requête, dans l'ordre.
+    Un lot de lectures seules partage aussi une transaction (même état de la base).
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items = data.get('requests') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Liste de sous-requêtes manquante'}), 400
+        if len(items) > MAX_BATCH_REQUESTS:
+            return jsonify({'error': f"Au plus {MAX_BATCH_REQUESTS} sous-requêtes par lot"}), 400
+
+        inherited_headers = {name: request.headers[name] for name in BATCH_INHERITED_HEADERS
+                             if name in request.headers}
+        read_only = all(isinstance(item, dict) and str(item.get('method', 'GET')).upper() == 'GET'
+                        for item in items)
+        with db_manager.shared_connection(read_transaction=read_only):
+            results = [run_sub_request(item, inherited_headers) for item in items]
+        return jsonify(results)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ============================================================================
 # HEALTH CHECK
 # ============================================================================
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Métriques au format texte Prometheus (agrégées sur tous les workers gunicorn)"""
+    body, content_type = render_metrics()
+    return app.response_class(body, content_type=content_type)
+
+@app.route('/api/admin/profile/stacks', methods=['GET'])
+@require_admin
+def get_sampled_stacks():
+    """Piles échantillonnées de tous les workers, au format collapsed stacks (flamegraph)"""
+    if sampling_profiler is None:
+        return jsonify({'error': 'Profilage échantillonné désactivé (SAMPLING_PROFILER_ENABLED)'}), 404
+    try:
+        response = app.response_class(sampling_profiler.merged(), mimetype='text/plain')
+        response.headers['X-Profiler-Samples'] = str(sampling_profiler.samples)
+        response.headers['X-Profiler-Overhead'] = f"{sampling_profiler.overhead():.4f}"
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Vérification de l'état de l'API"""
@@ -380,6 +540,15 @@ def health_check():
         'version': '2.0'
     })
 
+@app.route('/api/rules', methods=['GET'])
+def get_planning_rules():
+    """Retourne le jeu de règles de planification actif (version comprise)"""
+    try:
+        from services.rule_engine import rule_registry
+        return jsonify(rule_registry.get().to_dict())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ===== ENDPOINTS IA =====
 
 @app.route('/api/ai/generate-plan', methods=['POST'])
@@ -395,22 +564,15 @@ def generate_ai_plan():
             return jsonify({'error': error_msg}), 400
         
         # Conversion des préférences
-        preferences_data = data.get('preferences', {})
-        cuisines = [CuisineType(c) for c in preferences_data.get('cuisines', ['cameroun'])]
-        budget = BudgetLevel(preferences_data.get('budget', 'modéré'))
-        
-        preferences = UserPreferences(
-            cuisines=cuisines,
-            budget=budget,
-            light=preferences_data.get('light', False),
-            vegetarian=preferences_data.get('vegetarian', False)
-        )
+        preferences = parse_preferences(data.get('preferences', {}))
         
         # Génération du plan avec IA (utilise maintenant plan_service directement)
         result = plan_service.generate_ai_plan(
             preferences,
             data['planName'],
-            date.fromisoformat(data['weekStartDate'])
+            date.fromisoformat(data['weekStartDate']),
+            include_lunch=data.get('includeLunch', False),
+            dry_run=bool(data.get('dryRun', False))
         )
         
         return jsonify(result)
@@ -418,30 +580,116 @@ def generate_ai_plan():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ai/generate-plans', methods=['POST'])
+@require_admin
+def generate_ai_plans_batch():
+    """Génère en lot les plannings de plusieurs foyers pour une même semaine.
+    
+    Résolution dans le worker, sans pool de processus (MAX_BATCH_SIZE foyers au plus) :
+    les lots plus importants passent par scripts/generate_batch_plans.py.
+    """
+    try:
+        from services.batch_planner import BatchPlanner, HouseholdRequest, MAX_BATCH_SIZE
+        data = request.get_json() or {}
+        
+        required_fields = ['weekStartDate', 'households']
+        is_valid, error_msg = validate_required_fields(data, required_fields)
+        if not is_valid:
+            return jsonify({'error': error_msg}), 400
+        
+        households = data['households']
+        if not isinstance(households, list) or not households:
+            return jsonify({'error': 'households doit être une liste non vide'}), 400
+        if len(households) > MAX_BATCH_SIZE:
+            return jsonify({'error': f'Maximum {MAX_BATCH_SIZE} foyers par lot '
+                                     '(lots plus importants : scripts/generate_batch_plans.py)'}), 400
+        
+        week_start_date = date.fromisoformat(data['weekStartDate'])
+        requests_ = [HouseholdRequest(
+            plan_name=h.get('planName') or f"Planning {i + 1} - {week_start_date.isoformat()}",
+            preferences=parse_preferences(h.get('preferences', {})),
+            include_lunch=h.get('includeLunch', False)
+        ) for i, h in enumerate(households)]
+        
+        result = BatchPlanner(db_manager, workers=1).generate(requests_, week_start_date,
+                                                              dry_run=bool(data.get('dryRun', False)))
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/drafts/pregenerate', methods=['POST'])
+@require_admin
+def pregenerate_drafts():
+    """Pré-génère les brouillons de la semaine suivante pour les profils actifs"""
+    try:
+        from services.draft_service import DraftService
+        data = request.get_json(silent=True) or {}
+        week_start_date = date.fromisoformat(data['weekStartDate']) if data.get('weekStartDate') else None
+        return jsonify(DraftService(db_manager).pregenerate(week_start_date))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/plans/accept', methods=['POST'])
+def accept_plan_preview():
+    """Enregistre un aperçu de plan (dryRun) accepté, en une seule transaction"""
+    try:
+        data = request.get_json() or {}
+        
+        required_fields = ['planName', 'weekStartDate', 'meals']
+        is_valid, error_msg = validate_required_fields(data, required_fields)
+        if not is_valid:
+            return jsonify({'error': error_msg}), 400
+        
+        meals = data['meals']
+        if not isinstance(meals, list) or not meals:
+            return jsonify({'error': 'meals doit être une liste non vide'}), 400
+        for meal in meals:
+            if not isinstance(meal, dict) or not meal.get('recipe_name') or not meal.get('day_of_week'):
+                return jsonify({'error': 'Chaque repas doit avoir recipe_name et day_of_week'}), 400
+        
+        result = plan_service.save_generated_plan(
+            data['planName'],
+            date.fromisoformat(data['weekStartDate']),
+            meals
+        )
+        return jsonify(result), 201
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/ai/meal-variations/<int:meal_id>', methods=['GET'])
 def get_meal_variations(meal_id):
-    """Suggère des variations d'un repas avec l'IA"""
+    """Suggère des variations d'un repas : recettes proches du catalogue, IA en option (?ai=true)"""
     try:
-        # Récupérer les préférences par défaut (à améliorer avec authentification)
-        preferences = UserPreferences(
-            cuisines=[CuisineType.CAMEROUN],
-            budget=BudgetLevel.MODERATE,
-            light=False,
-            vegetarian=False
-        )
+        meal_data = meal_service.get_meal_by_id(meal_id)
+        if not meal_data:
+            return jsonify({'error': 'Repas non trouvé'}), 404
         
-        # Utiliser directement ai_service
-        from services.ai_service import AIService
-        ai_service = AIService()
+        k = max(1, min(request.args.get('k', 3, type=int), MAX_VARIATIONS))
         
-        meal_data = db_manager.get_plan_meals(None)  # À adapter pour récupérer meal_id
-        variations = ai_service.suggest_meal_variations(meal_data if meal_data else {}, preferences)
+        from services.hybrid_recipe_service import HybridRecipeService
+        variations = HybridRecipeService(db_manager).get_similar_recipes(meal_data, k)
         
-        return jsonify({
+        response = {
             'success': True,
             'variations': variations,
-            'ai_model': 'gemini-2.0-flash'
-        })
+            'source': 'local'
+        }
+        
+        if request.args.get('ai', 'false').lower() == 'true':
+            # Récupérer les préférences par défaut (à améliorer avec authentification)
+            preferences = UserPreferences(
+                cuisines=[CuisineType.CAMEROUN],
+                budget=BudgetLevel.MODERATE,
+                light=False,
+                vegetarian=False
+            )
+            from services.ai_service import AIService
+            response['ai_variations'] = AIService().suggest_meal_variations(meal_data, preferences)
+            response['ai_model'] = 'gemini-2.0-flash'
+        
+        return jsonify(response)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -457,14 +705,22 @@ def optimize_shopping_list(plan_id):
         from services.ai_service import AIService
         ai_service = AIService()
         
-        shopping_list = meal_service.generate_shopping_list(plan_id)
-        optimization = ai_service.generate_shopping_optimization(shopping_list, budget)
+        # Liste enregistrée (reconstruite seulement si le plan a changé)
+        result = shopping_service.get_plan_list(plan_id)
+        if result is None:
+            return jsonify({'error': 'Plan non trouvé'}), 404
+        shopping_list, etag = result
+        labels = [item['label'] for item in shopping_list['items']]
+        optimization = ai_service.generate_shopping_optimization(labels, budget)
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'optimization': optimization,
+            'shopping_list': shopping_list,
             'ai_model': 'gemini-2.0-flash'
         })
+        response.set_etag(etag)
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -489,16 +745,58 @@ def analyze_nutrition(plan_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/ai/plan-insights/<int:plan_id>', methods=['GET'])
+def get_plan_insights(plan_id):
+    """Analyse nutrition, courses et variations d'un plan en un seul appel IA"""
+    try:
+        budget = request.args.get('budget', 50.0, type=float)
+        
+        # Préférences par défaut (à améliorer avec authentification)
+        preferences = UserPreferences(
+            cuisines=[CuisineType.CAMEROUN],
+            budget=BudgetLevel.MODERATE,
+            light=False,
+            vegetarian=False
+        )
+        
+        from services.ai_service import AIService
+        
+        # Cache vérifié avant toute lecture des repas : la version du plan suffit
+        plan_version = shopping_service.get_plan_etag(plan_id)
+        if plan_version is None:
+            return jsonify({'error': 'Plan non trouvé'}), 404
+        insights = AIService.get_cached_plan_insights(plan_version, budget, preferences)
+        if insights is None:
+            ai_service = AIService()
+            meals = meal_service.get_meals_by_plan(plan_id)
+            shopping_list = meal_service.generate_shopping_list(plan_id)
+            insights = ai_service.generate_plan_insights(meals, shopping_list, budget, preferences,
+                                                         plan_version=plan_version)
+        
+        return jsonify({
+            'success': True,
+            'analysis': insights['analysis'],
+            'optimization': insights['optimization'],
+            'variations': {str(meal_id): v for meal_id, v in insights['variations'].items()},
+            'ai_model': 'gemini-2.0-flash'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/ai/regenerate-day/<int:plan_id>', methods=['POST'])
 def regenerate_plan_day(plan_id):
     """Régénère les repas d'un jour spécifique avec l'IA"""
     try:
         data = request.get_json()
-        day_of_week = data.get('day_of_week')
+        days = data.get('days') or ([data['day_of_week']] if data.get('day_of_week') else [])
         
-        if not day_of_week:
+        if not days:
             return jsonify({'error': 'day_of_week requis'}), 400
         
+        if not plan_service.get_plan_by_id(plan_id):
+            return jsonify({'error': 'Plan non trouvé'}), 404
+        
         # Préférences par défaut
         preferences = UserPreferences(
             cuisines=[CuisineType.CAMEROUN],
@@ -507,35 +805,53 @@ def regenerate_plan_day(plan_id):
             vegetarian=False
         )
         
-        # Récupérer les repas du jour et les supprimer
-        meals = meal_service.get_meals_by_plan(plan_id)
-        for meal in meals:
-            if meal['day_of_week'] == day_of_week:
-                meal_service.delete_meal(meal['id'])
-        
-        # Générer de nouveaux repas (logique simplifiée)
-        from services.hybrid_recipe_service import HybridRecipeService
-        hybrid_service = HybridRecipeService(db_manager)
-        
-        # Générer une recette pour le jour
-        weekly_recipes = hybrid_service.generate_weekly_plan_recipes(preferences, plan_id)
-        day_meals = [r for r in weekly_recipes if r.get('day_of_week') == day_of_week]
-        
-        added_count = 0
-        for meal_data in day_meals:
-            meal_service.add_meal(meal_data)
-            added_count += 1
+        # Générer uniquement les jours demandés puis échanger les repas en une transaction
+        result = plan_service.regenerate_days(plan_id, days, preferences,
+                                              include_lunch=data.get('includeLunch', False))
         
         return jsonify({
             'success': True,
-            'day_of_week': day_of_week,
-            'meals_added': added_count,
+            'day_of_week': days[0],
+            'days': days,
+            'meals_added': len(result['meals']),
+            'meals': [meal for meal in meal_service.get_meals_by_plan(plan_id, api_meal_rows)
+                      if meal['dayOfWeek'] in days],
             'ai_model': 'gemini-2.0-flash'
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/plans/<int:plan_id>/replan', methods=['POST'])
+def replan_plan(plan_id):
+    """Re-planifie un plan existant à partir d'un diff (préférences, recettes bannies, jours verrouillés)"""
+    try:
+        data = request.get_json() or {}
+        
+        if not plan_service.get_plan_by_id(plan_id):
+            return jsonify({'error': 'Plan non trouvé'}), 404
+        
+        banned_recipes = data.get('bannedRecipes', [])
+        locked_days = data.get('lockedDays', [])
+        if not isinstance(banned_recipes, list) or not isinstance(locked_days, list):
+            return jsonify({'error': 'bannedRecipes et lockedDays doivent être des listes'}), 400
+        
+        result = plan_service.replan(
+            plan_id,
+            parse_preferences(data.get('preferences', {})),
+            banned_recipes=[str(r) for r in banned_recipes],
+            locked_days=locked_days
+        )
+        
+        # Seuls les créneaux modifiés sont renvoyés
+        changed_ids = {slot['meal_id'] for slot in result['changed_slots']}
+        result['meals'] = [meal for meal in meal_service.get_meals_by_plan(plan_id, api_meal_rows)
+                           if meal['id'] in changed_ids]
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     print("Demarrage de l'API JowAfrique sur http://localhost:5000")
     print("Frontend Next.js: http://localhost:3000")
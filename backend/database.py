@@ -1,31 +1,164 @@
 """
 Gestion de la base de données SQLite
 """
+import re
 import sqlite3
 import os
-from typing import List, Optional, Dict, Any
-from contextlib import contextmanager
+import time
+import threading
+from datetime import date, datetime
+from typing import List, Optional, Dict, Any, Callable, Iterator, Sequence
+from contextlib import contextmanager, ExitStack
 from models import Meal, WeeklyPlan, Statistics, MealType, CuisineType
+from recency_index import RecencyIndex
+from ingredient_units import normalize_quantity, parse_ingredient
+from metrics import InstrumentedConnection, DB_CONNECTIONS_OPEN, DB_CONNECTIONS_OPENED
+
+DAYS_OF_WEEK = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+# Horodatage SQL (UTC, à la milliseconde) des compteurs de version
+NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+# Portions par défaut d'une recette dont le nombre de couverts est inconnu
+DEFAULT_RECIPE_SERVINGS = 4
+
+# Moyenne bayésienne des notes : a priori de RATING_PRIOR_WEIGHT notes à RATING_PRIOR_MEAN
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 5
+
+# Version du schéma (PRAGMA user_version) : à incrémenter à chaque modification de init_database
+# 2 : meal_slots.plan_id et day_of_week acceptent NULL (recettes du catalogue)
+SCHEMA_VERSION = 2
+
+# Lignes lues par fetchmany lors des lectures en flux
+STREAM_BATCH_SIZE = 500
+
+# Colonnes lues par défaut (listes de repas, de plans, de favoris)
+MEAL_COLUMNS = ('id', 'day_of_week', 'meal_type', 'recipe_name', 'jow_recipe_id', 'jow_recipe_url',
+                'main_ingredient', 'cuisine_type', 'image_url', 'video_url', 'prep_time',
+                'cook_time', 'is_favorite', 'rating', 'notes')
+PLAN_COLUMNS = ('id', 'plan_name', 'week_start_date', 'total_budget_estimate', 'generated_by_ai', 'created_at')
+FAVORITE_COLUMNS = ('jow_recipe_id', 'recipe_name', 'main_ingredient', 'cuisine_type', 'image_url', 'added_date')
+
+def normalize_text(value: Optional[str]) -> str:
+    """Normalise un libellé (ingrédient, cuisine) pour les comparaisons"""
+    return (value or '').strip().lower()
 
 class DatabaseManager:
     def __init__(self, db_path: str = "jowafrique.db"):
         self.db_path = db_path
-        self.init_database()
+        self._local = threading.local()
+        self.ensure_schema()
+        self.recency_index = RecencyIndex(self)
+        self._similarity_index = None
+        self._similarity_lock = threading.Lock()
+    
+    @property
+    def similarity_index(self):
+        """Index des plongements du catalogue, créé au premier usage (numpy n'est pas chargé au démarrage)"""
+        if self._similarity_index is None:
+            with self._similarity_lock:
+                if self._similarity_index is None:
+                    from recipe_embeddings import RecipeSimilarityIndex
+                    self._similarity_index = RecipeSimilarityIndex(self)
+        return self._similarity_index
     
     @contextmanager
     def get_connection(self):
         """Context manager pour les connexions DB"""
-        conn = sqlite3.connect(self.db_path)
+        shared = getattr(self._local, 'connection', None)
+        if shared is not None:
+            # Connexion partagée du thread (voir shared_connection) : jamais fermée ici
+            try:
+                yield shared
+            except Exception:
+                shared.rollback()
+                raise
+            return
+        conn = sqlite3.connect(self.db_path, factory=InstrumentedConnection)
         conn.row_factory = sqlite3.Row
+        conn.create_function('normalize_text', 1, normalize_text, deterministic=True)
+        DB_CONNECTIONS_OPENED.inc()
+        DB_CONNECTIONS_OPEN.inc()
         try:
             yield conn
         finally:
             conn.close()
+            DB_CONNECTIONS_OPEN.dec()
+    
+    @contextmanager
+    def shared_connection(self, read_transaction: bool = True):
+        """Une seule connexion pour tous les get_connection du thread courant.
+        
+        Avec `read_transaction`, les lectures partagent une même transaction (même instantané
+        de la base). Les écritures non validées sont annulées à la sortie.
+        """
+        with self.get_connection() as conn:
+            if read_transaction:
+                conn.execute("BEGIN")
+            self._local.connection = conn
+            try:
+                yield conn
+            finally:
+                self._local.connection = None
+                conn.rollback()
+    
+    def iter_query_batches(self, query: str, params: Sequence[Any] = (),
+                           row_factory: Optional[Callable] = None,
+                           batch_size: int = STREAM_BATCH_SIZE) -> Iterator[List[Any]]:
+        """Lit le résultat d'une requête par lots de `batch_size` lignes (fetchmany).
+        
+        La requête est exécutée immédiatement, ses erreurs remontent donc à l'appelant ;
+        la connexion reste ouverte jusqu'à épuisement ou fermeture de l'itérateur.
+        """
+        stack = ExitStack()
+        conn = stack.enter_context(self.get_connection())
+        try:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            if row_factory:
+                cursor.row_factory = row_factory(cursor)
+            else:
+                columns = [column[0] for column in cursor.description]
+                cursor.row_factory = lambda _cursor, row: dict(zip(columns, row))
+        except Exception:
+            stack.close()
+            raise
+        
+        def batches():
+            with stack:
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        return
+                    yield batch
+        return batches()
     
-    def init_database(self):
-        """Initialise la base de données avec les tables"""
+    def schema_version(self) -> int:
+        """Version du schéma enregistrée dans la base (0 : base neuve ou antérieure au versionnement)"""
+        with self.get_connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+    
+    def ensure_schema(self) -> bool:
+        """Migre la base si elle n'est pas à SCHEMA_VERSION ; sinon une simple lecture, sans DDL"""
+        if self.schema_version() >= SCHEMA_VERSION:
+            return False
+        return self.init_database()
+    
+    def init_database(self) -> bool:
+        """Crée ou migre le schéma (tables, index, triggers, reprises) puis enregistre SCHEMA_VERSION.
+        
+        Exécuté une fois par scripts/migrate.py (lancé par gunicorn avant les workers) : ceux-ci
+        trouvent une base à jour. Renvoie False si un autre processus a déjà migré la base.
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            # Verrou d'écriture dès le début : deux processus ne migrent jamais en même temps
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("PRAGMA user_version")
+            if cursor.fetchone()[0] >= SCHEMA_VERSION:
+                conn.rollback()
+                return False
             
             # Table des plans hebdomadaires
             cursor.execute("""
@@ -61,6 +194,8 @@ class DatabaseManager:
                     FOREIGN KEY (plan_id) REFERENCES weekly_plans(id)
                 )
             """)
+            # Version 2 : plan_id et day_of_week NULL pour les recettes du catalogue
+            self._make_catalog_columns_nullable(cursor)
             
             # Table des favoris
             cursor.execute("""
@@ -102,13 +237,316 @@ class DatabaseManager:
                 )
             """)
             
+            # Profils de préférences (un par combinaison utilisée pour générer)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS preference_profiles (
+                    profile_key TEXT PRIMARY KEY,
+                    preferences TEXT NOT NULL,
+                    include_lunch BOOLEAN DEFAULT 0,
+                    last_used_at DATETIME NOT NULL
+                )
+            """)
+            
+            # Plannings pré-générés (brouillons) en attente de promotion
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS draft_plans (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    profile_key TEXT NOT NULL,
+                    week_start_date DATE NOT NULL,
+                    meals TEXT NOT NULL,
+                    catalog_version TEXT NOT NULL,
+                    rules_version INTEGER NOT NULL,
+                    created_at DATETIME NOT NULL,
+                    expires_at DATETIME NOT NULL,
+                    UNIQUE(profile_key, week_start_date)
+                )
+            """)
+            
+            # Baux des tâches de fond (un seul worker exécute une tâche à la fois)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS scheduler_leases (
+                    name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            
+            # Agrégats de notes par recette (toutes les copies planifiées)
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'recipe_ratings'")
+            ratings_exist = cursor.fetchone() is not None
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS recipe_ratings (
+                    recipe_name TEXT PRIMARY KEY,
+                    rating_count INTEGER NOT NULL DEFAULT 0,
+                    rating_sum REAL NOT NULL DEFAULT 0,
+                    bayesian_avg REAL NOT NULL
+                )
+            """)
+            if not ratings_exist:
+                cursor.execute(f"""
+                    INSERT INTO recipe_ratings (recipe_name, rating_count, rating_sum, bayesian_avg)
+                    SELECT recipe_name, COUNT(*), SUM(rating),
+                           ({self._bayesian_sql('SUM(rating)', 'COUNT(*)')})
+                    FROM meal_slots
+                    WHERE plan_id IS NOT NULL AND rating > 0
+                    GROUP BY recipe_name
+                """)
+            self._create_rating_triggers(cursor)
+            
             # Index pour les performances
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_weekly_plans_date ON weekly_plans(week_start_date DESC)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_meal_slots_plan ON meal_slots(plan_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_meal_slots_favorite ON meal_slots(is_favorite)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_meal_slots_recipe_name ON meal_slots(recipe_name)")
+            # Ordre des listes complètes : les lectures en flux renvoient leurs premières lignes sans tri préalable
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_meal_slots_day_type ON meal_slots(day_of_week, meal_type)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_favorites_added_date ON favorites(added_date DESC)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_history_date ON recipe_history(used_date DESC)")
             
+            # Lien historique -> repas (bases créées avant l'alimentation de recipe_history)
+            cursor.execute("PRAGMA table_info(recipe_history)")
+            if 'meal_slot_id' not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE recipe_history ADD COLUMN meal_slot_id INTEGER REFERENCES meal_slots(id)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_history_recipe ON recipe_history(recipe_name, used_date)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_history_meal ON recipe_history(meal_slot_id)")
+            
+            # Reprise des repas planifiés absents de l'historique
+            self._insert_history_for_plans(cursor)
+            
+            # Étiquettes des recettes du catalogue et leurs plongements (recherche de variations)
+            cursor.execute("PRAGMA table_info(meal_slots)")
+            if 'tags' not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE meal_slots ADD COLUMN tags TEXT")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS recipe_embeddings (
+                    recipe_id INTEGER PRIMARY KEY REFERENCES meal_slots(id),
+                    features BLOB NOT NULL,
+                    weights BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            cursor.execute("""
+                SELECT id FROM meal_slots m
+                WHERE plan_id IS NULL
+                AND NOT EXISTS (SELECT 1 FROM recipe_embeddings e WHERE e.recipe_id = m.id)
+            """)
+            for row in cursor.fetchall():
+                self._store_recipe_embedding(cursor, row[0])
+            
+            # Ingrédients normalisés et quantités par portion de chaque recette (par nom)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingredients (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL UNIQUE,
+                    display_name TEXT NOT NULL
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS recipe_ingredients (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    recipe_name TEXT NOT NULL,
+                    ingredient_id INTEGER NOT NULL REFERENCES ingredients(id),
+                    quantity REAL,
+                    unit TEXT NOT NULL,
+                    servings INTEGER NOT NULL,
+                    per_serving REAL,
+                    UNIQUE(recipe_name, ingredient_id, unit)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_recipe ON recipe_ingredients(recipe_name)")
+            
+            # Version du contenu des plans (listes de courses enregistrées dans shopping_lists)
+            cursor.execute("PRAGMA table_info(weekly_plans)")
+            plan_columns = {row[1] for row in cursor.fetchall()}
+            if 'content_version' not in plan_columns:
+                cursor.execute("ALTER TABLE weekly_plans ADD COLUMN content_version INTEGER NOT NULL DEFAULT 0")
+            if 'content_updated_at' not in plan_columns:
+                cursor.execute("ALTER TABLE weekly_plans ADD COLUMN content_updated_at TEXT")
+            self._create_plan_version_triggers(cursor)
+            
+            # Versions par table (validateurs HTTP des listes complètes)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS table_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+            self._create_table_version_triggers(cursor)
+            cursor.execute("PRAGMA table_info(shopping_lists)")
+            shopping_columns = {row[1] for row in cursor.fetchall()}
+            for column, definition in [('content_version', 'INTEGER'), ('ingredients_version', 'INTEGER'),
+                                       ('meals', 'TEXT'), ('updated_at', 'DATETIME')]:
+                if column not in shopping_columns:
+                    cursor.execute(f"ALTER TABLE shopping_lists ADD COLUMN {column} {definition}")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_shopping_lists_plan ON shopping_lists(plan_id)")
+            
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
             conn.commit()
+            return True
+    
+    def _make_catalog_columns_nullable(self, cursor: sqlite3.Cursor):
+        """Reconstruit meal_slots sans NOT NULL sur plan_id et day_of_week (SQLite ne sait pas
+        modifier une colonne). Index et triggers sont recréés ensuite par init_database."""
+        cursor.execute("PRAGMA table_info(meal_slots)")
+        if not any(row[1] in ('plan_id', 'day_of_week') and row[3] for row in cursor.fetchall()):
+            return
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'meal_slots'")
+        definition = cursor.fetchone()[0]
+        definition = re.sub(r'\b(plan_id\s+INTEGER|day_of_week\s+TEXT)\s+NOT\s+NULL', r'\1', definition)
+        definition = re.sub(r'^CREATE TABLE\s+"?meal_slots"?', 'CREATE TABLE meal_slots_v2', definition)
+        cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'meal_slots'")
+        row = cursor.fetchone()
+        
+        cursor.execute(definition)
+        cursor.execute("INSERT INTO meal_slots_v2 SELECT * FROM meal_slots")
+        cursor.execute("DROP TABLE meal_slots")
+        cursor.execute("ALTER TABLE meal_slots_v2 RENAME TO meal_slots")
+        # Les identifiants supprimés ne sont jamais réattribués (AUTOINCREMENT)
+        if row:
+            cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'meal_slots'", (row[0],))
+    
+    def _insert_history_for_plans(self, cursor: sqlite3.Cursor, plan_ids: Optional[List[int]] = None):
+        """Crée en une requête l'historique des repas planifiés qui n'en ont pas (sans commit)"""
+        plan_filter, params = '', []
+        if plan_ids is not None:
+            plan_filter = f"AND ms.plan_id IN ({', '.join('?' for _ in plan_ids)})"
+            params = list(plan_ids)
+        cursor.execute(f"""
+            INSERT INTO recipe_history (jow_recipe_id, recipe_name, main_ingredient, used_date,
+                                        plan_id, rating, meal_slot_id)
+            SELECT COALESCE(ms.jow_recipe_id, ms.recipe_name), ms.recipe_name, ms.main_ingredient,
+                   date(wp.week_start_date, '+' || {self._day_offset_sql('ms.day_of_week')} || ' days'),
+                   ms.plan_id, ms.rating, ms.id
+            FROM meal_slots ms
+            JOIN weekly_plans wp ON ms.plan_id = wp.id
+            WHERE NOT EXISTS (SELECT 1 FROM recipe_history rh WHERE rh.meal_slot_id = ms.id)
+            {plan_filter}
+        """, params)
+    
+    def _store_recipe_embedding(self, cursor: sqlite3.Cursor, recipe_id: int):
+        """Calcule et enregistre le plongement d'une recette du catalogue (sans commit)"""
+        from recipe_embeddings import recipe_features, encode_features
+        cursor.execute("""
+            SELECT recipe_name, main_ingredient, cuisine_type, notes, tags
+            FROM meal_slots
+            WHERE id = ? AND plan_id IS NULL
+        """, (recipe_id,))
+        row = cursor.fetchone()
+        if not row:
+            return
+        features, weights = encode_features(*recipe_features(dict(row)))
+        cursor.execute("""
+            INSERT OR REPLACE INTO recipe_embeddings (recipe_id, features, weights, updated_at)
+            VALUES (?, ?, ?, ?)
+        """, (recipe_id, features, weights, time.time()))
+    
+    def _create_plan_version_triggers(self, cursor: sqlite3.Cursor):
+        """Triggers incrémentant weekly_plans.content_version à chaque changement d'un plan ou de ses repas"""
+        def bump(where: str) -> str:
+            return f"""
+                UPDATE weekly_plans SET content_version = content_version + 1, content_updated_at = {NOW_SQL}
+                WHERE {where};
+            """
+        triggers = {
+            'trg_plan_version_insert': f"""
+                AFTER INSERT ON meal_slots WHEN NEW.plan_id IS NOT NULL
+                BEGIN {bump('id = NEW.plan_id')} END
+            """,
+            'trg_plan_version_delete': f"""
+                AFTER DELETE ON meal_slots WHEN OLD.plan_id IS NOT NULL
+                BEGIN {bump('id = OLD.plan_id')} END
+            """,
+            'trg_plan_version_update': f"""
+                AFTER UPDATE ON meal_slots
+                BEGIN
+                    {bump('id = OLD.plan_id')}
+                    {bump('id = NEW.plan_id AND NEW.plan_id IS NOT OLD.plan_id')}
+                END
+            """,
+            'trg_plan_version_plan': f"""
+                AFTER UPDATE OF plan_name, week_start_date, total_budget_estimate, generated_by_ai ON weekly_plans
+                BEGIN {bump('id = NEW.id')} END
+            """
+        }
+        for name, body in triggers.items():
+            # Recréés à chaque migration : la définition peut avoir changé
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"CREATE TRIGGER {name} {body}")
+    
+    def _create_table_version_triggers(self, cursor: sqlite3.Cursor):
+        """Triggers incrémentant la version d'une table (table_versions) à chaque écriture"""
+        watched = {
+            'weekly_plans': 'OF plan_name, week_start_date, total_budget_estimate, generated_by_ai',
+            'meal_slots': '',
+            'favorites': ''
+        }
+        for table, update_columns in watched.items():
+            cursor.execute("INSERT OR IGNORE INTO table_versions (name, version, updated_at) "
+                           f"VALUES (?, 0, {NOW_SQL})", (table,))
+            bump = f"""
+                UPDATE table_versions SET version = version + 1, updated_at = {NOW_SQL}
+                WHERE name = '{table}';
+            """
+            for event in ('INSERT', 'DELETE', f'UPDATE {update_columns}'):
+                name = f"trg_table_version_{table}_{event.split()[0].lower()}"
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"CREATE TRIGGER {name} AFTER {event} ON {table} BEGIN {bump} END")
+    
+    @staticmethod
+    def _bayesian_sql(rating_sum: str, rating_count: str) -> str:
+        """Expression SQL de la moyenne bayésienne"""
+        return (f"({RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN} + {rating_sum}) / "
+                f"({RATING_PRIOR_WEIGHT} + {rating_count})")
+    
+    def _create_rating_triggers(self, cursor: sqlite3.Cursor):
+        """Triggers tenant recipe_ratings à jour dans la transaction de chaque écriture sur meal_slots"""
+        add = f"""
+            INSERT INTO recipe_ratings (recipe_name, rating_count, rating_sum, bayesian_avg)
+            VALUES (NEW.recipe_name, 1, NEW.rating, {self._bayesian_sql('NEW.rating', '1')})
+            ON CONFLICT(recipe_name) DO UPDATE SET
+                rating_count = rating_count + 1,
+                rating_sum = rating_sum + NEW.rating,
+                bayesian_avg = {self._bayesian_sql('rating_sum + NEW.rating', 'rating_count + 1')};
+        """
+        remove = f"""
+            UPDATE recipe_ratings SET
+                rating_count = rating_count - 1,
+                rating_sum = rating_sum - OLD.rating,
+                bayesian_avg = {self._bayesian_sql('rating_sum - OLD.rating', 'rating_count - 1')}
+            WHERE recipe_name = OLD.recipe_name;
+        """
+        rated_new = "NEW.plan_id IS NOT NULL AND NEW.rating > 0"
+        rated_old = "OLD.plan_id IS NOT NULL AND OLD.rating > 0"
+        
+        triggers = {
+            'trg_recipe_ratings_insert': f"""
+                AFTER INSERT ON meal_slots WHEN {rated_new}
+                BEGIN {add} END
+            """,
+            'trg_recipe_ratings_delete': f"""
+                AFTER DELETE ON meal_slots WHEN {rated_old}
+                BEGIN {remove} END
+            """,
+            'trg_recipe_ratings_update_old': f"""
+                AFTER UPDATE OF rating, recipe_name, plan_id ON meal_slots WHEN {rated_old}
+                BEGIN {remove} END
+            """,
+            'trg_recipe_ratings_update_new': f"""
+                AFTER UPDATE OF rating, recipe_name, plan_id ON meal_slots WHEN {rated_new}
+                BEGIN {add} END
+            """
+        }
+        for name, body in triggers.items():
+            # Recréés à chaque migration : la définition peut avoir changé
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute(f"CREATE TRIGGER {name} {body}")
+    
+    @staticmethod
+    def _day_offset_sql(column: str) -> str:
+        """Expression SQL du décalage (en jours) d'un jour de la semaine depuis le lundi"""
+        cases = ' '.join(f"WHEN '{day}' THEN {i}" for i, day in enumerate(DAYS_OF_WEEK))
+        return f"(CASE {column} {cases} ELSE 0 END)"
     
     def create_plan(self, plan: WeeklyPlan) -> int:
         """Crée un nouveau plan"""
@@ -121,27 +559,445 @@ class DatabaseManager:
             conn.commit()
             return cursor.lastrowid
     
-    def get_plans(self, limit: int = 20) -> List[Dict[str, Any]]:
-        """Récupère tous les plans"""
+    def create_plan_with_meals(self, plan: WeeklyPlan, meals: List[Meal],
+                               profile: Optional[tuple] = None,
+                               draft: Optional[Dict[str, Any]] = None,
+                               stale_draft_id: Optional[int] = None,
+                               recipe_ingredients: Sequence[Dict[str, Any]] = ()) -> tuple:
+        """Crée un plan, ses repas et leur historique en une seule transaction.
+        
+        Dans la même transaction : les ingrédients des nouvelles recettes (Jow) de
+        `recipe_ingredients` sont enregistrés, `profile` (clé, préférences, déjeuner) est
+        marqué utilisé, le brouillon promu `draft` est supprimé et `stale_draft_id` aussi.
+        Si `draft` a déjà été promu ou que le catalogue a changé depuis, rien n'est écrit
+        et LookupError est levée : un seul worker promeut un brouillon.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if draft and not conn.in_transaction:
+                cursor.execute("BEGIN IMMEDIATE")
+            if draft:
+                cursor.execute("DELETE FROM draft_plans WHERE id = ? AND rules_version = ?",
+                               (draft['id'], draft['rules_version']))
+                if not cursor.rowcount or self._catalog_version(cursor) != draft['catalog_version']:
+                    conn.rollback()
+                    raise LookupError(f"Brouillon {draft['id']} déjà promu ou périmé")
+            if stale_draft_id:
+                cursor.execute("DELETE FROM draft_plans WHERE id = ?", (stale_draft_id,))
+            if profile:
+                self._touch_preference_profile(cursor, *profile)
+            self._write_recipe_ingredients(cursor, recipe_ingredients)
+            
+            cursor.execute("""
+                INSERT INTO weekly_plans (plan_name, week_start_date, total_budget_estimate, generated_by_ai)
+                VALUES (?, ?, ?, ?)
+            """, (plan.plan_name, plan.week_start_date, plan.total_budget_estimate, plan.generated_by_ai))
+            plan_id = cursor.lastrowid
+            
+            meal_ids, history = [], []
+            for meal in meals:
+                meal.plan_id = plan_id
+                meal_id, entry = self._insert_plan_meal(cursor, meal)
+                meal_ids.append(meal_id)
+                if entry:
+                    history.append(entry)
+            conn.commit()
+        
+        for history_id, recipe_name, used_date in history:
+            self.recency_index.record(recipe_name, used_date, history_id)
+        return plan_id, meal_ids
+    
+    def create_plans_bulk(self, plans: List[tuple],
+                          recipe_ingredients: Sequence[Dict[str, Any]] = ()) -> List[int]:
+        """Crée des plans et leurs repas en masse (executemany) dans une seule transaction.
+        
+        `plans` est une liste de couples (WeeklyPlan, [Meal]) ; les ingrédients des nouvelles
+        recettes de `recipe_ingredients` sont enregistrés dans la même transaction.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            self._write_recipe_ingredients(cursor, recipe_ingredients)
+            plan_ids, rows = [], []
+            for plan, meals in plans:
+                cursor.execute("""
+                    INSERT INTO weekly_plans (plan_name, week_start_date, total_budget_estimate, generated_by_ai)
+                    VALUES (?, ?, ?, ?)
+                """, (plan.plan_name, plan.week_start_date, plan.total_budget_estimate, plan.generated_by_ai))
+                plan_id = cursor.lastrowid
+                plan_ids.append(plan_id)
+                rows.extend((plan_id, meal.day_of_week, meal.meal_type.value, meal.recipe_name,
+                             meal.jow_recipe_id, meal.jow_recipe_url, meal.main_ingredient,
+                             meal.cuisine_type.value if meal.cuisine_type else None,
+                             meal.image_url, meal.video_url, meal.prep_time, meal.cook_time,
+                             meal.is_favorite, meal.rating, meal.notes) for meal in meals)
+            
+            cursor.executemany("""
+                INSERT INTO meal_slots (plan_id, day_of_week, meal_type, recipe_name, 
+                                       jow_recipe_id, jow_recipe_url, main_ingredient, 
+                                       cuisine_type, image_url, video_url, prep_time, 
+                                       cook_time, is_favorite, rating, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            for start in range(0, len(plan_ids), 500):
+                self._insert_history_for_plans(cursor, plan_ids[start:start + 500])
+            conn.commit()
+        
+        self.recency_index.invalidate()
+        return plan_ids
+    
+    def _touch_preference_profile(self, cursor, profile_key: str, preferences: str, include_lunch: bool):
+        """Enregistre l'utilisation d'un profil de préférences (dans la transaction du planning)"""
+        cursor.execute("""
+            INSERT INTO preference_profiles (profile_key, preferences, include_lunch, last_used_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(profile_key) DO UPDATE SET last_used_at = excluded.last_used_at
+        """, (profile_key, preferences, include_lunch, datetime.now().isoformat()))
+    
+    def get_active_profiles(self, since: datetime) -> List[Dict[str, Any]]:
+        """Profils de préférences utilisés depuis `since`"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT profile_key, preferences, include_lunch, last_used_at
+                FROM preference_profiles
+                WHERE last_used_at >= ?
+                ORDER BY last_used_at DESC
+            """, (since.isoformat(),))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_catalog_version(self) -> str:
+        """Empreinte du catalogue de recettes de base (change à chaque ajout, note ou favori)"""
+        with self.get_connection() as conn:
+            return self._catalog_version(conn.cursor())
+    
+    def _catalog_version(self, cursor) -> str:
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(MAX(id), 0), TOTAL(rating), TOTAL(is_favorite)
+            FROM meal_slots
+            WHERE plan_id IS NULL
+        """)
+        return ':'.join(str(value) for value in cursor.fetchone())
+    
+    def save_draft_plan(self, profile_key: str, week_start_date: date, meals: str,
+                        catalog_version: str, rules_version: int, expires_at: datetime):
+        """Enregistre (ou remplace) le brouillon d'un profil pour une semaine"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO draft_plans (profile_key, week_start_date, meals, catalog_version,
+                                         rules_version, created_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(profile_key, week_start_date) DO UPDATE SET
+                    meals = excluded.meals,
+                    catalog_version = excluded.catalog_version,
+                    rules_version = excluded.rules_version,
+                    created_at = excluded.created_at,
+                    expires_at = excluded.expires_at
+            """, (profile_key, week_start_date.isoformat(), meals, catalog_version, rules_version,
+                  datetime.now().isoformat(), expires_at.isoformat()))
+            conn.commit()
+    
+    def get_draft_plans(self, week_start_date: date) -> List[Dict[str, Any]]:
+        """Brouillons non expirés d'une semaine (sans les repas)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, profile_key, week_start_date, catalog_version, rules_version,
+                       created_at, expires_at
+                FROM draft_plans
+                WHERE week_start_date = ? AND expires_at > ?
+            """, (week_start_date.isoformat(), datetime.now().isoformat()))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_draft_plan(self, profile_key: str, week_start_date: date) -> Optional[Dict[str, Any]]:
+        """Brouillon d'un profil pour une semaine (lecture seule, voir create_plan_with_meals)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, meals, catalog_version, rules_version, expires_at
+                FROM draft_plans
+                WHERE profile_key = ? AND week_start_date = ?
+            """, (profile_key, week_start_date.isoformat()))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def purge_draft_plans(self) -> int:
+        """Supprime les brouillons expirés"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM draft_plans WHERE expires_at <= ?", (datetime.now().isoformat(),))
+            conn.commit()
+            return cursor.rowcount
+    
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Prend (ou renouvelle) le bail d'une tâche de fond si personne d'autre ne le détient"""
+        now = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("INSERT OR IGNORE INTO scheduler_leases (name, owner, expires_at) VALUES (?, ?, 0)",
+                           (name, owner))
+            cursor.execute("""
+                UPDATE scheduler_leases SET owner = ?, expires_at = ?
+                WHERE name = ? AND (expires_at < ? OR owner = ?)
+            """, (owner, now + ttl, name, now, owner))
+            acquired = cursor.rowcount > 0
+            conn.commit()
+            return acquired
+    
+    def get_recipe_rating(self, recipe_name: str) -> Optional[Dict[str, Any]]:
+        """Agrégat de notes d'une recette (nombre, somme, moyenne bayésienne)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT recipe_name, rating_count, rating_sum, bayesian_avg
+                FROM recipe_ratings
+                WHERE recipe_name = ?
+            """, (recipe_name,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def save_recipe_ingredients(self, recipes: List[Dict[str, Any]], replace: bool = False) -> int:
+        """Enregistre les ingrédients (quantités ramenées à une portion) de recettes ingérées.
+        
+        Sans `replace`, les recettes déjà décrites sont ignorées. Retourne le nombre de recettes écrites.
+        """
+        with self.get_connection() as conn:
+            written = self._write_recipe_ingredients(conn.cursor(), recipes, replace)
+            conn.commit()
+            return written
+    
+    def _write_recipe_ingredients(self, cursor, recipes: Sequence[Dict[str, Any]],
+                                  replace: bool = False) -> int:
+        """Écrit les ingrédients de recettes dans la transaction en cours (voir save_recipe_ingredients)"""
+        recipes = [r for r in recipes if r.get('recipe_name') and r.get('ingredients')]
+        if not recipes:
+            return 0
+        if not replace:
+            placeholders = ', '.join('?' for _ in recipes)
+            cursor.execute(f"""
+                SELECT DISTINCT recipe_name FROM recipe_ingredients
+                WHERE recipe_name IN ({placeholders})
+            """, [r['recipe_name'] for r in recipes])
+            known = {row[0] for row in cursor.fetchall()}
+            recipes = [r for r in recipes if r['recipe_name'] not in known]
+        
+        written = set()
+        for recipe in recipes:
+            if recipe['recipe_name'] in written:
+                continue
+            servings = int(recipe.get('servings') or DEFAULT_RECIPE_SERVINGS)
+            
+            # Quantités d'un même ingrédient (et d'une même unité de base) additionnées
+            lines: Dict[tuple, Optional[float]] = {}
+            display_names: Dict[str, str] = {}
+            for raw in recipe['ingredients']:
+                ingredient = parse_ingredient(raw)
+                if not ingredient:
+                    continue
+                name = normalize_text(ingredient['name'])
+                display_names.setdefault(name, ingredient['name'])
+                quantity, unit = normalize_quantity(ingredient['quantity'], ingredient['unit'])
+                key = (name, unit)
+                if key in lines and lines[key] is not None and quantity is not None:
+                    lines[key] += quantity
+                elif key not in lines or quantity is not None:
+                    lines[key] = quantity
+            
+            cursor.execute("DELETE FROM recipe_ingredients WHERE recipe_name = ?", (recipe['recipe_name'],))
+            for (name, unit), quantity in lines.items():
+                cursor.execute("INSERT OR IGNORE INTO ingredients (name, display_name) VALUES (?, ?)",
+                               (name, display_names[name]))
+                cursor.execute("""
+                    INSERT INTO recipe_ingredients (recipe_name, ingredient_id, quantity, unit,
+                                                    servings, per_serving)
+                    SELECT ?, id, ?, ?, ?, ?
+                    FROM ingredients
+                    WHERE name = ?
+                """, (recipe['recipe_name'], quantity, unit, servings,
+                      quantity / servings if quantity is not None else None, name))
+            written.add(recipe['recipe_name'])
+        return len(written)
+    
+    def get_shopping_items(self, servings: int, plan_id: Optional[int] = None,
+                           start_date: Optional[date] = None,
+                           end_date: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Quantités agrégées en SQL des repas d'un plan ou d'une période (par ingrédient et unité).
+        
+        Les repas sans ingrédients connus contribuent leur ingrédient principal, sans quantité.
+        """
+        if plan_id is not None:
+            meal_filter, params = "ms.plan_id = ?", [plan_id]
+        else:
+            # Préfiltre sur la date du plan (index), puis date exacte du repas
+            meal_filter = (f"wp.week_start_date BETWEEN date(?, '-6 days') AND ? "
+                           f"AND date(wp.week_start_date, '+' || {self._day_offset_sql('ms.day_of_week')} "
+                           f"|| ' days') BETWEEN ? AND ?")
+            start, end = start_date.isoformat(), end_date.isoformat()
+            params = [start, end, start, end]
+        
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                WITH meals AS (
+                    SELECT ms.id, ms.recipe_name, ms.main_ingredient
+                    FROM meal_slots ms
+                    JOIN weekly_plans wp ON wp.id = ms.plan_id
+                    WHERE {meal_filter}
+                )
+                SELECT i.name, i.display_name, ri.unit,
+                       SUM(ri.per_serving) * ? AS quantity,
+                       COUNT(DISTINCT m.id) AS meal_count
+                FROM meals m
+                JOIN recipe_ingredients ri ON ri.recipe_name = m.recipe_name
+                JOIN ingredients i ON i.id = ri.ingredient_id
+                GROUP BY i.id, ri.unit
+                UNION ALL
+                SELECT normalize_text(m.main_ingredient), MIN(m.main_ingredient), NULL, NULL, COUNT(*)
+                FROM meals m
+                WHERE m.main_ingredient IS NOT NULL AND m.main_ingredient != ''
+                AND NOT EXISTS (SELECT 1 FROM recipe_ingredients ri WHERE ri.recipe_name = m.recipe_name)
+                GROUP BY normalize_text(m.main_ingredient)
+                ORDER BY 1
+            """, params + [servings])
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def aggregate_meal_ingredients(self, meals: List[tuple]) -> List[Dict[str, Any]]:
+        """Quantités par portion d'une liste de repas (nom de recette, ingrédient principal, poids).
+        
+        Un poids de -1 retire un repas : sert à mettre à jour une liste enregistrée par différence.
+        """
+        if not meals:
+            return []
+        values = ', '.join('(?, ?, ?)' for _ in meals)
+        params = [value for meal in meals for value in meal]
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                WITH meals(recipe_name, main_ingredient, weight) AS (VALUES {values})
+                SELECT i.name, i.display_name, ri.unit,
+                       SUM(ri.per_serving * m.weight) AS quantity,
+                       SUM(m.weight) AS meal_count
+                FROM meals m
+                JOIN recipe_ingredients ri ON ri.recipe_name = m.recipe_name
+                JOIN ingredients i ON i.id = ri.ingredient_id
+                GROUP BY i.id, ri.unit
+                UNION ALL
+                SELECT normalize_text(m.main_ingredient), MIN(m.main_ingredient), NULL, NULL, SUM(m.weight)
+                FROM meals m
+                WHERE m.main_ingredient IS NOT NULL AND m.main_ingredient != ''
+                AND NOT EXISTS (SELECT 1 FROM recipe_ingredients ri WHERE ri.recipe_name = m.recipe_name)
+                GROUP BY normalize_text(m.main_ingredient)
+            """, params)
+            return [dict(row) for row in cursor.fetchall()]
+    
+    @staticmethod
+    def _plan_versions(cursor: sqlite3.Cursor, plan_id: int) -> Optional[tuple]:
+        cursor.execute("""
+            SELECT content_version,
+                   (SELECT COALESCE(MAX(ri.id), 0) FROM recipe_ingredients ri
+                    WHERE ri.recipe_name IN (SELECT recipe_name FROM meal_slots WHERE plan_id = wp.id))
+            FROM weekly_plans wp
+            WHERE id = ?
+        """, (plan_id,))
+        row = cursor.fetchone()
+        return tuple(row) if row else None
+    
+    def get_table_versions(self, names: List[str]) -> Dict[str, tuple]:
+        """Version et date de dernière écriture (UTC) de tables suivies"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT name, version, updated_at FROM table_versions
+                WHERE name IN ({', '.join('?' for _ in names)})
+            """, names)
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+    
+    def get_plan_content_version(self, plan_id: int) -> Optional[tuple]:
+        """Version du contenu d'un plan et date de son dernier changement (UTC), ou None"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT content_version, COALESCE(content_updated_at, created_at) FROM weekly_plans WHERE id = ?",
+                           (plan_id,))
+            row = cursor.fetchone()
+            return tuple(row) if row else None
+    
+    def get_plan_versions(self, plan_id: int) -> Optional[tuple]:
+        """(version du contenu, version des ingrédients) d'un plan, ou None s'il n'existe pas"""
+        with self.get_connection() as conn:
+            return self._plan_versions(conn.cursor(), plan_id)
+    
+    def get_plan_shopping_state(self, plan_id: int) -> Optional[Dict[str, Any]]:
+        """Versions d'un plan et ses repas (id -> [recette, ingrédient principal, version de ses ingrédients])"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            versions = self._plan_versions(cursor, plan_id)
+            if versions is None:
+                return None
+            cursor.execute("""
+                SELECT ms.id, ms.recipe_name, ms.main_ingredient,
+                       (SELECT COALESCE(MAX(ri.id), 0) FROM recipe_ingredients ri
+                        WHERE ri.recipe_name = ms.recipe_name)
+                FROM meal_slots ms
+                WHERE ms.plan_id = ?
+            """, (plan_id,))
+            return {
+                'content_version': versions[0],
+                'ingredients_version': versions[1],
+                'meals': {str(row[0]): [row[1], row[2], row[3]] for row in cursor.fetchall()}
+            }
+    
+    def get_shopping_list(self, plan_id: int) -> Optional[Dict[str, Any]]:
+        """Liste de courses enregistrée d'un plan"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT plan_id, list_name, ingredients, meals, content_version, ingredients_version, updated_at
+                FROM shopping_lists
+                WHERE plan_id = ?
+            """, (plan_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def save_shopping_list(self, plan_id: int, list_name: str, ingredients: str, meals: str,
+                           content_version: int, ingredients_version: int):
+        """Enregistre (ou remplace) la liste de courses d'un plan"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                SELECT id, plan_name, week_start_date, total_budget_estimate, 
-                       generated_by_ai, created_at
+                INSERT INTO shopping_lists (plan_id, list_name, ingredients, meals, content_version,
+                                            ingredients_version, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(plan_id) DO UPDATE SET
+                    list_name = excluded.list_name,
+                    ingredients = excluded.ingredients,
+                    meals = excluded.meals,
+                    content_version = excluded.content_version,
+                    ingredients_version = excluded.ingredients_version,
+                    updated_at = excluded.updated_at
+            """, (plan_id, list_name, ingredients, meals, content_version, ingredients_version,
+                  datetime.now(), datetime.now()))
+            conn.commit()
+    
+    def get_plans(self, limit: int = 20, columns: Sequence[str] = PLAN_COLUMNS) -> List[Dict[str, Any]]:
+        """Récupère tous les plans (`columns` : colonnes lues, parmi PLAN_COLUMNS)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {', '.join(columns)}
                 FROM weekly_plans
                 ORDER BY week_start_date DESC
                 LIMIT ?
             """, (limit,))
             return [dict(row) for row in cursor.fetchall()]
     
-    def get_plan_meals(self, plan_id: int) -> List[Dict[str, Any]]:
-        """Récupère les repas d'un plan"""
+    def get_plan_meals(self, plan_id: int, row_factory: Optional[Callable] = None,
+                       columns: Sequence[str] = MEAL_COLUMNS) -> List[Dict[str, Any]]:
+        """Récupère les repas d'un plan (`row_factory(cursor)` : format des lignes, dict par défaut ;
+        `columns` : colonnes lues, parmi MEAL_COLUMNS)"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, day_of_week, meal_type, recipe_name, jow_recipe_id, 
-                       jow_recipe_url, main_ingredient, cuisine_type, image_url, 
-                       video_url, prep_time, cook_time, is_favorite, rating, notes
+            cursor.execute(f"""
+                SELECT {', '.join(columns)}
                 FROM meal_slots
                 WHERE plan_id = ?
                 ORDER BY 
@@ -160,25 +1016,168 @@ class DatabaseManager:
                         WHEN 'Dîner' THEN 3
                     END
             """, (plan_id,))
+            if row_factory:
+                cursor.row_factory = row_factory(cursor)
+                return cursor.fetchall()
             return [dict(row) for row in cursor.fetchall()]
     
-    def add_meal_to_plan(self, meal: Meal) -> int:
-        """Ajoute un repas à un plan"""
+    def get_meals_for_plans(self, plan_ids: List[int]) -> List[Dict[str, Any]]:
+        """Récupère les repas de plusieurs plans en une requête (triés par plan puis jour)"""
+        if not plan_ids:
+            return []
+        placeholders = ', '.join('?' for _ in plan_ids)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, plan_id, day_of_week, meal_type, recipe_name, jow_recipe_id, 
+                       jow_recipe_url, main_ingredient, cuisine_type, image_url, 
+                       video_url, prep_time, cook_time, is_favorite, rating, notes
+                FROM meal_slots
+                WHERE plan_id IN ({placeholders})
+                ORDER BY 
+                    plan_id,
+                    CASE day_of_week
+                        WHEN 'Lundi' THEN 1
+                        WHEN 'Mardi' THEN 2
+                        WHEN 'Mercredi' THEN 3
+                        WHEN 'Jeudi' THEN 4
+                        WHEN 'Vendredi' THEN 5
+                        WHEN 'Samedi' THEN 6
+                        WHEN 'Dimanche' THEN 7
+                    END,
+                    CASE meal_type
+                        WHEN 'Petit-déjeuner' THEN 1
+                        WHEN 'Déjeuner' THEN 2
+                        WHEN 'Dîner' THEN 3
+                    END
+            """, list(plan_ids))
+            return [dict(row) for row in cursor.fetchall()]
+    
+    def get_meal(self, meal_id: int) -> Optional[Dict[str, Any]]:
+        """Récupère un repas par son ID"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
-                INSERT INTO meal_slots (plan_id, day_of_week, meal_type, recipe_name, 
-                                       jow_recipe_id, jow_recipe_url, main_ingredient, 
-                                       cuisine_type, image_url, video_url, prep_time, 
-                                       cook_time, is_favorite, rating, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (meal.plan_id, meal.day_of_week, meal.meal_type.value, meal.recipe_name,
-                  meal.jow_recipe_id, meal.jow_recipe_url, meal.main_ingredient,
-                  meal.cuisine_type.value if meal.cuisine_type else None,
-                  meal.image_url, meal.video_url, meal.prep_time, meal.cook_time,
-                  meal.is_favorite, meal.rating, meal.notes))
+                SELECT id, plan_id, day_of_week, meal_type, recipe_name, jow_recipe_id, 
+                       jow_recipe_url, main_ingredient, cuisine_type, image_url, 
+                       video_url, prep_time, cook_time, is_favorite, rating, notes
+                FROM meal_slots
+                WHERE id = ?
+            """, (meal_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    
+    def _insert_plan_meal(self, cursor: sqlite3.Cursor, meal: Meal) -> tuple:
+        """Insère un repas planifié et sa ligne d'historique (sans commit)"""
+        cursor.execute("""
+            INSERT INTO meal_slots (plan_id, day_of_week, meal_type, recipe_name, 
+                                   jow_recipe_id, jow_recipe_url, main_ingredient, 
+                                   cuisine_type, image_url, video_url, prep_time, 
+                                   cook_time, is_favorite, rating, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (meal.plan_id, meal.day_of_week, meal.meal_type.value, meal.recipe_name,
+              meal.jow_recipe_id, meal.jow_recipe_url, meal.main_ingredient,
+              meal.cuisine_type.value if meal.cuisine_type else None,
+              meal.image_url, meal.video_url, meal.prep_time, meal.cook_time,
+              meal.is_favorite, meal.rating, meal.notes))
+        meal_id = cursor.lastrowid
+        
+        # Date d'utilisation = début de semaine du plan + décalage du jour
+        offset = DAYS_OF_WEEK.index(meal.day_of_week) if meal.day_of_week in DAYS_OF_WEEK else 0
+        cursor.execute("""
+            INSERT INTO recipe_history (jow_recipe_id, recipe_name, main_ingredient, used_date,
+                                        plan_id, rating, meal_slot_id)
+            SELECT ?, ?, ?, date(week_start_date, ?), id, ?, ?
+            FROM weekly_plans
+            WHERE id = ?
+        """, (meal.jow_recipe_id or meal.recipe_name, meal.recipe_name, meal.main_ingredient,
+              f'+{offset} days', meal.rating, meal_id, meal.plan_id))
+        if not cursor.rowcount:
+            return meal_id, None
+        history_id = cursor.lastrowid
+        cursor.execute("SELECT used_date FROM recipe_history WHERE id = ?", (history_id,))
+        return meal_id, (history_id, meal.recipe_name, cursor.fetchone()[0])
+    
+    def add_meal_to_plan(self, meal: Meal) -> int:
+        """Ajoute un repas à un plan (et à l'historique, dans la même transaction)"""
+        return self.add_meals_to_plan([meal])[0]
+    
+    def add_meals_to_plan(self, meals: List[Meal]) -> List[int]:
+        """Ajoute plusieurs repas et leur historique en une seule transaction"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            meal_ids, history = [], []
+            for meal in meals:
+                meal_id, entry = self._insert_plan_meal(cursor, meal)
+                meal_ids.append(meal_id)
+                if entry:
+                    history.append(entry)
             conn.commit()
-            return cursor.lastrowid
+        
+        for history_id, recipe_name, used_date in history:
+            self.recency_index.record(recipe_name, used_date, history_id)
+        return meal_ids
+    
+    def replace_plan_meals(self, plan_id: int, removed_meal_ids: List[int], meals: List[Meal],
+                           recipe_ingredients: Sequence[Dict[str, Any]] = ()) -> List[int]:
+        """Remplace des repas d'un plan (suppression + insertion) en une seule transaction,
+        avec les ingrédients des nouvelles recettes de `recipe_ingredients`"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            self._write_recipe_ingredients(cursor, recipe_ingredients)
+            if removed_meal_ids:
+                placeholders = ', '.join('?' for _ in removed_meal_ids)
+                cursor.execute(f"DELETE FROM recipe_history WHERE meal_slot_id IN ({placeholders})",
+                               list(removed_meal_ids))
+                cursor.execute(f"DELETE FROM meal_slots WHERE plan_id = ? AND id IN ({placeholders})",
+                               [plan_id] + list(removed_meal_ids))
+            meal_ids = [self._insert_plan_meal(cursor, meal)[0] for meal in meals]
+            conn.commit()
+        
+        self.recency_index.invalidate()
+        return meal_ids
+    
+    def apply_meal_changes(self, plan_id: int, updated_meals: Dict[int, Meal],
+                           removed_meal_ids: List[int],
+                           recipe_ingredients: Sequence[Dict[str, Any]] = ()) -> int:
+        """Applique un diff de repas (mises à jour en place + suppressions) en une transaction,
+        avec les ingrédients des nouvelles recettes de `recipe_ingredients`"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            self._write_recipe_ingredients(cursor, recipe_ingredients)
+            changed = 0
+            for meal_id, meal in updated_meals.items():
+                cursor.execute("""
+                    UPDATE meal_slots
+                    SET recipe_name = ?, jow_recipe_id = ?, jow_recipe_url = ?, main_ingredient = ?,
+                        cuisine_type = ?, image_url = ?, video_url = ?, prep_time = ?, cook_time = ?,
+                        is_favorite = ?, rating = ?, notes = ?
+                    WHERE id = ? AND plan_id = ?
+                """, (meal.recipe_name, meal.jow_recipe_id, meal.jow_recipe_url, meal.main_ingredient,
+                      meal.cuisine_type.value if meal.cuisine_type else None,
+                      meal.image_url, meal.video_url, meal.prep_time, meal.cook_time,
+                      meal.is_favorite, meal.rating, meal.notes, meal_id, plan_id))
+                changed += cursor.rowcount
+            
+            # Historique supprimé puis recréé (et non modifié en place) : les nouveaux ids
+            # signalent le changement aux index de récence des autres workers (RecencyIndex._sync)
+            if updated_meals:
+                placeholders = ', '.join('?' for _ in updated_meals)
+                cursor.execute(f"DELETE FROM recipe_history WHERE meal_slot_id IN ({placeholders})",
+                               list(updated_meals))
+                self._insert_history_for_plans(cursor, [plan_id])
+            
+            if removed_meal_ids:
+                placeholders = ', '.join('?' for _ in removed_meal_ids)
+                cursor.execute(f"DELETE FROM recipe_history WHERE meal_slot_id IN ({placeholders})",
+                               list(removed_meal_ids))
+                cursor.execute(f"DELETE FROM meal_slots WHERE plan_id = ? AND id IN ({placeholders})",
+                               [plan_id] + list(removed_meal_ids))
+                changed += cursor.rowcount
+            conn.commit()
+        
+        self.recency_index.invalidate()
+        return changed
     
     def add_base_recipe(self, meal: Meal) -> int:
         """Ajoute une recette de base (sans plan)"""
@@ -188,15 +1187,17 @@ class DatabaseManager:
                 INSERT INTO meal_slots (plan_id, day_of_week, meal_type, recipe_name, 
                                        jow_recipe_id, jow_recipe_url, main_ingredient, 
                                        cuisine_type, image_url, video_url, prep_time, 
-                                       cook_time, is_favorite, rating, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                       cook_time, is_favorite, rating, notes, tags)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (None, None, meal.meal_type.value, meal.recipe_name,
                   meal.jow_recipe_id, meal.jow_recipe_url, meal.main_ingredient,
                   meal.cuisine_type.value if meal.cuisine_type else None,
                   meal.image_url, meal.video_url, meal.prep_time, meal.cook_time,
-                  meal.is_favorite, meal.rating, meal.notes))
+                  meal.is_favorite, meal.rating, meal.notes, meal.tags))
+            recipe_id = cursor.lastrowid
+            self._store_recipe_embedding(cursor, recipe_id)
             conn.commit()
-            return cursor.lastrowid
+            return recipe_id
     
     def update_meal(self, meal_id: int, updates: Dict[str, Any]) -> bool:
         """Met à jour un repas"""
@@ -214,8 +1215,11 @@ class DatabaseManager:
                 values.append(meal_id)
                 query = f"UPDATE meal_slots SET {', '.join(set_clauses)} WHERE id = ?"
                 cursor.execute(query, values)
+                updated = cursor.rowcount > 0
+                if updated and 'notes' in updates:
+                    self._store_recipe_embedding(cursor, meal_id)
                 conn.commit()
-                return cursor.rowcount > 0
+                return updated
             return False
     
     def get_statistics(self) -> Statistics:
@@ -262,7 +1266,25 @@ class DatabaseManager:
         """Supprime un plan et ses repas"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute("DELETE FROM recipe_history WHERE plan_id = ?", (plan_id,))
+            cursor.execute("DELETE FROM shopping_lists WHERE plan_id = ?", (plan_id,))
             cursor.execute("DELETE FROM meal_slots WHERE plan_id = ?", (plan_id,))
             cursor.execute("DELETE FROM weekly_plans WHERE id = ?", (plan_id,))
             conn.commit()
-            return cursor.rowcount > 0
+            deleted = cursor.rowcount > 0
+        self.recency_index.invalidate()
+        return deleted
+    
+    def delete_meal(self, meal_id: int) -> bool:
+        """Supprime un repas et son entrée d'historique"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM recipe_history WHERE meal_slot_id = ?", (meal_id,))
+            history_deleted = cursor.rowcount > 0
+            cursor.execute("DELETE FROM recipe_embeddings WHERE recipe_id = ?", (meal_id,))
+            cursor.execute("DELETE FROM meal_slots WHERE id = ?", (meal_id,))
+            deleted = cursor.rowcount > 0
+            conn.commit()
+        if history_deleted:
+            self.recency_index.invalidate()
+        return deleted
@@ -0,0 +1,33 @@
+"""
+Configuration gunicorn : migration du schéma, workers et métriques Prometheus multiprocessus
+"""
+import os
+import shutil
+import subprocess
+import sys
+
+bind = '0.0.0.0:5000'
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+timeout = 120
+keepalive = 2
+max_requests = 1000
+max_requests_jitter = 100
+
+def on_starting(server):
+    """Repart de répertoires vides (métriques et piles des workers d'un lancement précédent) et migre le schéma"""
+    for variable in ('PROMETHEUS_MULTIPROC_DIR', 'SAMPLING_PROFILER_DIR'):
+        directory = os.environ.get(variable)
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(directory, exist_ok=True)
+    # Schéma migré une seule fois, avant les workers (qui ne font alors aucun DDL au démarrage).
+    # Processus séparé : le maître n'importe pas l'application et ne publie aucune métrique.
+    env = {key: value for key, value in os.environ.items() if key != 'PROMETHEUS_MULTIPROC_DIR'}
+    subprocess.run([sys.executable, os.path.join(os.path.dirname(__file__), 'scripts', 'migrate.py')],
+                   env=env, check=True)
+
+def child_exit(server, worker):
+    """Retire les jauges d'un worker arrêté (max_requests, plantage)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,82 @@
+"""
+Requêtes conditionnelles (ETag / Last-Modified) à partir des compteurs de version de la base
+"""
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Optional, Tuple
+from flask import request, current_app
+from metrics import CONDITIONAL_REQUESTS
+from serialization import wants_ndjson
+
+# Paramètres qui changent la représentation renvoyée (et donc l'ETag) sans changer les données
+VARIANT_ARGS = ('fields', 'format')
+
+def parse_db_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Horodatage SQLite (UTC) -> datetime UTC"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace('T', ' ')).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+def conditional(validator: Callable[..., Optional[Tuple[str, Optional[str]]]],
+                negotiated: bool = False):
+    """Décorateur de GET conditionnel.
+
+    `validator` reçoit les arguments de la vue et retourne (ETag, date de dernière
+    écriture) à partir des seuls compteurs de version, ou None pour laisser la vue
+    répondre seule (ressource absente). Si le client possède déjà cette version,
+    la réponse est un 304 sans exécuter la vue.
+
+    `negotiated` : la vue choisit son format selon l'en-tête Accept (stream_response) ;
+    le format négocié entre dans l'ETag et la réponse porte `Vary: Accept`.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                validators = validator(*args, **kwargs)
+            except Exception as e:
+                print(f"Erreur calcul ETag {f.__name__}: {e}")
+                validators = None
+            if validators is None:
+                return f(*args, **kwargs)
+
+            etag, updated_at = validators
+            variants = [f"{arg}={request.args[arg]}" for arg in VARIANT_ARGS if arg in request.args]
+            if negotiated and 'format' not in request.args and wants_ndjson():
+                variants.append('format=ndjson')
+            if variants:
+                etag = ';'.join([etag] + variants).replace('"', '')
+            last_modified = parse_db_timestamp(updated_at)
+            if last_modified is not None:
+                # Précision HTTP à la seconde
+                last_modified = last_modified.replace(microsecond=0)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                # Strictement antérieur : une écriture dans la même seconde reste visible
+                since = request.if_modified_since
+                not_modified = bool(since and last_modified and last_modified < since)
+
+            if not_modified:
+                CONDITIONAL_REQUESTS.labels(f.__name__, 'hit').inc()
+                response = current_app.response_class(status=304)
+            else:
+                CONDITIONAL_REQUESTS.labels(f.__name__, 'miss').inc()
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if negotiated:
+                response.vary.add('Accept')
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Le client doit revalider à chaque fois (le 304 est peu coûteux)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return decorated_function
+    return decorator
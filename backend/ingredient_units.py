@@ -0,0 +1,73 @@
+"""
+Normalisation des ingrédients et des unités (recettes Jow et catalogue local)
+"""
+import re
+from typing import Any, Dict, Optional, Tuple
+
+# Unité saisie -> (unité de base, facteur de conversion)
+UNIT_ALIASES = {
+    'g': ('g', 1.0), 'gr': ('g', 1.0), 'gramme': ('g', 1.0), 'grammes': ('g', 1.0),
+    'kg': ('g', 1000.0), 'kilo': ('g', 1000.0), 'kilos': ('g', 1000.0),
+    'kilogramme': ('g', 1000.0), 'kilogrammes': ('g', 1000.0),
+    'mg': ('g', 0.001),
+    'ml': ('ml', 1.0), 'cl': ('ml', 10.0), 'dl': ('ml', 100.0),
+    'l': ('ml', 1000.0), 'litre': ('ml', 1000.0), 'litres': ('ml', 1000.0),
+    'c. à soupe': ('ml', 15.0), 'cuillère à soupe': ('ml', 15.0), 'cuillères à soupe': ('ml', 15.0),
+    'cas': ('ml', 15.0), 'càs': ('ml', 15.0), 'tbsp': ('ml', 15.0), 'tablespoon': ('ml', 15.0),
+    'c. à café': ('ml', 5.0), 'cuillère à café': ('ml', 5.0), 'cuillères à café': ('ml', 5.0),
+    'cac': ('ml', 5.0), 'càc': ('ml', 5.0), 'tsp': ('ml', 5.0), 'teaspoon': ('ml', 5.0),
+    'pièce': ('pièce', 1.0), 'pièces': ('pièce', 1.0), 'pc': ('pièce', 1.0), 'pcs': ('pièce', 1.0),
+    'unité': ('pièce', 1.0), 'unités': ('pièce', 1.0), 'unit': ('pièce', 1.0), '': ('pièce', 1.0),
+    'gousse': ('gousse', 1.0), 'gousses': ('gousse', 1.0),
+    'pincée': ('pincée', 1.0), 'pincées': ('pincée', 1.0),
+}
+
+# Affichage : au-delà de ce seuil, on passe à l'unité supérieure
+DISPLAY_UNITS = {'g': ('kg', 1000.0), 'ml': ('l', 1000.0)}
+
+_QUANTITY_RE = re.compile(r"^\s*(\d+(?:[.,]\d+)?)\s*([^\d\s]*)\s*(?:de |d')?(.*)$", re.IGNORECASE)
+
+def normalize_quantity(quantity: Optional[float], unit: Optional[str]) -> Tuple[Optional[float], str]:
+    """Convertit une quantité dans l'unité de base de son unité (g, ml, pièce...)"""
+    key = (unit or '').strip().lower()
+    base_unit, factor = UNIT_ALIASES.get(key, (key, 1.0))
+    if quantity is None:
+        return None, base_unit
+    return float(quantity) * factor, base_unit
+
+def display_quantity(quantity: Optional[float], unit: str) -> Tuple[Optional[float], str]:
+    """Quantité lisible : 1500 g -> 1.5 kg, arrondie"""
+    if quantity is None:
+        return None, unit
+    if unit in DISPLAY_UNITS and quantity >= DISPLAY_UNITS[unit][1]:
+        unit, factor = DISPLAY_UNITS[unit]
+        quantity /= factor
+    return round(quantity, 2), unit
+
+def parse_ingredient(raw: Any) -> Optional[Dict[str, Any]]:
+    """Ingrédient brut (objet Jow, dictionnaire ou texte "200 g de riz") -> {name, quantity, unit}"""
+    if isinstance(raw, dict):
+        name, quantity, unit = raw.get('name'), raw.get('quantity'), raw.get('unit')
+    elif isinstance(raw, str):
+        match = _QUANTITY_RE.match(raw)
+        if match and match.group(3):
+            name, quantity, unit = match.group(3), float(match.group(1).replace(',', '.')), match.group(2)
+        else:
+            name, quantity, unit = raw.split(',')[0], None, None
+    else:
+        name, quantity, unit = (getattr(raw, 'name', None), getattr(raw, 'quantity', None),
+                                getattr(raw, 'unit', None))
+
+    # Certaines unités Jow sont des objets ({name: ...})
+    if isinstance(unit, dict):
+        unit = unit.get('name')
+    elif unit is not None and not isinstance(unit, str):
+        unit = getattr(unit, 'name', str(unit))
+
+    if not name or not str(name).strip():
+        return None
+    try:
+        quantity = float(quantity) if quantity not in (None, '') else None
+    except (TypeError, ValueError):
+        quantity = None
+    return {'name': str(name).strip(), 'quantity': quantity, 'unit': (unit or '').strip()}
@@ -0,0 +1,143 @@
+"""
+Métriques Prometheus : requêtes HTTP, requêtes SQLite, appels Jow / Gemini et caches
+
+Sous gunicorn, PROMETHEUS_MULTIPROC_DIR est défini : chaque worker écrit ses valeurs
+dans ce répertoire et /api/metrics agrège tous les workers (voir gunicorn.conf.py).
+"""
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional
+from flask import request
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY,
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+from tracing import span, record_query
+
+# Seuils des histogrammes (secondes)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+UPSTREAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REQUEST_LATENCY = Histogram('jowafrique_http_request_duration_seconds',
+                            'Durée de traitement des requêtes HTTP', ['route', 'method'],
+                            buckets=HTTP_BUCKETS)
+REQUESTS = Counter('jowafrique_http_requests_total',
+                   'Requêtes HTTP par route et code de statut', ['route', 'method', 'status'])
+DB_QUERY_LATENCY = Histogram('jowafrique_db_query_duration_seconds',
+                             'Durée d\'exécution des requêtes SQLite', ['statement'],
+                             buckets=DB_BUCKETS)
+DB_CONNECTIONS_OPEN = Gauge('jowafrique_db_connections_open',
+                            'Connexions SQLite ouvertes', multiprocess_mode='livesum')
+DB_CONNECTIONS_OPENED = Counter('jowafrique_db_connections_opened_total',
+                                'Connexions SQLite ouvertes depuis le démarrage')
+UPSTREAM_LATENCY = Histogram('jowafrique_upstream_request_duration_seconds',
+                             'Durée des appels aux services externes', ['service', 'operation'],
+                             buckets=UPSTREAM_BUCKETS)
+UPSTREAM_ERRORS = Counter('jowafrique_upstream_errors_total',
+                          'Appels en erreur aux services externes', ['service', 'operation'])
+CACHE_REQUESTS = Counter('jowafrique_cache_requests_total',
+                         'Consultations des caches par résultat (hit / miss)', ['cache', 'result'])
+CONDITIONAL_REQUESTS = Counter('jowafrique_conditional_requests_total',
+                               'Requêtes GET conditionnelles par endpoint (hit = 304)',
+                               ['endpoint', 'result'])
+
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|INDEX|TRIGGER)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?(\w+)',
+                            re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def statement_name(sql: str) -> str:
+    """Nom court d'une requête SQL pour les métriques (verbe et première table : select:meal_slots)"""
+    words = sql.split(None, 1)
+    if not words:
+        return 'empty'
+    verb = words[0].lower()
+    match = _TABLE_PATTERN.search(sql)
+    return f"{verb}:{match.group(1).lower()}" if match else verb
+
+@contextmanager
+def observe_query(sql: str, statement: Optional[str] = None):
+    """Mesure une requête SQL (histogramme, span de la trace courante, journal des requêtes lentes)"""
+    statement = statement or statement_name(sql)
+    started = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        ended = time.perf_counter_ns()
+        DB_QUERY_LATENCY.labels(statement).observe((ended - started) / 1e9)
+        record_query(statement, sql, started, ended)
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Curseur mesurant l'exécution de chaque requête (jusqu'à la première ligne pour un SELECT)"""
+
+    def execute(self, sql, parameters=()):
+        with observe_query(sql):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with observe_query(sql):
+            return super().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        with observe_query(sql_script, 'script'):
+            return super().executescript(sql_script)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connexion SQLite dont tous les curseurs sont instrumentés (à passer en factory de connect)"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+@contextmanager
+def observe_upstream(service: str, operation: str):
+    """Mesure un appel à un service externe (durée, et erreur s'il lève une exception)"""
+    started = time.perf_counter()
+    try:
+        with span(f"{service}.{operation}"):
+            yield
+    except Exception:
+        UPSTREAM_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(service, operation).observe(time.perf_counter() - started)
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+def instrument_app(app):
+    """Mesure la durée et le statut de chaque requête, par modèle de route (/api/plans/<int:plan_id>)"""
+    # Début stocké dans l'environ WSGI : les sous-requêtes de /api/batch partagent le contexte `g`
+    start_key = 'jowafrique.request_started'
+
+    @app.before_request
+    def start_timer():
+        request.environ[start_key] = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = request.environ.get(start_key)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.labels(route, request.method).observe(time.perf_counter() - started)
+            REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+        return response
+
+def render_metrics() -> tuple:
+    """Corps et type de contenu de l'exposition Prometheus (tous les workers en multiprocessus)"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -40,6 +40,7 @@ class Meal:
     rating: int = 0
     notes: Optional[str] = None
     plan_id: Optional[int] = None
+    tags: Optional[str] = None
 
 @dataclass
 class WeeklyPlan:
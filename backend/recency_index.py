@@ -0,0 +1,127 @@
+"""
+Index en mémoire des dernières utilisations des recettes (fenêtre glissante sur recipe_history)
+"""
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Optional, Set
+
+class RecencyIndex:
+    """Nom de recette -> date de dernière utilisation, sur les `horizon_weeks` dernières semaines.
+
+    Chargé une fois par worker puis tenu à jour de façon incrémentale :
+    les écritures locales sont appliquées directement, celles des autres
+    workers sont rattrapées via les nouveaux ids de recipe_history.
+    Le dictionnaire n'est lu et modifié que sous `_lock` (threads de requête
+    et tâches de fond d'un même worker).
+    """
+
+    def __init__(self, db_manager, horizon_weeks: int = 12, sync_interval: float = 1.0):
+        self.db = db_manager
+        self.horizon_weeks = horizon_weeks
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._last_used: Dict[str, str] = {}
+        self._max_id = 0
+        self._row_count = 0
+        self._loaded = False
+        self._last_sync = 0.0
+
+    def _horizon_start(self) -> str:
+        return (date.today() - timedelta(weeks=self.horizon_weeks)).isoformat()
+
+    def load(self):
+        """(Re)charge l'index depuis recipe_history"""
+        with self._lock:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT recipe_name, MAX(used_date)
+                    FROM recipe_history
+                    WHERE used_date >= ?
+                    GROUP BY recipe_name
+                """, (self._horizon_start(),))
+                self._last_used = {row[0]: row[1] for row in cursor.fetchall()}
+                cursor.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM recipe_history")
+                self._max_id, self._row_count = cursor.fetchone()
+            self._loaded = True
+            self._last_sync = time.monotonic()
+
+    def invalidate(self):
+        """Force un rechargement complet au prochain accès (après suppression)"""
+        self._loaded = False
+
+    def record(self, recipe_name: str, used_date: Optional[str], history_id: Optional[int] = None):
+        """Enregistre une utilisation écrite par ce worker"""
+        if not recipe_name or not used_date:
+            return
+        with self._lock:
+            if used_date > self._last_used.get(recipe_name, ''):
+                self._last_used[recipe_name] = used_date
+            if history_id and history_id > self._max_id:
+                self._max_id = history_id
+                self._row_count += 1
+
+    def _sync(self):
+        """Rattrape les écritures des autres workers, ou recharge si des lignes ont disparu"""
+        if not self._loaded:
+            self.load()
+            return
+        if time.monotonic() - self._last_sync < self.sync_interval:
+            return
+
+        with self._lock:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT COALESCE(MAX(id), 0), COUNT(*) FROM recipe_history")
+                max_id, row_count = cursor.fetchone()
+                if max_id == self._max_id and row_count == self._row_count:
+                    self._last_sync = time.monotonic()
+                    return
+
+                cursor.execute("""
+                    SELECT id, recipe_name, used_date
+                    FROM recipe_history
+                    WHERE id > ?
+                """, (self._max_id,))
+                new_rows = cursor.fetchall()
+
+            if row_count != self._row_count + len(new_rows):
+                reload_needed = True
+            else:
+                reload_needed = False
+                horizon = self._horizon_start()
+                for _, recipe_name, used_date in new_rows:
+                    if used_date >= horizon and used_date > self._last_used.get(recipe_name, ''):
+                        self._last_used[recipe_name] = used_date
+                self._max_id, self._row_count = max_id, row_count
+                self._last_sync = time.monotonic()
+
+        if reload_needed:
+            self.load()
+
+    def last_used(self, recipe_name: str) -> Optional[str]:
+        """Date de dernière utilisation d'une recette dans la fenêtre (ou None)"""
+        self._sync()
+        with self._lock:
+            return self._last_used.get(recipe_name)
+
+    def is_recent(self, recipe_name: str, since: date) -> bool:
+        """Vrai si la recette a été utilisée depuis `since` (simple accès au dictionnaire)"""
+        used = self.last_used(recipe_name)
+        return used is not None and used >= since.isoformat()
+
+    def used_since(self, since: date) -> Set[str]:
+        """Recettes utilisées depuis `since`"""
+        if since.isoformat() < self._horizon_start():
+            # Au-delà de la fenêtre de l'index : lecture directe
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT DISTINCT recipe_name FROM recipe_history WHERE used_date >= ?",
+                               (since.isoformat(),))
+                return {row[0] for row in cursor.fetchall()}
+
+        self._sync()
+        cutoff = since.isoformat()
+        with self._lock:
+            return {name for name, used in self._last_used.items() if used >= cutoff}
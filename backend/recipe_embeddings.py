@@ -0,0 +1,170 @@
+"""
+Plongements TF-IDF (n-grammes hachés) des recettes du catalogue et recherche des plus proches voisins
+"""
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+
+# Dimension de l'espace haché (collisions négligeables pour un catalogue de quelques milliers de recettes)
+EMBEDDING_DIM = 1024
+
+# Poids de chaque champ dans le plongement
+FIELD_WEIGHTS = {
+    'recipe_name': 1.0,
+    'main_ingredient': 2.0,
+    'ingredients': 1.0,
+    'tags': 1.5,
+    'notes': 0.5,
+    'cuisine_type': 0.5
+}
+
+# Tailles des n-grammes de caractères (robustes aux pluriels et aux accords)
+NGRAM_SIZES = (3, 4)
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+def _tokens(text: str) -> List[str]:
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return [word for word in _WORD_RE.findall(text) if len(word) > 1]
+
+def _bucket(feature: str) -> int:
+    # crc32 plutôt que hash() : stable d'un processus à l'autre
+    return zlib.crc32(feature.encode('utf-8')) % EMBEDDING_DIM
+
+def recipe_features(recipe: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """Fréquences (sous-linéaires) des mots et n-grammes d'une recette : (indices, poids)"""
+    buckets: List[int] = []
+    weights: List[float] = []
+    for field, field_weight in FIELD_WEIGHTS.items():
+        value = recipe.get(field)
+        if not value:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ' '.join(str(v) for v in value)
+        for word in _tokens(str(value)):
+            buckets.append(_bucket(f"w:{word}"))
+            weights.append(field_weight)
+            padded = f"<{word}>"
+            for n in NGRAM_SIZES:
+                for i in range(len(padded) - n + 1):
+                    buckets.append(_bucket(padded[i:i + n]))
+                    weights.append(field_weight * 0.5)
+
+    if not buckets:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+    counts = np.bincount(np.array(buckets), weights=np.array(weights), minlength=EMBEDDING_DIM)
+    indices = np.flatnonzero(counts).astype(np.int32)
+    return indices, np.log1p(counts[indices]).astype(np.float32)
+
+def encode_features(indices: np.ndarray, weights: np.ndarray) -> Tuple[bytes, bytes]:
+    """Sérialise un plongement creux pour recipe_embeddings"""
+    return indices.astype(np.int32).tobytes(), weights.astype(np.float32).tobytes()
+
+class RecipeSimilarityIndex:
+    """Matrice TF-IDF normalisée des recettes du catalogue, en mémoire dans chaque worker.
+
+    Les fréquences sont calculées à l'ajout de la recette (recipe_embeddings) ;
+    l'IDF et la normalisation sont appliqués au chargement, qui est refait dès
+    que la table change (nombre de lignes ou dernière mise à jour).
+    """
+
+    def __init__(self, db_manager, sync_interval: float = 5.0):
+        self.db = db_manager
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self._idf = np.ones(EMBEDDING_DIM, dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._rows_by_name: Dict[str, int] = {}
+        self._signature = None
+        self._last_sync = 0.0
+
+    def _current_signature(self, cursor) -> tuple:
+        cursor.execute("SELECT COUNT(*), COALESCE(MAX(recipe_id), 0), COALESCE(MAX(updated_at), 0) FROM recipe_embeddings")
+        return tuple(cursor.fetchone())
+
+    def load(self):
+        """(Re)construit la matrice depuis recipe_embeddings"""
+        with self._lock:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                signature = self._current_signature(cursor)
+                cursor.execute("""
+                    SELECT e.recipe_id, m.recipe_name, e.features, e.weights
+                    FROM recipe_embeddings e
+                    JOIN meal_slots m ON m.id = e.recipe_id
+                    WHERE m.plan_id IS NULL
+                    ORDER BY e.recipe_id
+                """)
+                rows = cursor.fetchall()
+
+            tf = np.zeros((len(rows), EMBEDDING_DIM), dtype=np.float32)
+            for i, row in enumerate(rows):
+                tf[i, np.frombuffer(row[2], dtype=np.int32)] = np.frombuffer(row[3], dtype=np.float32)
+
+            document_frequency = np.count_nonzero(tf, axis=0)
+            idf = (np.log((1 + len(rows)) / (1 + document_frequency)) + 1).astype(np.float32)
+            matrix = tf * idf
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms > 0, norms, 1)
+
+            self._matrix = matrix
+            self._idf = idf
+            self._ids = np.array([row[0] for row in rows], dtype=np.int64)
+            self._rows_by_name = {}
+            for i, row in enumerate(rows):
+                self._rows_by_name.setdefault(row[1], i)
+            self._signature = signature
+            self._last_sync = time.monotonic()
+
+    def _sync(self):
+        if self._signature is None:
+            self.load()
+            return
+        if time.monotonic() - self._last_sync < self.sync_interval:
+            return
+        with self.db.get_connection() as conn:
+            signature = self._current_signature(conn.cursor())
+        if signature != self._signature:
+            self.load()
+        else:
+            self._last_sync = time.monotonic()
+
+    def _query_vector(self, recipe: Dict[str, Any]) -> Optional[np.ndarray]:
+        row = self._rows_by_name.get(recipe.get('recipe_name'))
+        if row is not None:
+            return self._matrix[row]
+        # Recette hors catalogue (Jow, IA...) : plongée à la volée
+        indices, weights = recipe_features(recipe)
+        if not len(indices):
+            return None
+        vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+        vector[indices] = weights * self._idf[indices]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def similar(self, recipe: Dict[str, Any], k: int = 5) -> List[Tuple[int, float]]:
+        """Les k recettes du catalogue les plus proches (recherche exacte) : [(id, similarité cosinus)]"""
+        self._sync()
+        matrix, ids = self._matrix, self._ids
+        query = self._query_vector(recipe)
+        if query is None or not len(ids):
+            return []
+
+        scores = matrix @ query
+        # La recette elle-même (et ses doublons de nom) n'est pas une variation
+        own = self._rows_by_name.get(recipe.get('recipe_name'))
+        if own is not None:
+            scores[own] = -1.0
+        if recipe.get('id') is not None:
+            scores[ids == recipe['id']] = -1.0
+
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
@@ -0,0 +1,176 @@
+"""
+Profilage statistique permanent des workers : piles échantillonnées pendant le traitement des requêtes
+et agrégées au format « collapsed stacks » (flamegraph.pl, speedscope, inferno)
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from flask import request
+
+# Fréquence d'échantillonnage (Hz) et part maximale du temps consacrée à l'échantillonnage
+SAMPLING_PROFILER_HZ = float(os.getenv('SAMPLING_PROFILER_HZ', '100'))
+SAMPLING_PROFILER_MAX_OVERHEAD = 0.02
+# Nombre maximal de piles distinctes conservées par worker (les suivantes sont regroupées)
+SAMPLING_PROFILER_MAX_STACKS = 20000
+SAMPLING_PROFILER_MAX_DEPTH = 128
+# Répertoire où chaque worker publie ses piles (fusionnées par l'endpoint d'administration)
+SAMPLING_PROFILER_DIR = os.getenv('SAMPLING_PROFILER_DIR', 'logs/sampling_profiles')
+SAMPLING_PROFILER_FLUSH_INTERVAL = 10.0
+# Piles d'un worker arrêté (max_requests, redémarrage) conservées pendant cette durée (secondes)
+SAMPLING_PROFILER_RETENTION = float(os.getenv('SAMPLING_PROFILER_RETENTION', '3600'))
+
+OVERFLOW_STACK = '[piles tronquées]'
+
+class SamplingProfiler:
+    """Échantillonne les piles des threads qui traitent une requête (sys._current_frames).
+
+    Le thread d'échantillonnage mesure son propre coût et espace les échantillons pour
+    rester sous SAMPLING_PROFILER_MAX_OVERHEAD ; les threads inactifs ne sont pas
+    échantillonnés, le profil reflète donc uniquement le trafic réel.
+    """
+
+    def __init__(self, hz: float = SAMPLING_PROFILER_HZ, output_dir: Optional[str] = SAMPLING_PROFILER_DIR,
+                 max_stacks: int = SAMPLING_PROFILER_MAX_STACKS):
+        self.interval = 1.0 / hz
+        self.output_dir = output_dir
+        self.max_stacks = max_stacks
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sampling_time = 0.0
+        self.started_at = time.monotonic()
+        self._active_threads: Dict[int, int] = {}
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def enter(self):
+        """Le thread courant commence à traiter une requête (les sous-requêtes sont imbriquées)"""
+        ident = threading.get_ident()
+        self._active_threads[ident] = self._active_threads.get(ident, 0) + 1
+
+    def leave(self):
+        ident = threading.get_ident()
+        depth = self._active_threads.get(ident, 0) - 1
+        if depth > 0:
+            self._active_threads[ident] = depth
+        else:
+            self._active_threads.pop(ident, None)
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+            self._labels[code] = label
+        return label
+
+    def sample(self):
+        """Un échantillon : la pile de chaque thread actif, de la racine vers la feuille"""
+        active = list(self._active_threads)
+        if not active:
+            return
+        frames = sys._current_frames()
+        collapsed = []
+        for ident in active:
+            frame = frames.get(ident)
+            names = []
+            while frame is not None and len(names) < SAMPLING_PROFILER_MAX_DEPTH:
+                names.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if names:
+                collapsed.append(';'.join(reversed(names)))
+        del frames
+        with self._lock:
+            for stack in collapsed:
+                if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                    stack = OVERFLOW_STACK
+                self.stacks[stack] += 1
+            self.samples += 1
+
+    def _loop(self):
+        last_flush = time.monotonic()
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"Erreur échantillonnage du profil: {e}")
+            cost = time.perf_counter() - started
+            self.sampling_time += cost
+            # Attente allongée si l'échantillon a coûté plus que le budget de surcoût
+            self._stop.wait(max(self.interval - cost, cost / SAMPLING_PROFILER_MAX_OVERHEAD))
+            if self.output_dir and time.monotonic() - last_flush >= SAMPLING_PROFILER_FLUSH_INTERVAL:
+                last_flush = time.monotonic()
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f"Erreur écriture du profil échantillonné: {e}")
+
+    def overhead(self) -> float:
+        """Part du temps écoulé passée à échantillonner"""
+        elapsed = time.monotonic() - self.started_at
+        return self.sampling_time / elapsed if elapsed > 0 else 0.0
+
+    def collapsed(self) -> str:
+        with self._lock:
+            items = sorted(self.stacks.items())
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def flush(self):
+        """Publie les piles de ce worker (écriture atomique, un fichier par processus)"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{os.getpid()}.collapsed")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        os.replace(tmp_path, path)
+
+    def merged(self) -> str:
+        """Piles de tous les workers : fichiers publiés, plus l'état courant de ce worker"""
+        totals: Counter = Counter()
+        own_file = f"{os.getpid()}.collapsed"
+        if self.output_dir and os.path.isdir(self.output_dir):
+            expired_before = time.time() - SAMPLING_PROFILER_RETENTION
+            for name in os.listdir(self.output_dir):
+                if not name.endswith('.collapsed') or name == own_file:
+                    continue
+                path = os.path.join(self.output_dir, name)
+                try:
+                    if os.path.getmtime(path) < expired_before:
+                        os.remove(path)
+                        continue
+                    with open(path, encoding='utf-8') as f:
+                        for line in f:
+                            stack, _, count = line.rstrip('\n').rpartition(' ')
+                            if stack and count.isdigit():
+                                totals[stack] += int(count)
+                except OSError as e:
+                    print(f"Erreur lecture du profil {name}: {e}")
+        with self._lock:
+            totals.update(self.stacks)
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(totals.items()))
+
+    def install(self, app):
+        """Marque les threads qui traitent une requête de `app`"""
+        key = 'jowafrique.sampled'
+
+        @app.before_request
+        def enter_request():
+            request.environ[key] = True
+            self.enter()
+
+        @app.teardown_request
+        def leave_request(exc=None):
+            if request.environ.pop(key, None):
+                self.leave()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
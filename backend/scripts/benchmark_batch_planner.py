@@ -0,0 +1,55 @@
+"""
+Benchmark de la génération en lot : débit (plans/s) selon le nombre de processus
+"""
+import sys
+import os
+import argparse
+import random
+import time
+
+# Ajouter le répertoire backend au path
+sys.path.append(os.path.dirname(__file__) + '/..')
+
+from services.rule_engine import rule_registry
+from services.batch_planner import solve_batch
+from benchmark_plan_solver import build_catalog
+
+def run_benchmark(households: int, catalog_size: int, profiles: int,
+                  workers_list: list, time_budget: float, include_lunch: bool):
+    """Mesure le débit de résolution pour chaque nombre de processus"""
+    rng = random.Random(7)
+    catalog = build_catalog(catalog_size)
+    rules = rule_registry.get()
+
+    # Un jeu de candidats par profil de préférences (sous-ensembles du catalogue)
+    candidate_sets = {key: rng.sample(catalog, min(len(catalog), catalog_size // 2))
+                      for key in range(profiles)}
+    used_recipes = {r['recipe_name'] for r in catalog[:56]}
+    tasks = [(i, i % profiles, include_lunch, i // profiles) for i in range(households)]
+
+    print(f"Foyers: {households} | catalogue: {catalog_size} | profils: {profiles} | "
+          f"budget: {time_budget * 1000:.0f} ms | coeurs disponibles: {os.cpu_count()}")
+    print(f"{'processus':>10} {'durée (s)':>10} {'plans/s':>9} {'accélération':>13}")
+
+    baseline = None
+    for workers in workers_list:
+        started = time.perf_counter()
+        solved = sum(1 for _ in solve_batch(candidate_sets, used_recipes, tasks, rules,
+                                            workers, time_budget))
+        elapsed = time.perf_counter() - started
+        rate = solved / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>10} {elapsed:>10.2f} {rate:>9.1f} {rate / baseline:>12.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la génération en lot")
+    parser.add_argument('--households', type=int, default=200)
+    parser.add_argument('--catalog', type=int, default=2000)
+    parser.add_argument('--profiles', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--budget', type=float, default=0.5, help="Budget de temps en secondes")
+    parser.add_argument('--lunch', action='store_true', help="Inclure les déjeuners")
+    args = parser.parse_args()
+
+    run_benchmark(args.households, args.catalog, args.profiles, args.workers, args.budget, args.lunch)
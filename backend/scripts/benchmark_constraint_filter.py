@@ -0,0 +1,54 @@
+"""
+Benchmark du filtrage vectorisé des recettes candidates (7 jours)
+"""
+import sys
+import os
+import argparse
+import time
+import numpy as np
+
+# Ajouter le répertoire backend au path
+sys.path.append(os.path.dirname(__file__) + '/..')
+
+from services.candidate_pool import CandidatePool
+from services.rule_engine import rule_registry
+from services.plan_solver import DAYS_OF_WEEK
+from benchmark_plan_solver import build_catalog
+
+def run_benchmark(size: int, repeat: int):
+    """Mesure le filtrage d'un pool de `size` recettes pour chaque jour de la semaine"""
+    catalog = build_catalog(size)
+    # Historique réaliste : 4 semaines de déjeuners et dîners
+    used_recipes = {r['recipe_name'] for r in catalog[:4 * 14]}
+
+    rules = rule_registry.get()
+    started = time.perf_counter()
+    pool = CandidatePool(catalog, rules.restricted_ingredients)
+    compile_ms = (time.perf_counter() - started) * 1000
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        recent = pool.recency_mask(used_recipes)
+        base_scores = pool.scores(2.0, 3.0, {'cameroun': 4.0})
+        current_plan_ingredients = {}
+        previous_ingredient = None
+        for day in DAYS_OF_WEEK:
+            mask = rules.compile_mask(pool, used_recipes, current_plan_ingredients, previous_ingredient, recent)
+            scores = np.where(mask, base_scores, -np.inf)
+            best = catalog[int(scores.argmax())]
+            previous_ingredient = best['main_ingredient']
+            current_plan_ingredients[previous_ingredient] = current_plan_ingredients.get(previous_ingredient, 0) + 1
+        timings.append((time.perf_counter() - started) * 1000)
+
+    print(f"Recettes: {size} | compilation: {compile_ms:.1f} ms")
+    print(f"Filtrage + scoring 7 jours: moyenne {sum(timings) / len(timings):.2f} ms, "
+          f"min {min(timings):.2f} ms, max {max(timings):.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du filtrage vectorisé")
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    run_benchmark(args.size, args.repeat)
@@ -0,0 +1,69 @@
+"""
+Benchmark du solveur de planification sur des catalogues synthétiques
+"""
+import sys
+import os
+import random
+import argparse
+import time
+
+# Ajouter le répertoire backend au path
+sys.path.append(os.path.dirname(__file__) + '/..')
+
+from services.rule_engine import rule_registry
+from services.plan_solver import PlanSolver
+
+INGREDIENTS = [
+    'Riz', 'Pâtes', 'Poulet', 'Poisson', 'Boeuf', 'Arachides', 'Haricots', 'Plantain',
+    'Manioc', 'Taro', 'Eru', 'Ndolé', 'Igname', 'Crevettes', 'Porc', 'Oeufs',
+    'Maïs', 'Gombo', 'Aubergine', 'Patate douce'
+]
+CUISINES = ['cameroun', 'asiatique', 'mexican', 'french']
+
+def build_catalog(size: int, seed: int = 42) -> list:
+    """Construit un catalogue synthétique de recettes"""
+    rng = random.Random(seed)
+    return [{
+        'recipe_name': f"Recette {i}",
+        'main_ingredient': rng.choice(INGREDIENTS),
+        'cuisine_type': rng.choice(CUISINES),
+        'rating': rng.randint(0, 5),
+        'is_favorite': rng.random() < 0.1,
+        'prep_time': rng.randint(10, 60),
+        'cook_time': rng.randint(10, 90)
+    } for i in range(size)]
+
+def run_benchmark(sizes: list, time_budget: float, include_lunch: bool, repeat: int):
+    """Mesure le temps de résolution pour chaque taille de catalogue"""
+    solver = PlanSolver.from_rules(rule_registry.get(), time_budget=time_budget)
+    slots = solver.build_slots(include_lunch)
+
+    print(f"Créneaux: {len(slots)} | budget: {time_budget * 1000:.0f} ms | répétitions: {repeat}")
+    print(f"{'recettes':>10} {'compilation (ms)':>17} {'moyenne (ms)':>14} {'max (ms)':>10} "
+          f"{'noeuds':>8} {'score':>8} {'optimal':>8}")
+
+    for size in sizes:
+        catalog = build_catalog(size)
+        used_recipes = {r['recipe_name'] for r in catalog[:size // 10]}
+
+        started = time.perf_counter()
+        pool = solver.compile_pool(catalog)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = solver.solve(pool, slots, used_recipes)
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f"{size:>10} {compile_ms:>17.2f} {sum(timings) / len(timings):>14.2f} {max(timings):>10.2f} "
+              f"{result.nodes:>8} {result.score:>8.1f} {str(result.optimal):>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du solveur de planification")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 50000])
+    parser.add_argument('--budget', type=float, default=0.5, help="Budget de temps en secondes")
+    parser.add_argument('--lunch', action='store_true', help="Inclure les déjeuners")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.sizes, args.budget, args.lunch, args.repeat)
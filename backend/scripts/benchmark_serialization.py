@@ -0,0 +1,111 @@
+"""
+Benchmark de la sérialisation des repas : dict + formatage + json standard vs row factory + orjson
+"""
+import sys
+import os
+import argparse
+import tempfile
+import time
+
+# Ajouter le répertoire backend au path
+sys.path.append(os.path.dirname(__file__) + '/..')
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from database import DatabaseManager, DAYS_OF_WEEK
+from serialization import OrjsonProvider, api_meal_rows, orjson
+
+def legacy_format(meal_data: dict) -> dict:
+    """Formatage historique de format_meal_response (deux dictionnaires et des .get par ligne)"""
+    meal_type_map = {'Petit-déjeuner': 'DÉJEUNER', 'Déjeuner': 'DÉJEUNER', 'Dîner': 'DÎNER'}
+    meal_type = meal_type_map.get(meal_data.get('meal_type', 'Dîner'), 'DÎNER')
+    time_map = {'DÉJEUNER': '12:00', 'DÎNER': '19:00'}
+    return {
+        'id': meal_data['id'],
+        'type': meal_type,
+        'time': time_map.get(meal_type, '19:00'),
+        'name': meal_data['recipe_name'],
+        'calories': f"{meal_data['prep_time'] * 10 + meal_data['cook_time'] * 5} kcal" if meal_data['prep_time'] and meal_data['cook_time'] else "N/A",
+        'weight': f"{meal_data['prep_time'] * 15} gm" if meal_data['prep_time'] else "N/A",
+        'image': meal_data['image_url'] or None,
+        'isEditable': True,
+        'jowId': meal_data['jow_recipe_id'],
+        'url': meal_data['jow_recipe_url'],
+        'videoUrl': meal_data.get('video_url'),
+        'ingredient': meal_data['main_ingredient'],
+        'cuisine': meal_data['cuisine_type'],
+        'prepTime': meal_data['prep_time'],
+        'cookTime': meal_data['cook_time'],
+        'isFavorite': bool(meal_data['is_favorite']),
+        'rating': meal_data['rating'] or 0,
+        'notes': meal_data['notes'],
+        'dayOfWeek': meal_data['day_of_week'],
+        'mealType': meal_data.get('meal_type', 'Dîner')
+    }
+
+def seed(db: DatabaseManager, meals: int) -> int:
+    """Un plan de `meals` repas, inséré directement"""
+    with db.get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO weekly_plans (plan_name, week_start_date) VALUES ('Benchmark', '2025-01-06')")
+        plan_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO meal_slots (plan_id, day_of_week, meal_type, recipe_name, jow_recipe_id,
+                                    jow_recipe_url, main_ingredient, cuisine_type, image_url,
+                                    prep_time, cook_time, is_favorite, rating, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(plan_id, DAYS_OF_WEEK[i % 7], 'Dîner' if i % 2 else 'Déjeuner', f"Recette {i}",
+               f"jow-{i}", f"https://jow.fr/recipes/{i}", 'Poulet', 'cameroun',
+               'https://images.example/r.jpg', 20 + i % 30, 30 + i % 40, i % 5 == 0, i % 6,
+               'Notes de la recette') for i in range(meals)])
+        conn.commit()
+    return plan_id
+
+def best_of(repeat: int, fn) -> tuple:
+    timings, size = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        size = len(fn())
+        timings.append(time.perf_counter() - started)
+    return min(timings), size
+
+def run_benchmark(meals: int, repeat: int):
+    with tempfile.TemporaryDirectory() as directory:
+        db = DatabaseManager(os.path.join(directory, 'benchmark.db'))
+        plan_id = seed(db, meals)
+
+        stdlib_app, orjson_app = Flask('stdlib'), Flask('orjson')
+        stdlib_app.json = DefaultJSONProvider(stdlib_app)
+        if orjson is not None:
+            orjson_app.json = OrjsonProvider(orjson_app)
+
+        def respond(app, payload):
+            with app.app_context():
+                return app.json.response(payload).get_data()
+
+        cases = [
+            ("dict(row) + formatage + json", lambda: respond(
+                stdlib_app, [legacy_format(m) for m in db.get_plan_meals(plan_id)])),
+            ("row factory + json", lambda: respond(stdlib_app, db.get_plan_meals(plan_id, api_meal_rows)))
+        ]
+        if orjson is not None:
+            cases.append(("row factory + orjson", lambda: respond(
+                orjson_app, db.get_plan_meals(plan_id, api_meal_rows))))
+        else:
+            print("orjson non installé : seul le fournisseur standard est mesuré")
+
+        print(f"Repas: {meals} | répétitions: {repeat}")
+        print(f"{'chemin':<32} {'durée (ms)':>11} {'taille (Ko)':>12} {'accélération':>13}")
+        baseline = None
+        for label, fn in cases:
+            elapsed, size = best_of(repeat, fn)
+            baseline = baseline or elapsed
+            print(f"{label:<32} {elapsed * 1000:>11.1f} {size / 1024:>12.0f} {baseline / elapsed:>12.2f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la sérialisation des repas")
+    parser.add_argument('--meals', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    run_benchmark(args.meals, args.repeat)
@@ -0,0 +1,97 @@
+"""
+Benchmark du démarrage à froid d'un worker : `python -X importtime -c "import api"` sur une base migrée.
+
+Échoue (code de sortie 1) si l'import dépasse son budget, si un module lourd est chargé
+au démarrage ou si le démarrage modifie la base (DDL exécuté par le worker).
+"""
+import sys
+import os
+import argparse
+import re
+import subprocess
+import tempfile
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Budgets de temps d'import cumulé (ms), meilleur des essais
+IMPORT_BUDGET_MS = 600
+MODULE_BUDGETS_MS = {
+    'database': 80,
+    'serialization': 30,
+    'services.meal_service': 20,
+    'services.plan_service': 20,
+    'services.shopping_service': 20
+}
+
+# Modules chargés à la première utilisation seulement (SDK Gemini, client Jow, numpy)
+LAZY_MODULES = ('google.generativeai', 'jow_api', 'numpy')
+
+_IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def parse_importtime(output: str) -> dict:
+    """Temps d'import cumulé (ms) par module, depuis la sortie de -X importtime"""
+    cumulative = {}
+    for line in output.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2)) / 1000
+    return cumulative
+
+def import_api(directory: str) -> dict:
+    """Importe api dans un nouvel interpréteur (répertoire courant : celui de la base)"""
+    env = {key: value for key, value in os.environ.items() if key != 'PROMETHEUS_MULTIPROC_DIR'}
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [BACKEND_DIR, env.get('PYTHONPATH')]))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import api'],
+                            cwd=directory, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import api en échec:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+def database_state(path: str) -> tuple:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def run_benchmark(repeat: int, budget_ms: float, top: int) -> list:
+    """Mesure le démarrage et renvoie la liste des dépassements"""
+    with tempfile.TemporaryDirectory() as directory:
+        subprocess.run([sys.executable, os.path.join(BACKEND_DIR, 'scripts', 'migrate.py')],
+                       cwd=directory, check=True, capture_output=True)
+        db_path = os.path.join(directory, 'jowafrique.db')
+        before = database_state(db_path)
+
+        # Premier essai écarté : compilation des .pyc et cache disque
+        import_api(directory)
+        runs = [import_api(directory) for _ in range(repeat)]
+        after = database_state(db_path)
+
+    best = {module: min(run.get(module, 0.0) for run in runs) for module in runs[0]}
+    print(f"Essais: {repeat} | import api: {best['api']:.1f} ms (budget: {budget_ms:.0f} ms)")
+    print(f"{'module':<40} {'cumulé (ms)':>12}")
+    heaviest = sorted((m for m in best if m != 'api'), key=best.get, reverse=True)[:top]
+    for module in heaviest:
+        print(f"{module:<40} {best[module]:>12.1f}")
+
+    failures = []
+    if best['api'] > budget_ms:
+        failures.append(f"import api: {best['api']:.1f} ms > {budget_ms:.0f} ms")
+    for module, budget in MODULE_BUDGETS_MS.items():
+        if best.get(module, 0.0) > budget:
+            failures.append(f"{module}: {best[module]:.1f} ms > {budget} ms")
+    for module in LAZY_MODULES:
+        if module in best:
+            failures.append(f"{module} chargé au démarrage (import à déplacer au premier usage)")
+    if after != before:
+        failures.append("la base a été modifiée au démarrage (DDL hors de scripts/migrate.py)")
+    return failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark du démarrage à froid des workers")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    failures = run_benchmark(args.repeat, args.budget_ms, args.top)
+    for failure in failures:
+        print(f"ÉCHEC {failure}")
+    sys.exit(1 if failures else 0)
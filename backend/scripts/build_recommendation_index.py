@@ -0,0 +1,37 @@
+"""
+Construit (ou met à jour) l'index de recommandation item-item
+"""
+import sys
+import os
+import argparse
+import time
+
+# Ajouter le répertoire backend au path
+sys.path.append(os.path.dirname(__file__) + '/..')
+
+from database import DatabaseManager
+from services.recommendation_index import RecommendationIndexBuilder, RecommendationIndex, INDEX_DIR
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construction de l'index de recommandation")
+    parser.add_argument('--db', default="jowafrique.db")
+    parser.add_argument('--index-dir', default=INDEX_DIR)
+    parser.add_argument('--full', action='store_true', help="Reconstruction complète")
+    parser.add_argument('--top-k', type=int, default=20)
+    args = parser.parse_args()
+
+    builder = RecommendationIndexBuilder(DatabaseManager(args.db), args.index_dir, args.top_k)
+    result = builder.build(full=args.full)
+    mode = 'incrémentale' if result['incremental'] else 'complète'
+    print(f"Index ({mode}): {result['items']} recettes, {result['pairs']} paires, "
+          f"{result['new_meals']} nouveaux repas en {result['elapsed']} s")
+
+    # Temps d'une recherche de voisins
+    index = RecommendationIndex(args.index_dir)
+    items = index._items if index.available else []
+    if items:
+        started = time.perf_counter()
+        for name in items:
+            index.neighbors(name, 10)
+        per_lookup = (time.perf_counter() - started) / len(items) * 1e6
+        print(f"Recherche top-10: {per_lookup:.1f} µs en moyenne")
@@ -0,0 +1,53 @@
+"""
+Génère en lot les plannings de plusieurs foyers pour une semaine donnée
+"""
+import sys
+import os
+import json
+import argparse
+from datetime import date, timedelta
+
+# Ajouter le répertoire backend au path
+sys.path.append(os.path.dirname(__file__) + '/..')
+
+from database import DatabaseManager
+from models import UserPreferences, CuisineType, BudgetLevel
+from services.batch_planner import BatchPlanner, HouseholdRequest
+
+def load_households(path: str) -> list:
+    """Charge les foyers depuis un fichier JSON ([{planName, preferences, includeLunch}])"""
+    with open(path, encoding='utf-8') as f:
+        households = json.load(f)
+    return [HouseholdRequest(
+        plan_name=h.get('planName') or f"Planning foyer {i + 1}",
+        preferences=UserPreferences(
+            cuisines=[CuisineType(c) for c in h.get('preferences', {}).get('cuisines', ['cameroun'])],
+            budget=BudgetLevel(h.get('preferences', {}).get('budget', 'modéré')),
+            light=h.get('preferences', {}).get('light', False),
+            vegetarian=h.get('preferences', {}).get('vegetarian', False)
+        ),
+        include_lunch=h.get('includeLunch', False)
+    ) for i, h in enumerate(households)]
+
+def print_progress(done: int, total: int, elapsed: float):
+    """Affiche l'avancement sur une ligne"""
+    rate = done / elapsed if elapsed else 0
+    end = '\n' if done == total else '\r'
+    print(f"[{done}/{total}] {done * 100 // total}% - {rate:.1f} plans/s", end=end, flush=True)
+
+if __name__ == "__main__":
+    next_monday = date.today() + timedelta(days=7 - date.today().weekday())
+    parser = argparse.ArgumentParser(description="Génération de plannings en lot")
+    parser.add_argument('input', help="Fichier JSON des foyers")
+    parser.add_argument('--week-start', type=date.fromisoformat, default=next_monday)
+    parser.add_argument('--workers', type=int, default=None, help="Nombre de processus")
+    parser.add_argument('--db', default="jowafrique.db")
+    parser.add_argument('--dry-run', action='store_true', help="Ne rien écrire en base")
+    args = parser.parse_args()
+
+    planner = BatchPlanner(DatabaseManager(args.db), workers=args.workers)
+    result = planner.generate(load_households(args.input), args.week_start,
+                              dry_run=args.dry_run, progress=print_progress)
+
+    print(f"{len(result['plans'])} plannings en {result['elapsed']} s "
+          f"({result['plans_per_second']} plans/s, {result['workers']} processus)")
@@ -12,6 +12,9 @@ from database import DatabaseManager
 from services.meal_service import MealService
 from models import CuisineType, MealType
 
+# Les quantités des ingrédients ci-dessous sont données pour ce nombre de portions
+SEED_SERVINGS = 4
+
 def init_cameroon_recipes():
     """Initialise les recettes camerounaises en base de données"""
     
@@ -33,7 +36,16 @@ def init_cameroon_recipes():
             'notes': 'Plat national du Cameroun aux arachides et légumes',
             'is_favorite': True,
             'rating': 5,
-            'tags': ['traditionnel', 'national', 'arachides', 'légumes']
+            'tags': ['traditionnel', 'national', 'arachides', 'légumes'],
+            'ingredients': [
+                ('Feuilles de ndolé', 500, 'g'),
+                ('Arachides', 300, 'g'),
+                ('Crevettes séchées', 100, 'g'),
+                ('Bœuf', 400, 'g'),
+                ('Oignons', 2, 'pièce'),
+                ('Ail', 3, 'gousse'),
+                ('Huile de palme', 5, 'cl')
+            ]
         },
         {
             'recipe_name': 'Poulet DG',
@@ -45,7 +57,16 @@ def init_cameroon_recipes():
             'notes': 'Poulet sauté aux légumes, spécialité camerounaise',
             'is_favorite': True,
             'rating': 5,
-            'tags': ['poulet', 'légumes', 'sauté', 'populaire']
+            'tags': ['poulet', 'légumes', 'sauté', 'populaire'],
+            'ingredients': [
+                ('Poulet', 1.2, 'kg'),
+                ('Plantain', 4, 'pièce'),
+                ('Carottes', 3, 'pièce'),
+                ('Haricots verts', 200, 'g'),
+                ('Poivrons', 2, 'pièce'),
+                ('Oignons', 2, 'pièce'),
+                ('Huile', 10, 'cl')
+            ]
         },
         {
             'recipe_name': 'Riz au gras',
@@ -57,7 +78,15 @@ def init_cameroon_recipes():
             'notes': 'Riz parfumé aux légumes et épices',
             'is_favorite': False,
             'rating': 4,
-            'tags': ['riz', 'légumes', 'épices', 'accompagnement']
+            'tags': ['riz', 'légumes', 'épices', 'accompagnement'],
+            'ingredients': [
+                ('Riz', 500, 'g'),
+                ('Tomates', 4, 'pièce'),
+                ('Oignons', 2, 'pièce'),
+                ('Carottes', 2, 'pièce'),
+                ('Bœuf', 300, 'g'),
+                ('Huile', 6, 'cl')
+            ]
         },
         {
             'recipe_name': 'Eru',
@@ -69,7 +98,15 @@ def init_cameroon_recipes():
             'notes': 'Plat aux feuilles d\'eru et poisson fumé',
             'is_favorite': True,
             'rating': 5,
-            'tags': ['eru', 'poisson', 'feuilles', 'traditionnel']
+            'tags': ['eru', 'poisson', 'feuilles', 'traditionnel'],
+            'ingredients': [
+                ("Feuilles d'eru", 400, 'g'),
+                ('Waterleaf', 300, 'g'),
+                ('Poisson fumé', 200, 'g'),
+                ('Peau de bœuf', 200, 'g'),
+                ('Huile de palme', 20, 'cl'),
+                ('Crevettes séchées', 50, 'g')
+            ]
         },
         {
             'recipe_name': 'Koki',
@@ -81,7 +118,14 @@ def init_cameroon_recipes():
             'notes': 'Haricots pilés cuits dans des feuilles de bananier',
             'is_favorite': False,
             'rating': 4,
-            'tags': ['haricots', 'feuilles', 'traditionnel', 'végétarien']
+            'tags': ['haricots', 'feuilles', 'traditionnel', 'végétarien'],
+            'ingredients': [
+                ('Haricots cornille', 500, 'g'),
+                ('Huile de palme', 15, 'cl'),
+                ('Feuilles de bananier', 8, 'pièce'),
+                ('Piment', 1, 'pièce'),
+                ('Feuilles de macabo', 100, 'g')
+            ]
         },
         {
             'recipe_name': 'Achu',
@@ -93,7 +137,14 @@ def init_cameroon_recipes():
             'notes': 'Taro pilé avec sauce aux arachides',
             'is_favorite': False,
             'rating': 4,
-            'tags': ['taro', 'arachides', 'pilé', 'traditionnel']
+            'tags': ['taro', 'arachides', 'pilé', 'traditionnel'],
+            'ingredients': [
+                ('Taro', 1.5, 'kg'),
+                ('Huile de palme', 20, 'cl'),
+                ("Pâte d'arachide", 150, 'g'),
+                ('Bœuf', 300, 'g'),
+                ('Sel gemme', 1, 'c. à café')
+            ]
         },
         {
             'recipe_name': 'Nkui',
@@ -105,7 +156,14 @@ def init_cameroon_recipes():
             'notes': 'Épinards aux arachides et poisson',
             'is_favorite': False,
             'rating': 3,
-            'tags': ['épinards', 'arachides', 'poisson', 'légumes']
+            'tags': ['épinards', 'arachides', 'poisson', 'légumes'],
+            'ingredients': [
+                ('Épinards', 600, 'g'),
+                ('Arachides', 200, 'g'),
+                ('Poisson fumé', 150, 'g'),
+                ('Oignons', 1, 'pièce'),
+                ('Huile', 3, 'c. à soupe')
+            ]
         },
         {
             'recipe_name': 'Poulet braisé',
@@ -117,7 +175,15 @@ def init_cameroon_recipes():
             'notes': 'Poulet mariné et grillé aux épices',
             'is_favorite': True,
             'rating': 5,
-            'tags': ['poulet', 'grillé', 'épices', 'mariné']
+            'tags': ['poulet', 'grillé', 'épices', 'mariné'],
+            'ingredients': [
+                ('Poulet', 1.5, 'kg'),
+                ('Oignons', 2, 'pièce'),
+                ('Ail', 4, 'gousse'),
+                ('Gingembre', 30, 'g'),
+                ('Piment', 1, 'pièce'),
+                ('Huile', 4, 'c. à soupe')
+            ]
         },
         {
             'recipe_name': 'Poisson braisé',
@@ -129,7 +195,15 @@ def init_cameroon_recipes():
             'notes': 'Poisson grillé aux épices et légumes',
             'is_favorite': True,
             'rating': 4,
-            'tags': ['poisson', 'grillé', 'épices', 'légumes']
+            'tags': ['poisson', 'grillé', 'épices', 'légumes'],
+            'ingredients': [
+                ('Poisson', 1, 'kg'),
+                ('Tomates', 3, 'pièce'),
+                ('Oignons', 2, 'pièce'),
+                ('Ail', 3, 'gousse'),
+                ('Gingembre', 20, 'g'),
+                ('Huile', 3, 'c. à soupe')
+            ]
         },
         {
             'recipe_name': 'Plantain mûr',
@@ -141,7 +215,11 @@ def init_cameroon_recipes():
             'notes': 'Plantain mûr grillé ou frit',
             'is_favorite': False,
             'rating': 3,
-            'tags': ['plantain', 'grillé', 'frit', 'accompagnement']
+            'tags': ['plantain', 'grillé', 'frit', 'accompagnement'],
+            'ingredients': [
+                ('Plantain', 6, 'pièce'),
+                ('Huile', 25, 'cl')
+            ]
         },
         {
             'recipe_name': 'Taro aux épinards',
@@ -153,7 +231,14 @@ def init_cameroon_recipes():
             'notes': 'Taro aux épinards et arachides',
             'is_favorite': False,
             'rating': 4,
-            'tags': ['taro', 'épinards', 'arachides', 'végétarien']
+            'tags': ['taro', 'épinards', 'arachides', 'végétarien'],
+            'ingredients': [
+                ('Taro', 1, 'kg'),
+                ('Épinards', 400, 'g'),
+                ("Pâte d'arachide", 150, 'g'),
+                ('Oignons', 1, 'pièce'),
+                ('Huile de palme', 10, 'cl')
+            ]
         },
         {
             'recipe_name': 'Kati-kati',
@@ -165,7 +250,14 @@ def init_cameroon_recipes():
             'notes': 'Poulet grillé aux épices et oignons',
             'is_favorite': True,
             'rating': 4,
-            'tags': ['poulet', 'grillé', 'épices', 'oignons']
+            'tags': ['poulet', 'grillé', 'épices', 'oignons'],
+            'ingredients': [
+                ('Poulet', 1.2, 'kg'),
+                ('Oignons', 3, 'pièce'),
+                ('Piment', 2, 'pièce'),
+                ('Huile de palme', 8, 'cl'),
+                ('Ail', 3, 'gousse')
+            ]
         },
         {
             'recipe_name': 'Soupe de poisson',
@@ -177,7 +269,15 @@ def init_cameroon_recipes():
             'notes': 'Soupe traditionnelle au poisson et légumes',
             'is_favorite': False,
             'rating': 4,
-            'tags': ['poisson', 'soupe', 'légumes', 'traditionnel']
+            'tags': ['poisson', 'soupe', 'légumes', 'traditionnel'],
+            'ingredients': [
+                ('Poisson', 800, 'g'),
+                ('Tomates', 3, 'pièce'),
+                ('Oignons', 2, 'pièce'),
+                ('Gombos', 200, 'g'),
+                ('Piment', 1, 'pièce'),
+                ('Eau', 1.5, 'l')
+            ]
         },
         {
             'recipe_name': 'Beignets de haricots',
@@ -189,7 +289,13 @@ def init_cameroon_recipes():
             'notes': 'Beignets de haricots frits, spécialité camerounaise',
             'is_favorite': False,
             'rating': 3,
-            'tags': ['haricots', 'beignets', 'frit', 'snack']
+            'tags': ['haricots', 'beignets', 'frit', 'snack'],
+            'ingredients': [
+                ('Haricots cornille', 400, 'g'),
+                ('Oignons', 1, 'pièce'),
+                ('Piment', 1, 'pièce'),
+                ('Huile', 50, 'cl')
+            ]
         },
         {
             'recipe_name': 'Puff-puff',
@@ -201,7 +307,14 @@ def init_cameroon_recipes():
             'notes': 'Beignets sucrés traditionnels',
             'is_favorite': False,
             'rating': 3,
-            'tags': ['farine', 'beignets', 'sucré', 'dessert']
+            'tags': ['farine', 'beignets', 'sucré', 'dessert'],
+            'ingredients': [
+                ('Farine', 500, 'g'),
+                ('Sucre', 100, 'g'),
+                ('Levure boulangère', 11, 'g'),
+                ('Eau', 35, 'cl'),
+                ('Huile', 50, 'cl')
+            ]
         }
     ]
     
@@ -218,6 +331,12 @@ def init_cameroon_recipes():
                 'prep_time': recipe['prep_time'],
                 'cook_time': recipe['cook_time'],
                 'notes': recipe['notes'],
+                'tags': recipe['tags'],
+                'ingredients': [
+                    {'name': name, 'quantity': quantity, 'unit': unit}
+                    for name, quantity, unit in recipe['ingredients']
+                ],
+                'servings': SEED_SERVINGS,
                 'is_favorite': recipe['is_favorite'],
                 'rating': recipe['rating'],
                 'jow_recipe_id': None,  # Recettes locales
@@ -0,0 +1,22 @@
+"""
+Migre le schéma de la base vers SCHEMA_VERSION (lancé par gunicorn avant le démarrage des workers)
+"""
+import sys
+import os
+import argparse
+
+# Ajouter le répertoire backend au path
+sys.path.append(os.path.dirname(__file__) + '/..')
+
+import time
+from database import DatabaseManager, SCHEMA_VERSION
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migration du schéma de la base")
+    parser.add_argument('--db', default="jowafrique.db")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = DatabaseManager(args.db)
+    print(f"Schéma de {args.db} à la version {db.schema_version()} (attendue: {SCHEMA_VERSION}) "
+          f"en {time.perf_counter() - started:.2f} s")
@@ -0,0 +1,25 @@
+"""
+Pré-génère les plannings de la semaine suivante pour les profils actifs (à lancer par cron)
+"""
+import sys
+import os
+import argparse
+
+# Ajouter le répertoire backend au path
+sys.path.append(os.path.dirname(__file__) + '/..')
+
+from datetime import date
+from database import DatabaseManager
+from services.draft_service import DraftService, next_week_start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pré-génération des brouillons de planning")
+    parser.add_argument('--week-start', type=date.fromisoformat, default=None,
+                        help="Lundi de la semaine (défaut: semaine suivante)")
+    parser.add_argument('--db', default="jowafrique.db")
+    args = parser.parse_args()
+
+    result = DraftService(DatabaseManager(args.db)).pregenerate(args.week_start or next_week_start())
+    print(f"Semaine {result['week_start_date']}: {result['generated']} brouillons générés, "
+          f"{result['already_valid']} déjà valides sur {result['active_profiles']} profils actifs "
+          f"({result['elapsed']} s)")
@@ -1,6 +1,7 @@
 """
 Sécurité et validation pour l'API JowAfrique
 """
+import os
 import re
 import hashlib
 import secrets
@@ -142,6 +143,22 @@ def rate_limit(max_requests: int = 60):
         return decorated_function
     return decorator
 
+def is_admin_request() -> bool:
+    """La requête courante porte-t-elle le jeton administrateur (en-tête X-Admin-Token) ?"""
+    expected = os.getenv('ADMIN_TOKEN')
+    provided = request.headers.get('X-Admin-Token', '')
+    return bool(expected) and secrets.compare_digest(provided, expected)
+
+def require_admin(f):
+    """Décorateur réservant un endpoint aux administrateurs (en-tête X-Admin-Token)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({'error': 'Accès administrateur requis'}), 403
+        
+        return f(*args, **kwargs)
+    return decorated_function
+
 def sanitize_inputs(f):
     """Décorateur pour nettoyer les entrées"""
     @wraps(f)
@@ -0,0 +1,234 @@
+"""
+Sérialisation rapide des réponses : fournisseur JSON (orjson si disponible) et formatage des repas
+"""
+import os
+import dataclasses
+import decimal
+import uuid
+from datetime import date
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # Repli sur le module json standard
+    orjson = None
+
+# Type de repas -> (libellé API, heure par défaut)
+MEAL_TYPE_LABELS = {
+    'Petit-déjeuner': ('DÉJEUNER', '12:00'),
+    'Déjeuner': ('DÉJEUNER', '12:00'),
+    'Dîner': ('DÎNER', '19:00')
+}
+DEFAULT_MEAL_TYPE_LABEL = ('DÎNER', '19:00')
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def _meal_label(meal: Dict[str, Any]) -> Tuple[str, str]:
+    return MEAL_TYPE_LABELS.get(meal['meal_type'], DEFAULT_MEAL_TYPE_LABEL)
+
+# Champs API sélectionnables (?fields=) -> (colonnes SQL nécessaires, valeur)
+MEAL_FIELDS: Dict[str, Tuple[Tuple[str, ...], Callable[[Dict[str, Any]], Any]]] = {
+    'id': (('id',), lambda m: m['id']),
+    'type': (('meal_type',), lambda m: _meal_label(m)[0]),
+    'time': (('meal_type',), lambda m: _meal_label(m)[1]),
+    'name': (('recipe_name',), lambda m: m['recipe_name']),
+    'calories': (('prep_time', 'cook_time'), lambda m: f"{m['prep_time'] * 10 + m['cook_time'] * 5} kcal"
+                 if m['prep_time'] and m['cook_time'] else "N/A"),
+    'weight': (('prep_time',), lambda m: f"{m['prep_time'] * 15} gm" if m['prep_time'] else "N/A"),
+    'image': (('image_url',), lambda m: m['image_url'] or None),
+    'isEditable': ((), lambda m: True),
+    'jowId': (('jow_recipe_id',), lambda m: m['jow_recipe_id']),
+    'url': (('jow_recipe_url',), lambda m: m['jow_recipe_url']),
+    'videoUrl': (('video_url',), lambda m: m['video_url']),
+    'ingredient': (('main_ingredient',), lambda m: m['main_ingredient']),
+    'cuisine': (('cuisine_type',), lambda m: m['cuisine_type']),
+    'prepTime': (('prep_time',), lambda m: m['prep_time']),
+    'cookTime': (('cook_time',), lambda m: m['cook_time']),
+    'isFavorite': (('is_favorite',), lambda m: bool(m['is_favorite'])),
+    'rating': (('rating',), lambda m: m['rating'] or 0),
+    'notes': (('notes',), lambda m: m['notes']),
+    'dayOfWeek': (('day_of_week',), lambda m: m['day_of_week']),
+    'mealType': (('meal_type',), lambda m: m['meal_type'])
+}
+
+PLAN_FIELDS: Dict[str, Tuple[Tuple[str, ...], Callable[[Dict[str, Any]], Any]]] = {
+    'id': (('id',), lambda p: p['id']),
+    'planName': (('plan_name',), lambda p: p['plan_name']),
+    'weekStartDate': (('week_start_date',), lambda p: p['week_start_date']),
+    'totalBudgetEstimate': (('total_budget_estimate',), lambda p: p['total_budget_estimate']),
+    'generatedByAi': (('generated_by_ai',), lambda p: bool(p['generated_by_ai'])),
+    'createdAt': (('created_at',), lambda p: p['created_at'])
+}
+
+def parse_fields(value: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Champs demandés par `?fields=a,b` (None : tous), validés contre la liste `allowed`"""
+    if value is None:
+        return None
+    fields = list(dict.fromkeys(field.strip() for field in value.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Champs inconnus: {', '.join(unknown)}")
+    if not fields:
+        raise ValueError("Paramètre fields vide")
+    return fields
+
+def field_columns(fields: Sequence[str], catalog: Dict[str, Tuple[Tuple[str, ...], Callable]]) -> Tuple[str, ...]:
+    """Colonnes SQL à lire pour produire `fields` (au moins une, la requête doit rester valide)"""
+    columns = tuple(dict.fromkeys(column for field in fields for column in catalog[field][0]))
+    return columns or ('id',)
+
+def project_fields(fields: Sequence[str], catalog: Dict[str, Tuple[Tuple[str, ...], Callable]]) -> Callable:
+    """Formateur d'un dictionnaire de colonnes vers les seuls `fields` demandés"""
+    getters = [(field, catalog[field][1]) for field in fields]
+    return lambda values: {field: getter(values) for field, getter in getters}
+
+def _default(obj: Any) -> Any:
+    """Types non natifs, convertis comme le fournisseur par défaut de Flask"""
+    if isinstance(obj, date):
+        return http_date(obj)
+    if isinstance(obj, (decimal.Decimal, uuid.UUID)):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    if hasattr(obj, 'item'):  # Scalaires NumPy
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Fournisseur JSON Flask basé sur orjson (mêmes conversions que le fournisseur par défaut)"""
+
+    OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+               | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+    def _dump_bytes(self, obj: Any, indent: bool = False) -> bytes:
+        # Clés triées comme le fournisseur par défaut (sort_keys=True)
+        options = (self.OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+                   | (orjson.OPT_INDENT_2 if indent else 0))
+        return orjson.dumps(obj, default=_default, option=options)
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs:
+            # Options propres au module json (indent, cls...) : fournisseur par défaut
+            return super().dumps(obj, **kwargs)
+        return self._dump_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self._dump_bytes(obj, indent), mimetype=self.mimetype)
+
+def install_json_provider(app):
+    """Installe orjson comme fournisseur JSON (JSON_PROVIDER=stdlib pour le désactiver)"""
+    if orjson is not None and os.getenv('JSON_PROVIDER', 'orjson') == 'orjson':
+        app.json = OrjsonProvider(app)
+    return app.json
+
+def _batch_dumper(provider) -> Callable[[Any], bytes]:
+    if isinstance(provider, OrjsonProvider):
+        return provider._dump_bytes
+    return lambda obj: provider.dumps(obj).encode('utf-8')
+
+def iter_json_array(batches: Iterable[List[Any]], dumps: Callable[[Any], bytes]) -> Iterator[bytes]:
+    """Tableau JSON produit morceau par morceau (un morceau par lot de lignes)"""
+    separator = b'['
+    for batch in batches:
+        # Lot sérialisé comme un tableau, sans ses crochets
+        yield separator + dumps(batch)[1:-1]
+        separator = b','
+    yield b'[]' if separator == b'[' else b']'
+
+def iter_ndjson(batches: Iterable[List[Any]], dumps: Callable[[Any], bytes]) -> Iterator[bytes]:
+    """Une ligne JSON par élément (NDJSON)"""
+    for batch in batches:
+        yield b''.join(dumps(item) + b'\n' for item in batch)
+
+def wants_ndjson() -> bool:
+    """NDJSON demandé par `?format=ndjson` ou négocié par `Accept: application/x-ndjson`"""
+    return (request.args.get('format') == 'ndjson'
+            or request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE)
+
+def stream_response(batches: Iterator[List[Any]]):
+    """Réponse envoyée au fil de la lecture des lots (mémoire constante quel que soit le volume).
+    
+    Tableau JSON par défaut ; NDJSON avec `?format=ndjson` ou `Accept: application/x-ndjson`.
+    """
+    dumps = _batch_dumper(current_app.json)
+    if wants_ndjson():
+        return current_app.response_class(iter_ndjson(batches, dumps), mimetype=NDJSON_MIMETYPE)
+    return current_app.response_class(iter_json_array(batches, dumps), mimetype='application/json')
+
+def compile_meal_formatter(columns: Sequence[str]) -> Callable[[Sequence[Any]], Dict[str, Any]]:
+    """Formateur d'un tuple de meal_slots vers le format API (positions résolues une fois)"""
+    index = {name: i for i, name in enumerate(columns)}
+    i_id, i_name = index['id'], index['recipe_name']
+    i_meal_type, i_day = index['meal_type'], index['day_of_week']
+    i_prep, i_cook = index['prep_time'], index['cook_time']
+    i_image, i_jow_id, i_jow_url = index['image_url'], index['jow_recipe_id'], index['jow_recipe_url']
+    i_video = index.get('video_url')
+    i_ingredient, i_cuisine = index['main_ingredient'], index['cuisine_type']
+    i_favorite, i_rating, i_notes = index['is_favorite'], index['rating'], index['notes']
+    labels, default_label = MEAL_TYPE_LABELS, DEFAULT_MEAL_TYPE_LABEL
+
+    def format_row(row: Sequence[Any]) -> Dict[str, Any]:
+        meal_type = row[i_meal_type]
+        label, default_time = labels.get(meal_type, default_label)
+        prep_time, cook_time = row[i_prep], row[i_cook]
+        return {
+            'id': row[i_id],
+            'type': label,
+            'time': default_time,
+            'name': row[i_name],
+            'calories': f"{prep_time * 10 + cook_time * 5} kcal" if prep_time and cook_time else "N/A",
+            'weight': f"{prep_time * 15} gm" if prep_time else "N/A",
+            'image': row[i_image] or None,
+            'isEditable': True,
+            'jowId': row[i_jow_id],
+            'url': row[i_jow_url],
+            'videoUrl': row[i_video] if i_video is not None else None,
+            'ingredient': row[i_ingredient],
+            'cuisine': row[i_cuisine],
+            'prepTime': prep_time,
+            'cookTime': cook_time,
+            'isFavorite': bool(row[i_favorite]),
+            'rating': row[i_rating] or 0,
+            'notes': row[i_notes],
+            'dayOfWeek': row[i_day],
+            'mealType': meal_type
+        }
+    return format_row
+
+# Formateurs déjà compilés, par tuple de colonnes
+_cached_meal_formatter = lru_cache(maxsize=32)(compile_meal_formatter)
+
+def api_meal_rows(cursor, fields: Optional[Sequence[str]] = None) -> Callable:
+    """Row factory sqlite3 produisant directement les repas au format API.
+
+    À installer sur le curseur après execute (`cursor.row_factory = api_meal_rows(cursor)`) :
+    le formateur est compilé une fois pour les colonnes de la requête. Avec `fields`,
+    seuls ces champs sont produits (la requête ne lit que field_columns(fields, MEAL_FIELDS)).
+    """
+    columns = [column[0] for column in cursor.description]
+    if fields is None:
+        format_row = _cached_meal_formatter(tuple(columns))
+        return lambda _cursor, row: format_row(row)
+    project = project_fields(fields, MEAL_FIELDS)
+    return lambda _cursor, row: project(dict(zip(columns, row)))
+
+def meal_rows(fields: Optional[Sequence[str]] = None) -> Callable:
+    """Row factory des repas au format API, restreinte à `fields` si précisé"""
+    return api_meal_rows if fields is None else partial(api_meal_rows, fields=fields)
+
+def format_meal(meal_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Formate un repas déjà lu sous forme de dictionnaire"""
+    return _cached_meal_formatter(tuple(meal_data))(list(meal_data.values()))
@@ -3,15 +3,28 @@ Service d'intégration avec Gemini AI 2.5 Flash
 """
 import os
 import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 from datetime import date, timedelta
-import google.generativeai as genai
 from dotenv import load_dotenv
 from models import UserPreferences, CuisineType, BudgetLevel, MealType
+from metrics import observe_upstream, record_cache
+from tracing import trace_methods
 
 # Charger les variables d'environnement
 load_dotenv()
 
+# Cache des analyses IA partagé entre les instances (clé -> (expiration, résultat)),
+# borné à ANALYSIS_CACHE_MAX_ENTRIES : les entrées expirées puis les moins récentes sont évincées
+ANALYSIS_CACHE_TTL = 3600
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '1024'))
+_analysis_cache: 'OrderedDict[str, tuple]' = OrderedDict()
+_analysis_cache_lock = threading.Lock()
+
+@trace_methods('ai_service')
 class AIService:
     def __init__(self):
         """Initialise le service Gemini AI"""
@@ -19,9 +32,17 @@ class AIService:
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY non trouvée dans les variables d'environnement")
         
+        # Import différé : le SDK Gemini (~1 s) n'est chargé qu'à la première utilisation
+        import google.generativeai as genai
+        
         # Configuration de Gemini
         genai.configure(api_key=self.api_key)
         self.model = genai.GenerativeModel('gemini-2.5-flash')
+    
+    def _generate(self, prompt: str, operation: str):
+        """Appel Gemini generate_content mesuré (durée et erreurs par opération)"""
+        with observe_upstream('gemini', operation):
+            return self.model.generate_content(prompt)
         
     def generate_weekly_plan(self, preferences: UserPreferences, 
                            plan_name: str, week_start_date: date,
@@ -33,7 +54,7 @@ class AIService:
         
         try:
             # Appel à Gemini AI
-            response = self.model.generate_content(prompt)
+            response = self._generate(prompt, 'weekly_plan')
             
             # Parser la réponse JSON
             plan_data = self._parse_ai_response(response.text)
@@ -193,7 +214,7 @@ Génère un planning équilibré et varié pour 7 dîners de la semaine (un dîn
         
         return None
     
-    def _parse_ai_response(self, response_text: str) -> Dict[str, Any]:
+    def _parse_ai_response(self, response_text: str, required_key: str = 'meals') -> Dict[str, Any]:
         """Parse la réponse JSON de Gemini AI"""
         try:
             # Nettoyer la réponse (enlever markdown si présent)
@@ -207,8 +228,8 @@ Génère un planning équilibré et varié pour 7 dîners de la semaine (un dîn
             plan_data = json.loads(cleaned_response)
             
             # Valider la structure
-            if 'meals' not in plan_data:
-                raise ValueError("Structure de réponse invalide : 'meals' manquant")
+            if required_key not in plan_data:
+                raise ValueError(f"Structure de réponse invalide : '{required_key}' manquant")
             
             return plan_data
             
@@ -217,6 +238,67 @@ Génère un planning équilibré et varié pour 7 dîners de la semaine (un dîn
         except Exception as e:
             raise ValueError(f"Erreur de validation: {str(e)}")
     
+    @staticmethod
+    def _cache_key(analysis: str, payload: Any) -> str:
+        """Construit la clé de cache d'une analyse à partir de ses entrées"""
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return f"{analysis}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+    
+    @staticmethod
+    def _get_cached(key: str) -> Optional[Any]:
+        """Retourne une analyse en cache si elle n'a pas expiré"""
+        cache = f"ai_{key.split(':', 1)[0]}"
+        with _analysis_cache_lock:
+            entry = _analysis_cache.get(key)
+            if entry and entry[0] > time.time():
+                _analysis_cache.move_to_end(key)
+            else:
+                _analysis_cache.pop(key, None)
+                entry = None
+        record_cache(cache, entry is not None)
+        return entry[1] if entry else None
+    
+    @staticmethod
+    def _set_cached(key: str, value: Any):
+        """Stocke une analyse dans le cache (évince les entrées expirées puis les plus anciennes)"""
+        now = time.time()
+        with _analysis_cache_lock:
+            _analysis_cache[key] = (now + ANALYSIS_CACHE_TTL, value)
+            _analysis_cache.move_to_end(key)
+            if len(_analysis_cache) > ANALYSIS_CACHE_MAX_ENTRIES:
+                for expired in [k for k, (expires_at, _) in _analysis_cache.items() if expires_at <= now]:
+                    del _analysis_cache[expired]
+            while len(_analysis_cache) > ANALYSIS_CACHE_MAX_ENTRIES:
+                _analysis_cache.popitem(last=False)
+    
+    @classmethod
+    def plan_insights_cache_key(cls, plan_version: str, budget: float, preferences: UserPreferences) -> str:
+        """Clé des analyses d'un plan : sa version (ETag, change avec ses repas) et les paramètres"""
+        return cls._cache_key('plan_insights', [
+            plan_version, float(budget), preferences.cuisines[0].value, preferences.budget.value
+        ])
+    
+    @classmethod
+    def get_cached_plan_insights(cls, plan_version: str, budget: float,
+                                 preferences: UserPreferences) -> Optional[Dict[str, Any]]:
+        """Analyses d'un plan déjà en cache, sans lire ses repas ni charger le SDK Gemini"""
+        return cls._get_cached(cls.plan_insights_cache_key(plan_version, budget, preferences))
+    
+    def _variations_cache_key(self, base_meal: Dict[str, Any], preferences: UserPreferences) -> str:
+        return self._cache_key('variations', [
+            base_meal.get('recipe_name'), base_meal.get('cuisine_type'),
+            base_meal.get('main_ingredient'), preferences.cuisines[0].value,
+            preferences.budget.value
+        ])
+    
+    def _shopping_cache_key(self, shopping_list: List[str], budget: float) -> str:
+        return self._cache_key('shopping', [sorted(shopping_list), float(budget)])
+    
+    def _nutrition_cache_key(self, meals: List[Dict[str, Any]]) -> str:
+        return self._cache_key('nutrition', [
+            [meal.get('recipe_name'), meal.get('main_ingredient')] for meal in meals
+        ])
+    
     def suggest_meal_variations(self, base_meal: Dict[str, Any], 
                                preferences: UserPreferences) -> List[Dict[str, Any]]:
         """Suggère des variations d'un repas"""
@@ -244,10 +326,17 @@ Format JSON :
 }}
 """
         
+        cache_key = self._variations_cache_key(base_meal, preferences)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.model.generate_content(prompt)
-            variations_data = self._parse_ai_response(response.text)
-            return variations_data.get('variations', [])
+            response = self._generate(prompt, 'meal_variations')
+            variations_data = self._parse_ai_response(response.text, 'variations')
+            variations = variations_data.get('variations', [])
+            self._set_cached(cache_key, variations)
+            return variations
         except Exception as e:
             print(f"Erreur génération variations: {e}")
             return []
@@ -284,9 +373,15 @@ Format JSON :
 }}
 """
         
+        cache_key = self._shopping_cache_key(shopping_list, budget)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.model.generate_content(prompt)
-            optimization_data = self._parse_ai_response(response.text)
+            response = self._generate(prompt, 'shopping_optimization')
+            optimization_data = self._parse_ai_response(response.text, 'optimized_list')
+            self._set_cached(cache_key, optimization_data)
             return optimization_data
         except Exception as e:
             print(f"Erreur optimisation courses: {e}")
@@ -333,10 +428,141 @@ Format JSON :
 }}
 """
         
+        cache_key = self._nutrition_cache_key(meals)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.model.generate_content(prompt)
-            analysis_data = self._parse_ai_response(response.text)
+            response = self._generate(prompt, 'nutrition')
+            analysis_data = self._parse_ai_response(response.text, 'nutritional_score')
+            self._set_cached(cache_key, analysis_data)
             return analysis_data
         except Exception as e:
             print(f"Erreur analyse nutritionnelle: {e}")
             return {'nutritional_score': 0, 'recommendations': []}
+    
+    def generate_plan_insights(self, meals: List[Dict[str, Any]], shopping_list: List[str],
+                               budget: float, preferences: UserPreferences,
+                               plan_version: Optional[str] = None) -> Dict[str, Any]:
+        """Analyse nutrition, courses et variations d'un planning en un seul appel Gemini.
+        
+        Avec `plan_version`, le résultat complet est aussi mis en cache pour cette version du plan
+        (voir get_cached_plan_insights).
+        """
+        
+        nutrition_key = self._nutrition_cache_key(meals)
+        shopping_key = self._shopping_cache_key(shopping_list, budget)
+        variation_keys = {meal['id']: self._variations_cache_key(meal, preferences) for meal in meals}
+        
+        # Tout est déjà en cache : aucun appel nécessaire
+        analysis = self._get_cached(nutrition_key)
+        optimization = self._get_cached(shopping_key)
+        variations = {meal_id: self._get_cached(key) for meal_id, key in variation_keys.items()}
+        if analysis is not None and optimization is not None and all(v is not None for v in variations.values()):
+            insights = {'analysis': analysis, 'optimization': optimization, 'variations': variations}
+            if plan_version:
+                self._set_cached(self.plan_insights_cache_key(plan_version, budget, preferences), insights)
+            return insights
+        
+        meals_text = "\n".join([
+            f"- [{meal['id']}] {meal['recipe_name']} ({meal['main_ingredient']}, {meal['cuisine_type']})"
+            for meal in meals
+        ])
+        
+        prompt = f"""
+Analyse ce planning de repas camerounais en une seule réponse :
+
+{meals_text}
+
+Liste de courses actuelle : {', '.join(shopping_list)}
+Budget : {budget}€
+Cuisine préférée : {preferences.cuisines[0].value}
+Niveau de budget : {preferences.budget.value}
+
+Produis trois analyses :
+1. "nutrition" : l'équilibre nutritionnel du planning (macronutriments, vitamines/minéraux, recommandations)
+2. "shopping" : l'optimisation de la liste de courses (alternatives moins chères, saison, quantités, magasins au Cameroun)
+3. "variations" : 3 variations créatives par repas, en gardant le même ingrédient principal et l'esprit camerounais/africain
+
+Format JSON :
+{{
+  "nutrition": {{
+    "nutritional_score": 8.5,
+    "macronutrients": {{"proteins": "Bon", "carbs": "Équilibré", "fats": "À améliorer"}},
+    "vitamins_minerals": {{"vitamin_c": "Excellent", "iron": "Bon", "calcium": "Moyen"}},
+    "recommendations": ["Ajouter plus de légumes verts"],
+    "health_benefits": ["Riche en protéines"]
+  }},
+  "shopping": {{
+    "optimized_list": [
+      {{
+        "ingredient": "Nom de l'ingrédient",
+        "quantity": "Quantité recommandée",
+        "estimated_cost": 2.5,
+        "alternative": "Alternative moins chère",
+        "seasonal": true
+      }}
+    ],
+    "total_estimated_cost": 45.0,
+    "savings_tips": ["Conseil 1"],
+    "recommended_stores": ["Marché central"]
+  }},
+  "variations": [
+    {{
+      "meal_id": 12,
+      "variations": [
+        {{
+          "recipe_name": "Nom de la variation",
+          "main_ingredient": "Ingrédient principal",
+          "cuisine_type": "cameroun",
+          "prep_time": 25,
+          "cook_time": 40,
+          "notes": "Description de la variation"
+        }}
+      ]
+    }}
+  ]
+}}
+"""
+        
+        try:
+            response = self._generate(prompt, 'plan_insights')
+            insights = self._parse_ai_response(response.text, 'nutrition')
+        except Exception as e:
+            print(f"Erreur analyse globale du planning: {e}")
+            return {
+                'analysis': analysis if analysis is not None else {'nutritional_score': 0, 'recommendations': []},
+                'optimization': optimization if optimization is not None else {'optimized_list': shopping_list, 'total_estimated_cost': 0},
+                'variations': {meal_id: v if v is not None else [] for meal_id, v in variations.items()}
+            }
+        
+        # Remplir chaque cache avec la partie correspondante de la réponse
+        analysis = insights.get('nutrition') or {'nutritional_score': 0, 'recommendations': []}
+        if 'nutritional_score' in analysis:
+            self._set_cached(nutrition_key, analysis)
+        
+        optimization = insights.get('shopping') or {'optimized_list': shopping_list, 'total_estimated_cost': 0}
+        if insights.get('shopping') and 'optimized_list' in optimization:
+            self._set_cached(shopping_key, optimization)
+        
+        complete = 'nutritional_score' in analysis and bool(insights.get('shopping'))
+        returned = {}
+        for entry in insights.get('variations', []):
+            try:
+                returned[int(entry.get('meal_id'))] = entry.get('variations', [])
+            except (TypeError, ValueError):
+                continue
+        for meal_id, key in variation_keys.items():
+            if meal_id in returned:
+                variations[meal_id] = returned[meal_id]
+                self._set_cached(key, returned[meal_id])
+            elif variations[meal_id] is None:
+                variations[meal_id] = []
+                complete = False
+        
+        result = {'analysis': analysis, 'optimization': optimization, 'variations': variations}
+        # Réponse partielle : non mise en cache au niveau du plan, le prochain appel la complète
+        if plan_version and complete:
+            self._set_cached(self.plan_insights_cache_key(plan_version, budget, preferences), result)
+        return result
@@ -0,0 +1,180 @@
+"""
+Génération de plannings en lot (plusieurs foyers) répartie sur un pool de processus
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional, Set, Callable, Iterator, Tuple
+from database import DatabaseManager
+from models import UserPreferences, CuisineType, WeeklyPlan
+from services.plan_solver import PlanSolver
+from services.rule_engine import RuleSet
+from services.plan_analyzer import PlanAnalyzer
+
+# Nombre maximal de foyers par requête API, résolus dans le worker gunicorn sans pool de
+# processus (les lots plus importants passent par scripts/generate_batch_plans.py)
+MAX_BATCH_SIZE = 50
+
+# Nombre de plans écrits par transaction
+WRITE_CHUNK_SIZE = 200
+
+@dataclass
+class HouseholdRequest:
+    plan_name: str
+    preferences: UserPreferences
+    include_lunch: bool = False
+
+def preferences_key(preferences: UserPreferences) -> tuple:
+    """Clé des préférences qui influencent les candidats (recettes Jow)"""
+    cuisines = tuple(sorted(c.value for c in preferences.cuisines if c != CuisineType.CAMEROUN))
+    return cuisines, preferences.vegetarian, preferences.light
+
+# État d'un processus worker, initialisé une seule fois par processus
+_worker_state: Dict[str, Any] = {}
+
+def _init_worker(candidate_sets: Dict[tuple, List[Dict[str, Any]]], used_recipes: Set[str],
+                 rules: RuleSet, time_budget: float):
+    _worker_state.clear()
+    _worker_state.update(
+        candidate_sets=candidate_sets,
+        used_recipes=used_recipes,
+        solver=PlanSolver.from_rules(rules, time_budget=time_budget),
+        pools={}
+    )
+
+def _solve_household(task: tuple) -> Tuple[int, List[Optional[int]]]:
+    """Résout un foyer ; retourne les positions des recettes choisies dans son jeu de candidats"""
+    index, key, include_lunch, variant = task
+    solver = _worker_state['solver']
+    pools = _worker_state['pools']
+    if key not in pools:
+        # Pool compilé une fois par jeu de candidats et par processus
+        pool = solver.compile_pool(_worker_state['candidate_sets'][key])
+        pools[key] = (pool, {id(recipe): i for i, recipe in enumerate(pool.recipes)})
+    pool, positions = pools[key]
+
+    result = solver.solve(pool, solver.build_slots(include_lunch), _worker_state['used_recipes'],
+                          variant=variant)
+    return index, [positions[id(r)] if r is not None else None for r in result.assignments]
+
+def solve_batch(candidate_sets: Dict[tuple, List[Dict[str, Any]]], used_recipes: Set[str],
+                tasks: List[tuple], rules: RuleSet,
+                workers: int = 1, time_budget: float = 0.5) -> Iterator[Tuple[int, List[Optional[int]]]]:
+    """Résout les tâches (index, clé de candidats, déjeuners, variante) dans l'ordre, sur `workers` processus"""
+    init_args = (candidate_sets, used_recipes, rules, time_budget)
+    if workers <= 1:
+        _init_worker(*init_args)
+        for task in tasks:
+            yield _solve_household(task)
+        return
+
+    chunksize = max(1, len(tasks) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=init_args) as executor:
+        yield from executor.map(_solve_household, tasks, chunksize=chunksize)
+
+def household_tasks(households: List[HouseholdRequest]) -> List[tuple]:
+    """Tâches de résolution : les foyers aux préférences identiques reçoivent des variantes
+    successives (0 : plan optimal, puis scores perturbés), donc des plans différents"""
+    seen: Dict[tuple, int] = {}
+    tasks = []
+    for i, household in enumerate(households):
+        key = preferences_key(household.preferences)
+        variant = seen.get((key, household.include_lunch), 0)
+        seen[(key, household.include_lunch)] = variant + 1
+        tasks.append((i, key, household.include_lunch, variant))
+    return tasks
+
+class BatchPlanner:
+    """Génère les plannings de nombreux foyers à partir d'un seul instantané des candidats"""
+
+    def __init__(self, db_manager: DatabaseManager, workers: Optional[int] = None):
+        self.db = db_manager
+        self.workers = workers or int(os.getenv('BATCH_PLAN_WORKERS', os.cpu_count() or 1))
+        self.analyzer = PlanAnalyzer(db_manager)
+
+    def generate(self, households: List[HouseholdRequest], week_start_date: date,
+                 dry_run: bool = False,
+                 progress: Optional[Callable[[int, int, float], None]] = None) -> Dict[str, Any]:
+        """Génère (et enregistre par lots, sauf dry_run) un planning par foyer"""
+        from services.hybrid_recipe_service import HybridRecipeService
+        from services.meal_service import MealService
+
+        started = time.perf_counter()
+        hybrid_service = HybridRecipeService(self.db)
+        meal_service = MealService(self.db)
+
+        # Instantané partagé : un jeu de candidats par combinaison de préférences
+        candidate_sets: Dict[tuple, List[Dict[str, Any]]] = {}
+        cameroon_sets: Dict[tuple, List[Dict[str, Any]]] = {}
+        for household in households:
+            key = preferences_key(household.preferences)
+            if key not in candidate_sets:
+                cameroon_recipes, jow_recipes = hybrid_service.get_candidates(household.preferences)
+                cameroon_sets[key] = cameroon_recipes
+                candidate_sets[key] = cameroon_recipes + jow_recipes
+        used_recipes = hybrid_service.constraint_service.get_used_recipes()
+
+        tasks = household_tasks(households)
+        workers = max(1, min(self.workers, len(tasks)))
+
+        results: List[Dict[str, Any]] = [None] * len(households)
+        pending: List[tuple] = []
+        done = 0
+
+        def flush():
+            if pending and not dry_run:
+                plan_ids = self.db.create_plans_bulk(
+                    [(plan, meals) for _, plan, meals, _ in pending],
+                    recipe_ingredients=[meal for *_, recipes in pending for meal in recipes]
+                )
+                for (index, *_), plan_id in zip(pending, plan_ids):
+                    results[index]['plan_id'] = plan_id
+            pending.clear()
+
+        for index, picks in solve_batch(candidate_sets, used_recipes, tasks,
+                                        hybrid_service.constraint_service.rules,
+                                        workers, hybrid_service.solver.time_budget):
+            household = households[index]
+            key = tasks[index][1]
+            candidates = candidate_sets[key]
+            slots = hybrid_service.solver.build_slots(household.include_lunch)
+            assignments = [candidates[p] if p is not None else None for p in picks]
+            meals = hybrid_service.complete_assignments(slots, assignments, cameroon_sets[key], None)
+
+            analysis = self.analyzer.analyze_meals(meals)
+            results[index] = {
+                'plan_name': household.plan_name,
+                'plan_id': None,
+                'meals_added': 0 if dry_run else len(meals),
+                'total_estimated_cost': analysis['budget_estimate'],
+                'quality_score': analysis['quality']['score']
+            }
+            plan = WeeklyPlan(
+                id=None,
+                plan_name=household.plan_name,
+                week_start_date=week_start_date,
+                total_budget_estimate=analysis['budget_estimate'],
+                generated_by_ai=True,
+                created_at=datetime.now()
+            )
+            pending.append((index, plan, [meal_service.build_generated_meal(meal) for meal in meals], meals))
+
+            done += 1
+            if len(pending) >= WRITE_CHUNK_SIZE:
+                flush()
+            if progress:
+                progress(done, len(tasks), time.perf_counter() - started)
+        flush()
+
+        elapsed = time.perf_counter() - started
+        return {
+            'success': True,
+            'dry_run': dry_run,
+            'week_start_date': week_start_date.isoformat(),
+            'workers': workers,
+            'plans': results,
+            'elapsed': round(elapsed, 3),
+            'plans_per_second': round(len(results) / elapsed, 1) if elapsed else None
+        }
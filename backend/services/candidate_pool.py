@@ -0,0 +1,94 @@
+"""
+Pool de recettes candidates compilé en colonnes NumPy pour le filtrage et le scoring vectorisés
+"""
+from typing import List, Dict, Any, Optional, Iterable
+import numpy as np
+from database import normalize_text
+
+class CandidatePool:
+    """Colonnes (ids d'ingrédient, de cuisine, de nom, note, favori...) d'un ensemble de recettes.
+
+    Les chaînes sont normalisées une seule fois à la compilation ; chaque
+    contrainte devient ensuite un masque booléen sur tout le pool.
+    """
+
+    def __init__(self, recipes: List[Dict[str, Any]], restricted_ingredients: Iterable[str]):
+        self.recipes = list(recipes)
+        self.ingredient_vocab: Dict[str, int] = {}
+        self.cuisine_vocab: Dict[str, int] = {}
+        self.name_vocab: Dict[str, int] = {}
+
+        size = len(self.recipes)
+        self.ingredient_ids = np.empty(size, dtype=np.int32)
+        self.cuisine_ids = np.empty(size, dtype=np.int32)
+        self.name_ids = np.empty(size, dtype=np.int32)
+        self.rating = np.empty(size, dtype=np.float32)
+        self.favorite = np.empty(size, dtype=bool)
+        self.total_time = np.empty(size, dtype=np.float32)
+        self.affinity = np.empty(size, dtype=np.float32)
+
+        for i, recipe in enumerate(self.recipes):
+            self.ingredient_ids[i] = self._intern(self.ingredient_vocab, self.normalize(recipe.get('main_ingredient')))
+            self.cuisine_ids[i] = self._intern(self.cuisine_vocab, recipe.get('cuisine_type') or '')
+            self.name_ids[i] = self._intern(self.name_vocab, recipe.get('recipe_name') or '')
+            # Moyenne bayésienne des notes si connue, sinon note de la fiche
+            rating = recipe.get('avg_rating')
+            self.rating[i] = (rating if rating is not None else recipe.get('rating')) or 0
+            self.favorite[i] = bool(recipe.get('is_favorite'))
+            self.total_time[i] = (recipe.get('prep_time') or 0) + (recipe.get('cook_time') or 0)
+            self.affinity[i] = recipe.get('affinity') or 0
+
+        # Ingrédients restreints : un booléen par entrée du vocabulaire
+        restricted = {self.normalize(i) for i in restricted_ingredients}
+        self.restricted_vocab = np.zeros(len(self.ingredient_vocab), dtype=bool)
+        for ingredient, ingredient_id in self.ingredient_vocab.items():
+            self.restricted_vocab[ingredient_id] = ingredient in restricted
+        self.restricted = self.restricted_vocab[self.ingredient_ids] if size else np.zeros(0, dtype=bool)
+        self.empty_ingredient_id = self.ingredient_vocab.get('', -1)
+
+    normalize = staticmethod(normalize_text)
+
+    @staticmethod
+    def _intern(vocab: Dict[str, int], value: str) -> int:
+        if value not in vocab:
+            vocab[value] = len(vocab)
+        return vocab[value]
+
+    def __len__(self) -> int:
+        return len(self.recipes)
+
+    def name_id_set(self, names: Iterable[str]) -> np.ndarray:
+        """Ids des noms connus du pool (les inconnus sont ignorés)"""
+        return np.fromiter((self.name_vocab[n] for n in names if n in self.name_vocab), dtype=np.int32)
+
+    def ingredient_id_set(self, ingredients: Iterable[str]) -> np.ndarray:
+        """Ids des ingrédients connus du pool (les inconnus sont ignorés)"""
+        ids = (self.ingredient_vocab.get(self.normalize(i)) for i in ingredients)
+        return np.fromiter((i for i in ids if i is not None), dtype=np.int32)
+
+    def recency_mask(self, used_recipes: Iterable[str]) -> np.ndarray:
+        """True pour les recettes utilisées récemment"""
+        lookup = np.zeros(len(self.name_vocab), dtype=bool)
+        lookup[self.name_id_set(used_recipes)] = True
+        return lookup[self.name_ids]
+
+    def ingredient_mask(self, ingredients: Iterable[str]) -> np.ndarray:
+        """True pour les recettes dont l'ingrédient principal est dans `ingredients`"""
+        lookup = np.zeros(len(self.ingredient_vocab), dtype=bool)
+        lookup[self.ingredient_id_set(ingredients)] = True
+        return lookup[self.ingredient_ids]
+
+    def scores(self, rating_weight: float, favorite_bonus: float,
+               cuisine_bonus: Optional[Dict[str, float]] = None,
+               affinity_weight: float = 0.0) -> np.ndarray:
+        """Score pondéré de chaque recette du pool"""
+        scores = self.rating * rating_weight + self.favorite * favorite_bonus + self.affinity * affinity_weight
+        for cuisine, bonus in (cuisine_bonus or {}).items():
+            cuisine_id = self.cuisine_vocab.get(cuisine)
+            if cuisine_id is not None:
+                scores += (self.cuisine_ids == cuisine_id) * bonus
+        return scores.astype(np.float64)
+
+    def select(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        """Recettes correspondant à un masque, dans l'ordre du pool"""
+        return [self.recipes[i] for i in np.flatnonzero(mask)]
@@ -1,15 +1,21 @@
 """
 Service de gestion des contraintes de planification
 """
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Optional, Set, Union
 from datetime import date, timedelta
-from database import DatabaseManager
+from database import DatabaseManager, normalize_text
 from models import CuisineType, MealType
+from services.candidate_pool import CandidatePool
+from services.rule_engine import RuleSet, rule_registry
+from services.plan_analyzer import PlanAnalyzer
+from tracing import trace_methods
 
+@trace_methods('constraint_service')
 class ConstraintService:
-    def __init__(self, db_manager: DatabaseManager):
-        """Initialise le service de contraintes"""
+    def __init__(self, db_manager: DatabaseManager, rules: Optional[RuleSet] = None):
+        """Initialise le service de contraintes avec le jeu de règles courant"""
         self.db = db_manager
+        self.rules = rules or rule_registry.get()
     
     def get_previous_plans(self, weeks_back: int = 4) -> List[Dict[str, Any]]:
         """Récupère les plannings des semaines précédentes"""
@@ -41,32 +47,22 @@ class ConstraintService:
             print(f"Erreur récupération plannings précédents: {e}")
             return []
     
-    def get_used_recipes(self, weeks_back: int = 4) -> Set[str]:
-        """Récupère les recettes utilisées dans les plannings précédents"""
+    def get_used_recipes(self, weeks_back: Optional[int] = None) -> Set[str]:
+        """Récupère les recettes utilisées dans les plannings précédents (index de récence)"""
+        if weeks_back is None:
+            weeks_back = self.rules.recent_weeks
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Calculer la date de début
-                start_date = date.today() - timedelta(weeks=weeks_back)
-                
-                cursor.execute("""
-                    SELECT DISTINCT ms.recipe_name
-                    FROM meal_slots ms
-                    JOIN weekly_plans wp ON ms.plan_id = wp.id
-                    WHERE wp.week_start_date >= ?
-                """, (start_date,))
-                
-                used_recipes = set()
-                for row in cursor.fetchall():
-                    used_recipes.add(row[0])
-                
-                return used_recipes
-                
+            return self.db.recency_index.used_since(date.today() - timedelta(weeks=weeks_back))
         except Exception as e:
             print(f"Erreur récupération recettes utilisées: {e}")
             return set()
     
+    def is_recently_used(self, recipe_name: str, weeks_back: Optional[int] = None) -> bool:
+        """Vérifie si une recette a été utilisée récemment (accès direct à l'index)"""
+        if weeks_back is None:
+            weeks_back = self.rules.recent_weeks
+        return self.db.recency_index.is_recent(recipe_name, date.today() - timedelta(weeks=weeks_back))
+    
     def get_used_ingredients_by_week(self, plan_id: int) -> Dict[str, int]:
         """Récupère les ingrédients utilisés dans un planning avec leur fréquence"""
         try:
@@ -135,19 +131,14 @@ class ConstraintService:
         """Vérifie si un ingrédient respecte les contraintes"""
         
         # Ingrédients comme riz, pâtes ne doivent pas apparaître plus d'une fois
-        restricted_ingredients = {'riz', 'pâtes', 'pates', 'pasta', 'rice'}
-        if ingredient.lower() in restricted_ingredients:
-            return current_plan_ingredients.get(ingredient, 0) == 0
-        
-        return True
+        return normalize_text(ingredient) not in self.rules.blocked_ingredients(current_plan_ingredients)
     
     def check_consecutive_constraints(self, ingredient: str, day_of_week: str, 
                                     current_plan_ingredients: Dict[str, int]) -> bool:
         """Vérifie les contraintes d'ingrédients consécutifs"""
         
         # Ingrédients comme riz, pâtes ne doivent pas se suivre
-        restricted_ingredients = {'riz', 'pâtes', 'pates', 'pasta', 'rice'}
-        if ingredient.lower() not in restricted_ingredients:
+        if normalize_text(ingredient) not in self.rules.not_consecutive_ingredients:
             return True
         
         # Vérifier le jour précédent
@@ -166,98 +157,35 @@ class ConstraintService:
         except ValueError:
             return None
     
-    def filter_recipes_by_constraints(self, recipes: List[Dict[str, Any]], 
+    def compile_pool(self, recipes: List[Dict[str, Any]]) -> CandidatePool:
+        """Compile des recettes en colonnes pour le filtrage vectorisé"""
+        return CandidatePool(recipes, self.rules.restricted_ingredients)
+    
+    def filter_recipes_by_constraints(self, recipes: Union[List[Dict[str, Any]], CandidatePool], 
                                     used_recipes: Set[str],
                                     current_plan_ingredients: Dict[str, int],
-                                    day_of_week: str) -> List[Dict[str, Any]]:
-        """Filtre les recettes selon les contraintes"""
-        
-        filtered_recipes = []
-        
-        for recipe in recipes:
-            recipe_name = recipe.get('recipe_name', '')
-            main_ingredient = recipe.get('main_ingredient', '')
-            
-            # Vérifier les contraintes
-            if not self.check_recipe_constraints(recipe_name, used_recipes):
-                continue
-            
-            if not self.check_ingredient_constraints(main_ingredient, current_plan_ingredients, []):
-                continue
-            
-            if not self.check_consecutive_constraints(main_ingredient, day_of_week, current_plan_ingredients):
-                continue
-            
-            filtered_recipes.append(recipe)
+                                    day_of_week: str,
+                                    previous_ingredient: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Filtre les recettes selon les contraintes (masque vectorisé sur tout le pool)"""
         
-        return filtered_recipes
+        pool = recipes if isinstance(recipes, CandidatePool) else self.compile_pool(recipes)
+        mask = self.rules.compile_mask(pool, used_recipes, current_plan_ingredients, previous_ingredient)
+        return pool.select(mask)
+    
+    def sql_filter(self, current_plan_ingredients: Optional[Dict[str, int]] = None,
+                   previous_ingredient: Optional[str] = None,
+                   alias: str = 'c') -> tuple:
+        """Compile les règles en clause SQL (WHERE + anti-jointures) pour filtrer dans SQLite"""
+        return self.rules.compile_sql(current_plan_ingredients, previous_ingredient, date.today(), alias)
     
     def get_planning_statistics(self, plan_id: int) -> Dict[str, Any]:
         """Génère des statistiques sur un planning"""
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Statistiques générales
-                cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total_meals,
-                        COUNT(DISTINCT main_ingredient) as unique_ingredients,
-                        COUNT(DISTINCT cuisine_type) as unique_cuisines
-                    FROM meal_slots
-                    WHERE plan_id = ?
-                """, (plan_id,))
-                
-                stats = cursor.fetchone()
-                
-                # Ingrédients les plus utilisés
-                cursor.execute("""
-                    SELECT main_ingredient, COUNT(*) as count
-                    FROM meal_slots
-                    WHERE plan_id = ?
-                    GROUP BY main_ingredient
-                    ORDER BY count DESC
-                """, (plan_id,))
-                
-                top_ingredients = cursor.fetchall()
-                
-                # Cuisines
-                cursor.execute("""
-                    SELECT cuisine_type, COUNT(*) as count
-                    FROM meal_slots
-                    WHERE plan_id = ?
-                    GROUP BY cuisine_type
-                    ORDER BY count DESC
-                """, (plan_id,))
-                
-                cuisines = cursor.fetchall()
-                
-                return {
-                    'total_meals': stats[0],
-                    'unique_ingredients': stats[1],
-                    'unique_cuisines': stats[2],
-                    'top_ingredients': top_ingredients,
-                    'cuisines': cuisines,
-                    'constraint_violations': self._check_constraint_violations(plan_id)
-                }
-                
+            return PlanAnalyzer(self.db, self.rules).analyze(plan_id)['planning_statistics']
         except Exception as e:
             print(f"Erreur statistiques planning: {e}")
             return {}
     
     def _check_constraint_violations(self, plan_id: int) -> List[str]:
         """Vérifie les violations de contraintes dans un planning"""
-        violations = []
-        
-        # Vérifier les ingrédients consécutifs
-        consecutive = self.get_consecutive_ingredients(plan_id)
-        for day1, day2, ingredient in consecutive:
-            violations.append(f"Ingrédient '{ingredient}' consécutif: {day1} -> {day2}")
-        
-        # Vérifier les ingrédients répétés
-        ingredients = self.get_used_ingredients_by_week(plan_id)
-        for ingredient, count in ingredients.items():
-            if count > 1:
-                violations.append(f"Ingrédient '{ingredient}' utilisé {count} fois")
-        
-        return violations
+        return PlanAnalyzer(self.db, self.rules).analyze(plan_id)['planning_statistics']['constraint_violations']
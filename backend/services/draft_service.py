@@ -0,0 +1,176 @@
+"""
+Pré-génération des plannings de la semaine suivante (brouillons) pendant les heures creuses
+"""
+import os
+import json
+import hashlib
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional
+from database import DatabaseManager
+from models import UserPreferences, CuisineType, BudgetLevel
+from services.rule_engine import rule_registry
+
+# Durée de vie d'un brouillon (le catalogue Jow peut changer sans que l'on le sache)
+DRAFT_TTL_HOURS = int(os.getenv('DRAFT_TTL_HOURS', '72'))
+
+# Un profil est actif s'il a servi depuis ce nombre de semaines
+ACTIVE_PROFILE_WEEKS = 4
+
+# Heures creuses de pré-génération, au format "debut-fin" (heure locale)
+DRAFT_OFFPEAK_HOURS = os.getenv('DRAFT_OFFPEAK_HOURS', '1-5')
+DRAFT_CHECK_INTERVAL = float(os.getenv('DRAFT_CHECK_INTERVAL', '600'))
+
+def next_week_start(today: Optional[date] = None) -> date:
+    """Lundi de la semaine suivante"""
+    today = today or date.today()
+    return today + timedelta(days=7 - today.weekday())
+
+def serialize_preferences(preferences: UserPreferences) -> str:
+    """Forme canonique (JSON trié) des préférences"""
+    return json.dumps({
+        'cuisines': sorted(c.value for c in preferences.cuisines),
+        'budget': preferences.budget.value,
+        'light': bool(preferences.light),
+        'vegetarian': bool(preferences.vegetarian)
+    }, sort_keys=True, ensure_ascii=False)
+
+def deserialize_preferences(data: str) -> UserPreferences:
+    values = json.loads(data)
+    return UserPreferences(
+        cuisines=[CuisineType(c) for c in values['cuisines']],
+        budget=BudgetLevel(values['budget']),
+        light=values['light'],
+        vegetarian=values['vegetarian']
+    )
+
+def profile_key(preferences: UserPreferences, include_lunch: bool = False) -> str:
+    """Identifiant d'un profil : change dès que les préférences changent"""
+    payload = f"{serialize_preferences(preferences)}|{int(bool(include_lunch))}"
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+class DraftService:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    def profile_row(self, preferences: UserPreferences, include_lunch: bool = False) -> tuple:
+        """Profil à marquer utilisé lors de l'enregistrement du planning (create_plan_with_meals)"""
+        return (profile_key(preferences, include_lunch), serialize_preferences(preferences), include_lunch)
+
+    def pregenerate(self, week_start_date: Optional[date] = None) -> Dict[str, Any]:
+        """Pré-génère le planning de chaque profil actif qui n'a pas de brouillon valide"""
+        from services.hybrid_recipe_service import HybridRecipeService
+
+        week_start_date = week_start_date or next_week_start()
+        started = time.perf_counter()
+        self.db.purge_draft_plans()
+
+        catalog_version = self.db.get_catalog_version()
+        rules_version = rule_registry.get().version
+        valid = {d['profile_key'] for d in self.db.get_draft_plans(week_start_date)
+                 if d['catalog_version'] == catalog_version and d['rules_version'] == rules_version}
+
+        profiles = self.db.get_active_profiles(datetime.now() - timedelta(weeks=ACTIVE_PROFILE_WEEKS))
+        expires_at = min(datetime.now() + timedelta(hours=DRAFT_TTL_HOURS),
+                         datetime.combine(week_start_date + timedelta(days=1), datetime.min.time()))
+
+        hybrid_service = HybridRecipeService(self.db)
+        generated = 0
+        for profile in profiles:
+            if profile['profile_key'] in valid:
+                continue
+            try:
+                meals = hybrid_service.generate_weekly_plan_recipes(
+                    deserialize_preferences(profile['preferences']), None,
+                    include_lunch=bool(profile['include_lunch'])
+                )
+                self.db.save_draft_plan(profile['profile_key'], week_start_date,
+                                        json.dumps(meals, ensure_ascii=False, default=str),
+                                        catalog_version, rules_version, expires_at)
+                generated += 1
+            except Exception as e:
+                print(f"Erreur pré-génération profil {profile['profile_key'][:8]}: {e}")
+
+        return {
+            'week_start_date': week_start_date.isoformat(),
+            'active_profiles': len(profiles),
+            'already_valid': len(valid),
+            'generated': generated,
+            'elapsed': round(time.perf_counter() - started, 3)
+        }
+
+    def find_draft(self, preferences: UserPreferences, week_start_date: date,
+                   include_lunch: bool = False) -> Optional[Dict[str, Any]]:
+        """Brouillon du profil, avec `valid` et ses repas décodés s'il peut être promu.
+        
+        Un brouillon expiré ou construit sur un autre catalogue ou d'autres règles n'est pas
+        valide (il est supprimé avec l'enregistrement du planning) ; celui qui reprend une recette
+        utilisée depuis est ignoré mais conservé (il peut le redevenir). Rien n'est écrit ici.
+        """
+        draft = self.db.get_draft_plan(profile_key(preferences, include_lunch), week_start_date)
+        if not draft:
+            return None
+        rules = rule_registry.get()
+        draft['valid'] = (draft['expires_at'] > datetime.now().isoformat()
+                          and draft['catalog_version'] == self.db.get_catalog_version()
+                          and draft['rules_version'] == rules.version)
+        if draft['valid']:
+            # Un planning enregistré depuis a pu utiliser les mêmes recettes
+            draft['meals'] = json.loads(draft['meals'])
+            recent_since = date.today() - timedelta(weeks=rules.recent_weeks)
+            if any(self.db.recency_index.is_recent(m['recipe_name'], recent_since)
+                   for m in draft['meals']):
+                return None
+        return draft
+
+class DraftScheduler:
+    """Thread de fond qui pré-génère les brouillons pendant les heures creuses.
+
+    Un bail en base garantit qu'un seul worker gunicorn travaille à la fois.
+    """
+
+    LEASE_NAME = 'draft_pregeneration'
+
+    def __init__(self, db_manager: DatabaseManager, offpeak_hours: str = DRAFT_OFFPEAK_HOURS,
+                 check_interval: float = DRAFT_CHECK_INTERVAL):
+        self.service = DraftService(db_manager)
+        self.db = db_manager
+        start, end = (int(h) for h in offpeak_hours.split('-'))
+        self.offpeak = (start, end)
+        self.check_interval = check_interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def is_offpeak(self, now: Optional[datetime] = None) -> bool:
+        hour = (now or datetime.now()).hour
+        start, end = self.offpeak
+        return start <= hour < end if start <= end else hour >= start or hour < end
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """Pré-génère si c'est l'heure creuse et que ce worker obtient le bail"""
+        if not self.is_offpeak():
+            return None
+        if not self.db.acquire_lease(self.LEASE_NAME, self.owner, self.check_interval):
+            return None
+        result = self.service.pregenerate()
+        if result['generated']:
+            print(f"Brouillons pré-générés: {result['generated']} ({result['elapsed']} s)")
+        return result
+
+    def _loop(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Erreur planificateur de brouillons: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='draft-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -2,17 +2,30 @@
 Service hybride combinant recettes Jow et recettes camerounaises
 """
 from typing import List, Dict, Any, Optional, Set
-from database import DatabaseManager
+from database import DatabaseManager, RATING_PRIOR_MEAN
 from services.jow_service import JowService
 from services.constraint_service import ConstraintService
+from services.plan_solver import PlanSolver, PlanSlot, DAYS_OF_WEEK
+from services.plan_analyzer import PlanAnalyzer
+from services.recommendation_index import recommendation_index
 from models import CuisineType, MealType, UserPreferences
+from tracing import trace_methods
 
+# Voisins examinés par variation demandée, puis poids de la note dans leur classement
+VARIATION_CANDIDATES_FACTOR = 3
+VARIATION_RATING_WEIGHT = 0.05
+
+# En deçà (une semaine avec déjeuners), les recettes récentes restent candidates en dernier recours
+MIN_LOCAL_CANDIDATES = 14
+
+@trace_methods('hybrid_recipe_service')
 class HybridRecipeService:
     def __init__(self, db_manager: DatabaseManager):
         """Initialise le service hybride"""
         self.db = db_manager
         self.jow_service = JowService()
         self.constraint_service = ConstraintService(db_manager)
+        self.solver = PlanSolver.from_rules(self.constraint_service.rules)
     
     def get_available_recipes(self, preferences: UserPreferences, 
                             day_of_week: str,
@@ -22,46 +35,96 @@ class HybridRecipeService:
         if current_plan_ingredients is None:
             current_plan_ingredients = {}
         
-        # 1. Récupérer les recettes camerounaises
-        cameroon_recipes = self._get_cameroon_recipes()
+        # 1. Récupérer les recettes camerounaises (règles appliquées directement dans SQLite)
+        where, params = self.constraint_service.sql_filter(current_plan_ingredients)
+        cameroon_recipes = self._get_cameroon_recipes(where, params)
         
-        # 2. Récupérer les recettes Jow
+        # 2. Récupérer les recettes Jow et leur appliquer les mêmes règles en mémoire
         jow_recipes = self._get_jow_recipes(preferences)
+        if jow_recipes:
+            jow_recipes = self.constraint_service.filter_recipes_by_constraints(
+                jow_recipes, self.constraint_service.get_used_recipes(),
+                current_plan_ingredients, day_of_week
+            )
         
         # 3. Combiner les recettes
-        all_recipes = cameroon_recipes + jow_recipes
+        filtered_recipes = cameroon_recipes + jow_recipes
         
-        # 4. Appliquer les contraintes
-        used_recipes = self.constraint_service.get_used_recipes()
-        filtered_recipes = self.constraint_service.filter_recipes_by_constraints(
-            all_recipes, used_recipes, current_plan_ingredients, day_of_week
-        )
-        
-        # 5. S'assurer qu'il y a toujours au moins une recette camerounaise
-        cameroon_filtered = [r for r in filtered_recipes if r.get('cuisine_type') == 'cameroun']
-        if not cameroon_filtered:
-            # Ajouter des recettes camerounaises même si elles violent les contraintes
-            cameroon_available = [r for r in cameroon_recipes if r.get('recipe_name') not in used_recipes]
+        # 4. S'assurer qu'il y a toujours au moins une recette camerounaise
+        if not cameroon_recipes:
+            # Ajouter des recettes camerounaises même si elles violent les contraintes d'ingrédients
+            where, params = self.constraint_service.sql_filter()
+            cameroon_available = self._get_cameroon_recipes(where, params)
             if cameroon_available:
                 filtered_recipes.extend(cameroon_available[:2])  # Ajouter 2 recettes camerounaises
         
         return filtered_recipes
     
-    def _get_cameroon_recipes(self) -> List[Dict[str, Any]]:
-        """Récupère les recettes camerounaises de la base"""
+    def get_candidates(self, preferences: UserPreferences) -> tuple:
+        """Candidats d'une génération : (recettes camerounaises, recettes Jow), avec leur affinité.
+        
+        Les règles (non-répétition) sont appliquées dans SQLite ; le solveur applique ensuite les
+        limites d'ingrédients qui dépendent du plan en construction.
+        """
+        where, params = self.constraint_service.sql_filter()
+        cameroon_recipes = self._get_cameroon_recipes(where, params)
+        if len(cameroon_recipes) < MIN_LOCAL_CANDIDATES:
+            # Catalogue épuisé par la non-répétition : recettes récentes en dernier recours
+            cameroon_recipes = self._get_cameroon_recipes()
+        jow_recipes = self._get_jow_recipes(preferences)
+        
+        affinities = self._get_affinities()
+        if affinities:
+            cameroon_recipes = [dict(r, affinity=affinities.get(r['recipe_name'], 0.0)) for r in cameroon_recipes]
+            jow_recipes = [dict(r, affinity=affinities.get(r['recipe_name'], 0.0)) for r in jow_recipes]
+        return cameroon_recipes, jow_recipes
+    
+    def _get_affinities(self) -> Dict[str, float]:
+        """Affinité des recettes avec les favoris et les recettes bien notées (index item-item)"""
+        if not recommendation_index.available:
+            return {}
         try:
             with self.db.get_connection() as conn:
                 cursor = conn.cursor()
-                
                 cursor.execute("""
+                    SELECT recipe_name FROM favorites
+                    UNION
+                    SELECT recipe_name FROM meal_slots
+                    WHERE plan_id IS NOT NULL AND (is_favorite = 1 OR rating >= 4)
+                """)
+                seeds = [row[0] for row in cursor.fetchall()]
+            affinities = recommendation_index.affinities(seeds)
+            # Ramené à [0, 1] pour rester comparable aux autres termes du score
+            top = max(affinities.values(), default=0.0)
+            return {name: value / top for name, value in affinities.items()} if top > 0 else {}
+        except Exception as e:
+            print(f"Erreur calcul affinités: {e}")
+            return {}
+    
+    def _get_cameroon_recipes(self, where: str = '', params: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        """Récupère les recettes camerounaises de la base (filtre SQL optionnel sur l'alias `c`).
+        
+        Classées par moyenne bayésienne des notes de toutes leurs copies planifiées
+        (recipe_ratings.bayesian_avg, a priori pour une recette jamais notée), puis par la note
+        de la fiche.
+        """
+        try:
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute(f"""
                     SELECT 
-                        id, recipe_name, main_ingredient, cuisine_type,
-                        image_url, prep_time, cook_time, notes,
-                        is_favorite, rating, jow_recipe_id, jow_recipe_url
-                    FROM meal_slots
-                    WHERE cuisine_type = ? AND plan_id IS NULL
-                    ORDER BY rating DESC, is_favorite DESC
-                """, (CuisineType.CAMEROUN.value,))
+                        c.id, c.recipe_name, c.main_ingredient, c.cuisine_type,
+                        c.image_url, c.prep_time, c.cook_time, c.notes,
+                        c.is_favorite, c.rating, c.jow_recipe_id, c.jow_recipe_url,
+                        COALESCE(rr.bayesian_avg, {RATING_PRIOR_MEAN}) AS avg_rating,
+                        COALESCE(rr.rating_count, 0) AS rating_count
+                    FROM meal_slots c
+                    LEFT JOIN recipe_ratings rr ON rr.recipe_name = c.recipe_name
+                    WHERE c.cuisine_type = ? AND c.plan_id IS NULL
+                    {'AND ' + where if where else ''}
+                    ORDER BY avg_rating DESC, c.rating DESC, c.is_favorite DESC
+                """, [CuisineType.CAMEROUN.value] + (params or []))
                 
                 recipes = []
                 for row in cursor.fetchall():
@@ -78,6 +141,8 @@ class HybridRecipeService:
                         'rating': row[9],
                         'jow_recipe_id': row[10],
                         'jow_recipe_url': row[11],
+                        'avg_rating': row[12],
+                        'rating_count': row[13],
                         'source': 'local'
                     })
                 
@@ -100,7 +165,8 @@ class HybridRecipeService:
             # Récupérer les suggestions Jow
             jow_recipes = self.jow_service.get_recipe_suggestions(jow_preferences)
             
-            # Limiter le nombre de recettes Jow
+            # Limiter le nombre de recettes Jow ; leurs ingrédients (listes de courses) sont
+            # enregistrés avec le plan qui les retient (jamais pendant un aperçu)
             return jow_recipes[:10]  # Maximum 10 recettes Jow
             
         except Exception as e:
@@ -108,56 +174,151 @@ class HybridRecipeService:
             return []
     
     def generate_weekly_plan_recipes(self, preferences: UserPreferences, 
-                                   plan_id: int) -> List[Dict[str, Any]]:
-        """Génère les recettes pour un planning hebdomadaire"""
+                                   plan_id: int,
+                                   include_lunch: bool = False,
+                                   time_budget: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Génère les recettes pour un planning hebdomadaire (résolution globale)"""
+        slots = self.solver.build_slots(include_lunch)
+        return self._generate_slot_recipes(preferences, plan_id, slots, time_budget)
+    
+    def generate_day_recipes(self, preferences: UserPreferences,
+                             plan_id: int,
+                             days: List[str],
+                             current_meals: List[Dict[str, Any]],
+                             include_lunch: bool = False,
+                             time_budget: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Génère les recettes des seuls jours `days`, le reste du plan servant de contraintes"""
+        fixed_meals = [m for m in current_meals if m['day_of_week'] not in days]
+        
+        # Mêmes types de repas qu'avant pour chaque jour régénéré
+        slots = []
+        for day in DAYS_OF_WEEK:
+            if day not in days:
+                continue
+            meal_types = {m['meal_type'] for m in current_meals if m['day_of_week'] == day}
+            if include_lunch:
+                meal_types.add(MealType.LUNCH.value)
+            meal_types = meal_types or {MealType.DINNER.value}
+            slots.extend(PlanSlot(day, meal_type) for meal_type in
+                         sorted(meal_types, key=lambda t: t != MealType.LUNCH.value))
+        
+        return self._generate_slot_recipes(preferences, plan_id, slots, time_budget, fixed_meals)
+    
+    def replan_recipes(self, preferences: UserPreferences,
+                       plan_id: int,
+                       current_meals: List[Dict[str, Any]],
+                       banned_recipes: Optional[Set[str]] = None,
+                       locked_days: Optional[Set[str]] = None,
+                       time_budget: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Recalcule uniquement les créneaux dont les contraintes ont changé.
+
+        Retourne une entrée par créneau modifié : repas actuel, raison et
+        nouvelle recette (None si aucune recette ne convient).
+        """
+        banned_recipes = set(banned_recipes or ())
+        locked_days = set(locked_days or ())
+        cameroon_recipes, jow_recipes = self.get_candidates(preferences)
+        
+        allowed_cuisines = {c.value for c in preferences.cuisines} | {CuisineType.CAMEROUN.value}
+        jow_available = {r.get('jow_recipe_id') or r['recipe_name'] for r in jow_recipes}
+        
+        jow_exists: Dict[str, Optional[bool]] = {}
+        
+        stale = []
+        for meal in current_meals:
+            if meal['day_of_week'] in locked_days:
+                continue
+            jow_id = meal.get('jow_recipe_id')
+            suggested = (jow_id or meal['recipe_name']) in jow_available
+            if meal['recipe_name'] in banned_recipes or jow_id in banned_recipes:
+                reason = 'banned'
+            elif meal.get('cuisine_type') not in allowed_cuisines:
+                reason = 'cuisine'
+            elif ((preferences.vegetarian or preferences.light)
+                  and meal.get('cuisine_type') != CuisineType.CAMEROUN.value and not suggested):
+                # Recette Jow absente des suggestions filtrées par les nouvelles préférences
+                reason = 'preferences'
+            elif jow_id and not suggested:
+                # Recette Jow retirée du catalogue Jow (inconnu si Jow ne répond pas : conservée)
+                if jow_id not in jow_exists:
+                    jow_exists[jow_id] = self.jow_service.recipe_exists(jow_id)
+                if jow_exists[jow_id] is not False:
+                    continue
+                reason = 'unavailable'
+            else:
+                continue
+            stale.append((meal, reason))
+        
+        if not stale:
+            return []
         
-        days_of_week = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-        weekly_recipes = []
-        current_plan_ingredients = {}
+        stale_ids = {meal['id'] for meal, _ in stale}
+        fixed_meals = [m for m in current_meals if m['id'] not in stale_ids]
+        slots = [PlanSlot(meal['day_of_week'], meal['meal_type']) for meal, _ in stale]
+        recipes = self._generate_slot_recipes(
+            preferences, plan_id, slots, time_budget, fixed_meals,
+            excluded_recipes=banned_recipes, candidates=(cameroon_recipes, jow_recipes)
+        )
         
-        for day in days_of_week:
-            # Récupérer les recettes disponibles pour ce jour
-            available_recipes = self.get_available_recipes(
-                preferences, day, current_plan_ingredients
-            )
-            
-            if not available_recipes:
-                # Fallback: utiliser n'importe quelle recette camerounaise
-                available_recipes = self._get_cameroon_recipes()[:5]
-            
-            # Sélectionner une recette (priorité aux camerounaises)
-            selected_recipe = self._select_recipe_for_day(available_recipes, day)
-            
-            if selected_recipe:
-                # Ajouter les informations du jour
-                selected_recipe['day_of_week'] = day
-                selected_recipe['meal_type'] = MealType.DINNER.value
-                selected_recipe['plan_id'] = plan_id
-                
-                weekly_recipes.append(selected_recipe)
-                
-                # Mettre à jour les ingrédients utilisés
-                ingredient = selected_recipe.get('main_ingredient', '')
-                if ingredient:
-                    current_plan_ingredients[ingredient] = current_plan_ingredients.get(ingredient, 0) + 1
+        by_slot: Dict[tuple, List[Dict[str, Any]]] = {}
+        for recipe in recipes:
+            by_slot.setdefault((recipe['day_of_week'], recipe['meal_type']), []).append(recipe)
         
-        return weekly_recipes
+        changes = []
+        for meal, reason in stale:
+            replacements = by_slot.get((meal['day_of_week'], meal['meal_type'])) or [None]
+            changes.append({'meal': meal, 'reason': reason, 'recipe': replacements.pop(0)})
+        return changes
     
-    def _select_recipe_for_day(self, available_recipes: List[Dict[str, Any]], 
-                              day_of_week: str) -> Optional[Dict[str, Any]]:
-        """Sélectionne une recette pour un jour donné"""
-        
-        if not available_recipes:
-            return None
-        
-        # Priorité aux recettes camerounaises
-        cameroon_recipes = [r for r in available_recipes if r.get('cuisine_type') == 'cameroun']
-        if cameroon_recipes:
-            # Sélectionner la meilleure recette camerounaise
-            return max(cameroon_recipes, key=lambda x: (x.get('rating', 0), x.get('is_favorite', False)))
+    def _generate_slot_recipes(self, preferences: UserPreferences, plan_id: int,
+                               slots: List[PlanSlot], time_budget: Optional[float] = None,
+                               fixed_meals: Optional[List[Dict[str, Any]]] = None,
+                               excluded_recipes: Optional[Set[str]] = None,
+                               candidates: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Résout les créneaux donnés et complète les créneaux vides avec des recettes camerounaises"""
+        
+        # Récupérer les candidats une seule fois pour tous les créneaux
+        if candidates is None:
+            candidates = self.get_candidates(preferences)
+        cameroon_recipes, jow_recipes = candidates
+        excluded_recipes = excluded_recipes or set()
+        if excluded_recipes:
+            cameroon_recipes = [r for r in cameroon_recipes if r['recipe_name'] not in excluded_recipes
+                                and r.get('jow_recipe_id') not in excluded_recipes]
+            jow_recipes = [r for r in jow_recipes if r['recipe_name'] not in excluded_recipes
+                           and r.get('jow_recipe_id') not in excluded_recipes]
+        used_recipes = self.constraint_service.get_used_recipes()
         
-        # Sinon, sélectionner la meilleure recette disponible
-        return max(available_recipes, key=lambda x: (x.get('rating', 0), x.get('is_favorite', False)))
+        result = self.solver.solve(cameroon_recipes + jow_recipes, slots, used_recipes,
+                                   time_budget, fixed_meals)
+        return self.complete_assignments(slots, result.assignments, cameroon_recipes, plan_id, fixed_meals)
+    
+    @staticmethod
+    def complete_assignments(slots: List[PlanSlot], assignments: List[Optional[Dict[str, Any]]],
+                             cameroon_recipes: List[Dict[str, Any]], plan_id: Optional[int],
+                             fixed_meals: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Transforme une affectation du solveur en repas (créneaux vides complétés en camerounais)"""
+        
+        # Fallback: compléter les créneaux vides avec les recettes camerounaises
+        taken_names = {r['recipe_name'] for r in assignments if r}
+        taken_names |= {m['recipe_name'] for m in fixed_meals or []}
+        fallback = [r for r in cameroon_recipes[:5] if r['recipe_name'] not in taken_names]
+        
+        recipes = []
+        for slot, recipe in zip(slots, assignments):
+            if recipe is None:
+                if not fallback:
+                    continue
+                recipe = fallback.pop(0)
+            
+            # Ajouter les informations du créneau (copie pour ne pas modifier le candidat)
+            selected_recipe = dict(recipe)
+            selected_recipe['day_of_week'] = slot.day_of_week
+            selected_recipe['meal_type'] = slot.meal_type
+            selected_recipe['plan_id'] = plan_id
+            recipes.append(selected_recipe)
+        
+        return recipes
     
     def get_recipe_variations(self, base_recipe: Dict[str, Any], 
                             preferences: UserPreferences) -> List[Dict[str, Any]]:
@@ -172,48 +333,34 @@ class HybridRecipeService:
     
     def _get_cameroon_variations(self, base_recipe: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Génère des variations de recettes camerounaises"""
+        return self.get_similar_recipes(base_recipe, k=3)
+    
+    def get_similar_recipes(self, base_recipe: Dict[str, Any], k: int = 5) -> List[Dict[str, Any]]:
+        """Recettes du catalogue les plus proches (index TF-IDF local), notes comprises.
         
-        main_ingredient = base_recipe.get('main_ingredient', '')
-        variations = []
-        
-        # Chercher des recettes avec le même ingrédient principal
+        Les voisins sont départagés par leur note moyenne, à similarité voisine.
+        """
         try:
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    SELECT 
-                        id, recipe_name, main_ingredient, cuisine_type,
-                        image_url, prep_time, cook_time, notes,
-                        is_favorite, rating
-                    FROM meal_slots
-                    WHERE main_ingredient = ? 
-                    AND cuisine_type = ?
-                    AND id != ?
-                    AND plan_id IS NULL
-                    ORDER BY rating DESC
-                    LIMIT 3
-                """, (main_ingredient, CuisineType.CAMEROUN.value, base_recipe.get('id', 0)))
-                
-                for row in cursor.fetchall():
-                    variations.append({
-                        'id': row[0],
-                        'recipe_name': row[1],
-                        'main_ingredient': row[2],
-                        'cuisine_type': row[3],
-                        'image_url': row[4],
-                        'prep_time': row[5],
-                        'cook_time': row[6],
-                        'notes': row[7],
-                        'is_favorite': bool(row[8]),
-                        'rating': row[9],
-                        'source': 'local'
-                    })
-                
+            neighbors = self.db.similarity_index.similar(base_recipe, k * VARIATION_CANDIDATES_FACTOR)
+            if not neighbors:
+                return []
+            similarities = dict(neighbors)
+            placeholders = ', '.join('?' for _ in similarities)
+            recipes = self._get_cameroon_recipes(f"c.id IN ({placeholders})", list(similarities))
         except Exception as e:
             print(f"Erreur récupération variations camerounaises: {e}")
+            return []
         
-        return variations
+        variations, seen = [], {base_recipe.get('recipe_name')}
+        for recipe in recipes:
+            if recipe['recipe_name'] in seen:
+                continue
+            seen.add(recipe['recipe_name'])
+            recipe['similarity'] = round(similarities[recipe['id']], 4)
+            variations.append(recipe)
+        variations.sort(key=lambda r: r['similarity']
+                        + VARIATION_RATING_WEIGHT * (r['avg_rating'] - RATING_PRIOR_MEAN), reverse=True)
+        return variations[:k]
     
     def _get_jow_variations(self, base_recipe: Dict[str, Any], 
                           preferences: UserPreferences) -> List[Dict[str, Any]]:
@@ -235,55 +382,4 @@ class HybridRecipeService:
     
     def get_planning_quality_score(self, plan_id: int) -> Dict[str, Any]:
         """Calcule un score de qualité pour un planning"""
-        
-        stats = self.constraint_service.get_planning_statistics(plan_id)
-        
-        # Score de base
-        score = 100
-        
-        # Pénalités pour violations
-        violations = stats.get('constraint_violations', [])
-        score -= len(violations) * 10
-        
-        # Bonus pour diversité
-        unique_ingredients = stats.get('unique_ingredients', 0)
-        if unique_ingredients >= 5:
-            score += 10
-        elif unique_ingredients >= 3:
-            score += 5
-        
-        # Bonus pour recettes camerounaises
-        cameroon_count = sum(1 for c in stats.get('cuisines', []) if c[0] == 'cameroun')
-        if cameroon_count >= 3:
-            score += 15
-        elif cameroon_count >= 1:
-            score += 10
-        
-        return {
-            'score': max(0, min(100, score)),
-            'violations': violations,
-            'stats': stats,
-            'recommendations': self._get_improvement_recommendations(stats)
-        }
-    
-    def _get_improvement_recommendations(self, stats: Dict[str, Any]) -> List[str]:
-        """Génère des recommandations d'amélioration"""
-        
-        recommendations = []
-        
-        # Vérifier la diversité des ingrédients
-        unique_ingredients = stats.get('unique_ingredients', 0)
-        if unique_ingredients < 5:
-            recommendations.append("Ajouter plus de diversité dans les ingrédients")
-        
-        # Vérifier les recettes camerounaises
-        cameroon_count = sum(1 for c in stats.get('cuisines', []) if c[0] == 'cameroun')
-        if cameroon_count == 0:
-            recommendations.append("Inclure au moins une recette camerounaise")
-        
-        # Vérifier les violations
-        violations = stats.get('constraint_violations', [])
-        if violations:
-            recommendations.append("Réduire les répétitions d'ingrédients")
-        
-        return recommendations
+        return PlanAnalyzer(self.db, self.constraint_service.rules).analyze(plan_id)['quality']
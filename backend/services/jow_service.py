@@ -2,8 +2,18 @@
 Service d'intégration avec l'API Jow via la librairie officielle
 """
 from typing import List, Dict, Any, Optional
-from jow_api import Jow
+from ingredient_units import parse_ingredient
+from metrics import observe_upstream
+from tracing import trace_methods
 
+def jow_search(query: str, limit: int, operation: str = 'search') -> List[Dict[str, Any]]:
+    """Jow.search mesuré (durée et erreurs par opération)"""
+    # Import différé : le client Jow n'est chargé qu'au premier appel
+    from jow_api import Jow
+    with observe_upstream('jow', operation):
+        return Jow.search(query, limit=limit)
+
+@trace_methods('jow_service')
 class JowService:
     def __init__(self):
         """Initialise le service Jow API avec la librairie officielle"""
@@ -12,7 +22,7 @@ class JowService:
     def search_recipes(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Recherche des recettes sur Jow"""
         try:
-            recipes = Jow.search(query, limit=limit)
+            recipes = jow_search(query, limit)
             return self._format_jow_recipes(recipes)
             
         except Exception as e:
@@ -23,7 +33,7 @@ class JowService:
         """Récupère une recette spécifique par ID (utilise la recherche)"""
         try:
             # Recherche par ID ou nom
-            recipes = Jow.search(recipe_id, limit=1)
+            recipes = jow_search(recipe_id, 1, 'recipe')
             if recipes:
                 return self._format_jow_recipe(recipes[0])
             return None
@@ -32,11 +42,20 @@ class JowService:
             print(f"Erreur récupération recette Jow {recipe_id}: {e}")
             return None
     
+    def recipe_exists(self, recipe_id: str) -> Optional[bool]:
+        """Vrai si la recette est toujours proposée par Jow (None si Jow ne répond pas)"""
+        try:
+            recipes = jow_search(recipe_id, 1, 'recipe')
+        except Exception as e:
+            print(f"Erreur vérification recette Jow {recipe_id}: {e}")
+            return None
+        return any(getattr(recipe, 'id', None) == recipe_id for recipe in recipes)
+    
     def get_recipes_by_cuisine(self, cuisine: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Récupère des recettes par type de cuisine"""
         try:
             # Recherche par cuisine
-            recipes = Jow.search(f"{cuisine} cuisine", limit=limit)
+            recipes = jow_search(f"{cuisine} cuisine", limit, 'cuisine')
             return self._format_jow_recipes(recipes)
             
         except Exception as e:
@@ -63,7 +82,7 @@ class JowService:
             # Construire la requête
             query = " ".join(query_parts) if query_parts else "recettes"
             
-            recipes = Jow.search(query, limit=20)
+            recipes = jow_search(query, 20, 'suggestions')
             return self._format_jow_recipes(recipes)
             
         except Exception as e:
@@ -97,7 +116,7 @@ class JowService:
                 'difficulty': 'medium',  # Pas disponible dans JowResult
                 'cuisine_type': 'international',  # Pas disponible dans JowResult
                 'main_ingredient': self._extract_main_ingredient(recipe),
-                'ingredients': getattr(recipe, 'ingredients', []),
+                'ingredients': [i for i in map(parse_ingredient, getattr(recipe, 'ingredients', None) or []) if i],
                 'instructions': [],  # Pas disponible dans JowResult
                 'nutrition': {},  # Pas disponible dans JowResult
                 'tags': [],  # Pas disponible dans JowResult
@@ -167,7 +186,7 @@ class JowService:
         """Teste la connexion à l'API Jow"""
         try:
             # Test simple avec une recherche
-            recipes = Jow.search("test", limit=1)
+            recipes = jow_search("test", 1, 'health')
             return isinstance(recipes, list)
         except Exception as e:
             print(f"Erreur test connexion Jow: {e}")
@@ -1,17 +1,25 @@
 """
 Service de gestion des repas
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Callable, Iterator, Sequence
 from models import Meal, MealType, CuisineType
-from database import DatabaseManager
+from database import DatabaseManager, STREAM_BATCH_SIZE, MEAL_COLUMNS, FAVORITE_COLUMNS
+
+# Champs propres à l'utilisateur, remis à zéro sur un repas généré jusqu'à ce qu'il le note
+USER_MEAL_FIELDS = {'rating': 0, 'is_favorite': False}
 
 class MealService:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
     
-    def get_meals_by_plan(self, plan_id: int) -> List[Dict[str, Any]]:
+    def get_meals_by_plan(self, plan_id: int, row_factory: Optional[Callable] = None,
+                          columns: Sequence[str] = MEAL_COLUMNS) -> List[Dict[str, Any]]:
         """Récupère tous les repas d'un plan"""
-        return self.db.get_plan_meals(plan_id)
+        return self.db.get_plan_meals(plan_id, row_factory, columns)
+    
+    def get_meal_by_id(self, meal_id: int) -> Optional[Dict[str, Any]]:
+        """Récupère un repas par son ID"""
+        return self.db.get_meal(meal_id)
     
     def get_current_meal(self, day_of_week: str = "Mardi") -> Optional[Dict[str, Any]]:
         """Récupère le repas actuel (par défaut Mardi)"""
@@ -41,9 +49,10 @@ class MealService:
             row = cursor.fetchone()
             return dict(row) if row else None
     
-    def add_meal(self, meal_data: Dict[str, Any]) -> int:
-        """Ajoute un nouveau repas"""
-        meal = Meal(
+    def build_meal(self, meal_data: Dict[str, Any]) -> Meal:
+        """Construit un Meal à partir d'un dictionnaire"""
+        tags = meal_data.get('tags')
+        return Meal(
             id=None,
             day_of_week=meal_data.get('day_of_week'),
             meal_type=MealType(meal_data.get('meal_type', 'Dîner')),
@@ -59,8 +68,21 @@ class MealService:
             is_favorite=meal_data.get('is_favorite', False),
             rating=meal_data.get('rating', 0),
             notes=meal_data.get('notes'),
-            plan_id=meal_data.get('plan_id')
+            plan_id=meal_data.get('plan_id'),
+            tags=', '.join(tags) if isinstance(tags, (list, tuple)) else tags
         )
+    
+    def build_generated_meal(self, meal_data: Dict[str, Any]) -> Meal:
+        """Construit un repas généré : la note et le favori de la recette source ne sont pas repris"""
+        return self.build_meal(dict(meal_data, **USER_MEAL_FIELDS))
+    
+    def add_meal(self, meal_data: Dict[str, Any]) -> int:
+        """Ajoute un nouveau repas"""
+        meal = self.build_meal(meal_data)
+        
+        # Ingrédients fournis à l'ajout (catalogue local, recette Jow)
+        if meal_data.get('ingredients'):
+            self.db.save_recipe_ingredients([meal_data], replace=meal.plan_id is None)
         
         # Si pas de plan_id, ajouter comme recette de base
         if meal.plan_id is None:
@@ -68,6 +90,24 @@ class MealService:
         else:
             return self.db.add_meal_to_plan(meal)
     
+    def add_meals(self, meals_data: List[Dict[str, Any]]) -> List[int]:
+        """Ajoute les repas d'un plan en une seule transaction"""
+        return self.db.add_meals_to_plan([self.build_meal(meal_data) for meal_data in meals_data])
+    
+    def replace_meals(self, plan_id: int, removed_meal_ids: List[int],
+                      meals_data: List[Dict[str, Any]]) -> List[int]:
+        """Remplace des repas d'un plan par des repas générés en une seule transaction"""
+        meals = [self.build_generated_meal(dict(meal_data, plan_id=plan_id)) for meal_data in meals_data]
+        return self.db.replace_plan_meals(plan_id, removed_meal_ids, meals, recipe_ingredients=meals_data)
+    
+    def apply_meal_changes(self, plan_id: int, updated_meals: Dict[int, Dict[str, Any]],
+                           removed_meal_ids: List[int]) -> int:
+        """Remplace la recette de certains repas (ids conservés) et en supprime d'autres"""
+        meals = {meal_id: self.build_generated_meal(dict(meal_data, plan_id=plan_id))
+                 for meal_id, meal_data in updated_meals.items()}
+        return self.db.apply_meal_changes(plan_id, meals, removed_meal_ids,
+                                          recipe_ingredients=list(updated_meals.values()))
+    
     def update_meal(self, meal_id: int, updates: Dict[str, Any]) -> bool:
         """Met à jour un repas"""
         return self.db.update_meal(meal_id, updates)
@@ -94,52 +134,37 @@ class MealService:
         return self.db.update_meal(meal_id, {'notes': notes})
     
     def generate_shopping_list(self, plan_id: int) -> List[str]:
-        """Génère une liste de courses pour un plan"""
-        meals = self.get_meals_by_plan(plan_id)
-        ingredients = set()
-        
-        for meal in meals:
-            if meal['main_ingredient']:
-                ingredients.add(meal['main_ingredient'])
-            
-            # Ajouter des ingrédients communs selon la cuisine
-            cuisine = meal.get('cuisine_type')
-            if cuisine == 'cameroun':
-                ingredients.update([
-                    'oignons', 'tomates', 'ail', 'gingembre', 'huile de palme',
-                    'piment', 'cubes maggi', 'plantain', 'taro', 'arachide',
-                    'feuilles vertes', 'poisson fumé'
-                ])
-            elif cuisine == 'asiatique':
-                ingredients.update([
-                    'sauce soja', 'gingembre', 'ail', 'oignons verts',
-                    'huile de sésame', 'nouilles de riz', 'tofu', 'lait de coco',
-                    'curry', 'pousses de soja', 'carottes', 'brocolis'
-                ])
-            elif cuisine == 'mexican':
-                ingredients.update(['avocat', 'lime', 'coriandre', 'fromage', 'tortillas'])
-        
-        return list(ingredients)
+        """Génère une liste de courses pour un plan (libellés avec quantités)"""
+        from services.shopping_service import ShoppingListService
+        result = ShoppingListService(self.db).get_plan_list(plan_id)
+        return [item['label'] for item in result[0]['items']] if result else []
     
     def delete_meal(self, meal_id: int) -> bool:
         """Supprime un repas"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM meal_slots WHERE id = ?", (meal_id,))
-            return cursor.rowcount > 0
+        return self.db.delete_meal(meal_id)
     
-    def get_all_meals(self) -> List[Dict[str, Any]]:
-        """Récupère tous les repas"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT id, day_of_week, meal_type, recipe_name, jow_recipe_id, 
-                       jow_recipe_url, main_ingredient, cuisine_type, image_url, 
-                       video_url, prep_time, cook_time, is_favorite, rating, notes
-                FROM meal_slots
-                ORDER BY day_of_week, meal_type
-            """)
-            return [dict(row) for row in cursor.fetchall()]
+    def get_all_meals(self, row_factory: Optional[Callable] = None) -> List[Dict[str, Any]]:
+        """Récupère tous les repas (`row_factory(cursor)` : format des lignes, dict par défaut)"""
+        return [meal for batch in self.iter_all_meals(row_factory) for meal in batch]
+    
+    def iter_all_meals(self, row_factory: Optional[Callable] = None,
+                       batch_size: int = STREAM_BATCH_SIZE,
+                       columns: Sequence[str] = MEAL_COLUMNS) -> Iterator[List[Any]]:
+        """Tous les repas, lus par lots (réponses en flux)"""
+        return self.db.iter_query_batches(f"""
+            SELECT {', '.join(columns)}
+            FROM meal_slots
+            ORDER BY day_of_week, meal_type
+        """, row_factory=row_factory, batch_size=batch_size)
+    
+    def iter_favorites(self, batch_size: int = STREAM_BATCH_SIZE,
+                       columns: Sequence[str] = FAVORITE_COLUMNS) -> Iterator[List[Dict[str, Any]]]:
+        """Favoris du plus récent au plus ancien, lus par lots"""
+        return self.db.iter_query_batches(f"""
+            SELECT {', '.join(columns)}
+            FROM favorites
+            ORDER BY added_date DESC
+        """, batch_size=batch_size)
     
     def remove_from_favorites(self, meal_id: int) -> bool:
         """Supprime un repas des favoris"""
@@ -0,0 +1,161 @@
+"""
+Analyse d'un planning en une seule lecture : statistiques, budget, violations et score qualité
+"""
+from typing import List, Dict, Any, Iterable, Optional, Set, TYPE_CHECKING
+from database import DatabaseManager, DAYS_OF_WEEK, normalize_text
+
+if TYPE_CHECKING:
+    from services.rule_engine import RuleSet
+
+# Coût estimé d'un repas selon la cuisine
+BUDGET_PER_MEAL = {
+    'cameroun': 8.0,
+    'asiatique': 6.0,
+    'mexican': 7.0,
+    'french': 10.0
+}
+DEFAULT_MEAL_COST = 8.0
+
+# Taille maximale d'une clause IN pour l'analyse par lots
+BATCH_CHUNK_SIZE = 500
+
+class PlanAnalyzer:
+    def __init__(self, db_manager: DatabaseManager, rules: Optional['RuleSet'] = None):
+        """`rules` : jeu de règles des violations (par défaut le jeu courant, rechargé à chaud)"""
+        self.db = db_manager
+        self._rules = rules
+
+    @property
+    def rules(self) -> 'RuleSet':
+        if self._rules is not None:
+            return self._rules
+        # Import différé : le moteur de règles charge NumPy
+        from services.rule_engine import rule_registry
+        return rule_registry.get()
+
+    def analyze(self, plan_id: int) -> Dict[str, Any]:
+        """Analyse un planning à partir d'une seule requête"""
+        return self.analyze_meals(self.db.get_plan_meals(plan_id))
+
+    def analyze_many(self, plan_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        """Analyse plusieurs plannings (une requête par tranche de BATCH_CHUNK_SIZE plans)"""
+        plan_ids = list(dict.fromkeys(plan_ids))
+        meals_by_plan: Dict[int, List[Dict[str, Any]]] = {plan_id: [] for plan_id in plan_ids}
+        for start in range(0, len(plan_ids), BATCH_CHUNK_SIZE):
+            for meal in self.db.get_meals_for_plans(plan_ids[start:start + BATCH_CHUNK_SIZE]):
+                meals_by_plan[meal['plan_id']].append(meal)
+        return {plan_id: self.analyze_meals(meals) for plan_id, meals in meals_by_plan.items()}
+
+    def analyze_meals(self, meals: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Calcule toutes les métriques d'un planning en un seul parcours des repas"""
+        total_meals = 0
+        rating_sum, rating_count = 0, 0
+        favorite_count = 0
+        budget = 0.0
+        ingredient_counts: Dict[str, int] = {}
+        cuisine_counts: Dict[Any, int] = {}
+        # Par ingrédient normalisé : nom affiché, nombre de repas et jours (index) d'utilisation
+        rule_usage: Dict[str, list] = {}
+        day_index = {day: i for i, day in enumerate(DAYS_OF_WEEK)}
+
+        for meal in meals:
+            total_meals += 1
+            rating = meal.get('rating') or 0
+            if rating > 0:
+                rating_sum += rating
+                rating_count += 1
+            if meal.get('is_favorite'):
+                favorite_count += 1
+
+            cuisine = meal.get('cuisine_type')
+            cuisine_counts[cuisine] = cuisine_counts.get(cuisine, 0) + 1
+            budget += BUDGET_PER_MEAL.get(cuisine, DEFAULT_MEAL_COST)
+
+            ingredient = meal.get('main_ingredient')
+            if ingredient:
+                ingredient_counts[ingredient] = ingredient_counts.get(ingredient, 0) + 1
+                usage = rule_usage.setdefault(normalize_text(ingredient), [ingredient, 0, []])
+                usage[1] += 1
+                if meal.get('day_of_week') in day_index:
+                    usage[2].append(day_index[meal['day_of_week']])
+
+        violations = self._violations(rule_usage)
+
+        top_ingredients = sorted(ingredient_counts.items(), key=lambda x: x[1], reverse=True)
+        cuisines = sorted(cuisine_counts.items(), key=lambda x: x[1], reverse=True)
+        budget_estimate = round(budget, 2)
+
+        planning_statistics = {
+            'total_meals': total_meals,
+            'unique_ingredients': len(ingredient_counts),
+            'unique_cuisines': len([c for c in cuisine_counts if c is not None]),
+            'top_ingredients': top_ingredients,
+            'cuisines': cuisines,
+            'constraint_violations': violations
+        }
+
+        return {
+            'statistics': {
+                'total_meals': total_meals,
+                'avg_rating': round(rating_sum / rating_count, 1) if rating_count else 0,
+                'favorite_count': favorite_count,
+                'cuisine_distribution': {(c if c is not None else 'unknown'): n for c, n in cuisine_counts.items()},
+                'budget_estimate': budget_estimate
+            },
+            'planning_statistics': planning_statistics,
+            'quality': self._quality_score(planning_statistics, cuisine_counts.get('cameroun', 0)),
+            'budget_estimate': budget_estimate
+        }
+
+    def _violations(self, rule_usage: Dict[str, list]) -> List[str]:
+        """Violations des règles d'ingrédients que le solveur applique (règles courantes)"""
+        rules = self.rules
+        limits = rules.ingredient_max
+        not_consecutive: Set[str] = rules.not_consecutive_ingredients
+
+        violations = []
+        for key, (ingredient, count, days) in rule_usage.items():
+            if key in not_consecutive:
+                # Ni deux repas le même jour, ni deux jours de suite
+                days = sorted(days)
+                violations += [f"Ingrédient '{ingredient}' consécutif: {DAYS_OF_WEEK[day1]} -> {DAYS_OF_WEEK[day2]}"
+                               for day1, day2 in zip(days, days[1:]) if day2 - day1 <= 1]
+            if key in limits and count > limits[key]:
+                violations.append(f"Ingrédient '{ingredient}' utilisé {count} fois (max {limits[key]})")
+        return violations
+
+    def _quality_score(self, stats: Dict[str, Any], cameroon_count: int) -> Dict[str, Any]:
+        """Calcule le score de qualité à partir des statistiques déjà agrégées"""
+
+        # Score de base, pénalités pour violations
+        violations = stats['constraint_violations']
+        score = 100 - len(violations) * 10
+
+        # Bonus pour diversité
+        unique_ingredients = stats['unique_ingredients']
+        if unique_ingredients >= 5:
+            score += 10
+        elif unique_ingredients >= 3:
+            score += 5
+
+        # Bonus pour recettes camerounaises
+        if cameroon_count >= 3:
+            score += 15
+        elif cameroon_count >= 1:
+            score += 10
+
+        # Recommandations d'amélioration
+        recommendations = []
+        if unique_ingredients < 5:
+            recommendations.append("Ajouter plus de diversité dans les ingrédients")
+        if cameroon_count == 0:
+            recommendations.append("Inclure au moins une recette camerounaise")
+        if violations:
+            recommendations.append("Réduire les répétitions d'ingrédients")
+
+        return {
+            'score': max(0, min(100, score)),
+            'violations': violations,
+            'stats': stats,
+            'recommendations': recommendations
+        }
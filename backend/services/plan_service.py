@@ -1,14 +1,18 @@
 """
 Service de gestion des plans hebdomadaires avec génération IA
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Sequence
 from datetime import datetime, date
 from models import WeeklyPlan, UserPreferences, CuisineType, BudgetLevel, Meal, MealType
-from database import DatabaseManager
+from database import DatabaseManager, PLAN_COLUMNS
+from services.plan_analyzer import PlanAnalyzer
+from tracing import trace_methods
 
+@trace_methods('plan_service')
 class PlanService:
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
+        self.analyzer = PlanAnalyzer(db_manager)
     
     def create_plan(self, plan_name: str, week_start_date: date, 
                    preferences: UserPreferences, budget: Optional[float] = None) -> int:
@@ -23,9 +27,9 @@ class PlanService:
         )
         return self.db.create_plan(plan)
     
-    def get_plans(self, limit: int = 20) -> List[Dict[str, Any]]:
+    def get_plans(self, limit: int = 20, columns: Sequence[str] = PLAN_COLUMNS) -> List[Dict[str, Any]]:
         """Récupère tous les plans"""
-        return self.db.get_plans(limit)
+        return self.db.get_plans(limit, columns)
     
     def get_plan_by_id(self, plan_id: int) -> Optional[Dict[str, Any]]:
         """Récupère un plan par son ID"""
@@ -40,47 +44,50 @@ class PlanService:
         return self.db.delete_plan(plan_id)
     
     def generate_ai_plan(self, preferences: UserPreferences, 
-                        plan_name: str, week_start_date: date) -> Dict[str, Any]:
-        """Génère un plan avec l'IA en utilisant Gemini AI"""
+                        plan_name: str, week_start_date: date,
+                        include_lunch: bool = False,
+                        dry_run: bool = False) -> Dict[str, Any]:
+        """Génère un plan avec l'IA en utilisant Gemini AI.
+        
+        Le plan et ses statistiques sont construits en mémoire ; avec `dry_run`
+        rien n'est écrit, sinon tout est enregistré en une seule transaction.
+        """
         try:
             # Importer les services nécessaires (lazy import pour éviter les cycles)
-            from services.meal_service import MealService
-            from services.ai_service import AIService
             from services.hybrid_recipe_service import HybridRecipeService
+            from services.draft_service import DraftService
             
-            meal_service = MealService(self.db)
-            ai_service = AIService()
-            hybrid_service = HybridRecipeService(self.db)
-            
-            # 1. Créer le plan vide
-            plan_id = self.create_plan(plan_name, week_start_date, preferences)
+            # Promotion d'un brouillon pré-généré pendant les heures creuses ;
+            # profil et brouillon sont écrits dans la transaction du planning
+            writes = {}
+            if not dry_run:
+                drafts = DraftService(self.db)
+                writes['profile'] = drafts.profile_row(preferences, include_lunch)
+                draft = drafts.find_draft(preferences, week_start_date, include_lunch)
+                if draft and draft['valid']:
+                    try:
+                        result = self.save_generated_plan(plan_name, week_start_date, draft['meals'],
+                                                          draft=draft, **writes)
+                        result['from_draft'] = True
+                        return result
+                    except LookupError:
+                        # Promu entre-temps par un autre worker : génération normale
+                        pass
+                elif draft:
+                    writes['stale_draft_id'] = draft['id']
             
-            # 2. Générer les recettes avec le service hybride
-            weekly_recipes = hybrid_service.generate_weekly_plan_recipes(preferences, plan_id)
+            hybrid_service = HybridRecipeService(self.db)
             
-            # 3. Ajouter les repas générés
-            added_count = 0
-            for meal_data in weekly_recipes:
-                try:
-                    meal_service.add_meal(meal_data)
-                    added_count += 1
-                except Exception as e:
-                    print(f"Erreur ajout repas {meal_data.get('recipe_name')}: {e}")
+            # 1. Générer les recettes avec le service hybride (sans plan en base)
+            weekly_recipes = hybrid_service.generate_weekly_plan_recipes(
+                preferences, None, include_lunch=include_lunch
+            )
             
-            # 4. Calculer les statistiques finales
-            final_stats = self.get_plan_statistics(plan_id)
-            quality_score = hybrid_service.get_planning_quality_score(plan_id)
+            if dry_run:
+                return self._generation_result(None, weekly_recipes, preview=True)
             
-            return {
-                'success': True,
-                'plan_id': plan_id,
-                'meals_added': added_count,
-                'total_estimated_cost': self.calculate_budget_estimate(plan_id),
-                'ai_model': 'gemini-2.0-flash',
-                'statistics': final_stats,
-                'quality_score': quality_score,
-                'dietary_notes': f"Planning généré avec {added_count} repas variés"
-            }
+            # 2. Enregistrer le plan et ses repas en une transaction
+            return self.save_generated_plan(plan_name, week_start_date, weekly_recipes, **writes)
             
         except Exception as e:
             # En cas d'erreur, retourner le plan vide quand même
@@ -90,54 +97,126 @@ class PlanService:
                 'error': f"Erreur génération IA: {str(e)}",
                 'ai_model': 'gemini-2.5-flash'
             }
-
-    def calculate_budget_estimate(self, plan_id: int) -> float:
-        """Calcule une estimation du budget pour un plan"""
-        meals = self.db.get_plan_meals(plan_id)
+    
+    def save_generated_plan(self, plan_name: str, week_start_date: date,
+                            meals: List[Dict[str, Any]], **writes) -> Dict[str, Any]:
+        """Enregistre un plan généré (ou un aperçu accepté) et ses repas en une seule transaction.
         
-        budget_per_meal = {
-            'cameroun': 8.0,
-            'asiatique': 6.0,
-            'mexican': 7.0,
-            'french': 10.0
+        `writes` (profil, brouillon) est transmis à DatabaseManager.create_plan_with_meals.
+        """
+        from services.meal_service import MealService
+        
+        analysis = self.analyzer.analyze_meals(meals)
+        plan = WeeklyPlan(
+            id=None,
+            plan_name=plan_name,
+            week_start_date=week_start_date,
+            total_budget_estimate=analysis['budget_estimate'],
+            generated_by_ai=True,
+            created_at=datetime.now()
+        )
+        plan_meals = [MealService(self.db).build_generated_meal(meal) for meal in meals]
+        plan_id, _ = self.db.create_plan_with_meals(plan, plan_meals, recipe_ingredients=meals, **writes)
+        return self._generation_result(plan_id, meals, analysis=analysis)
+    
+    def _generation_result(self, plan_id: Optional[int], meals: List[Dict[str, Any]],
+                           preview: bool = False,
+                           analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Réponse de génération à partir des repas en mémoire (aucune relecture de la base)"""
+        analysis = analysis or self.analyzer.analyze_meals(meals)
+        result = {
+            'success': True,
+            'plan_id': plan_id,
+            'dry_run': preview,
+            'meals_added': 0 if preview else len(meals),
+            'total_estimated_cost': analysis['budget_estimate'],
+            'ai_model': 'gemini-2.0-flash',
+            'statistics': analysis['statistics'],
+            'quality_score': analysis['quality'],
+            'dietary_notes': f"Planning généré avec {len(meals)} repas variés"
         }
+        if preview:
+            # L'aperçu renvoie les repas pour pouvoir être accepté tel quel
+            result['meals'] = [{k: v for k, v in meal.items() if k not in ('id', 'plan_id')}
+                               for meal in meals]
+        return result
+    
+    def regenerate_days(self, plan_id: int, days: List[str],
+                        preferences: UserPreferences,
+                        include_lunch: bool = False) -> Dict[str, Any]:
+        """Régénère uniquement les jours donnés, le reste du plan restant fixe"""
+        from services.meal_service import MealService
+        from services.hybrid_recipe_service import HybridRecipeService
         
-        total = 0.0
-        for meal in meals:
-            cuisine = meal.get('cuisine_type', 'cameroun')
-            total += budget_per_meal.get(cuisine, 8.0)
+        meal_service = MealService(self.db)
+        hybrid_service = HybridRecipeService(self.db)
         
-        return round(total, 2)
-    
-    def get_plan_statistics(self, plan_id: int) -> Dict[str, Any]:
-        """Récupère les statistiques d'un plan"""
-        meals = self.db.get_plan_meals(plan_id)
+        current_meals = self.db.get_plan_meals(plan_id)
+        day_recipes = hybrid_service.generate_day_recipes(
+            preferences, plan_id, days, current_meals, include_lunch=include_lunch
+        )
         
-        if not meals:
-            return {
-                'total_meals': 0,
-                'avg_rating': 0,
-                'favorite_count': 0,
-                'cuisine_distribution': {},
-                'budget_estimate': 0
-            }
+        # Échange atomique : anciens repas du jour supprimés et nouveaux insérés ensemble
+        removed_ids = [m['id'] for m in current_meals if m['day_of_week'] in days]
+        meal_ids = meal_service.replace_meals(plan_id, removed_ids, day_recipes)
         
-        total_meals = len(meals)
-        ratings = [meal['rating'] for meal in meals if meal['rating'] > 0]
-        avg_rating = sum(ratings) / len(ratings) if ratings else 0
-        favorite_count = sum(1 for meal in meals if meal['is_favorite'])
+        for meal, meal_id in zip(day_recipes, meal_ids):
+            meal['id'] = meal_id
         
-        cuisine_dist = {}
-        for meal in meals:
-            cuisine = meal.get('cuisine_type', 'unknown')
-            cuisine_dist[cuisine] = cuisine_dist.get(cuisine, 0) + 1
+        return {
+            'success': True,
+            'plan_id': plan_id,
+            'days': days,
+            'removed_meal_ids': removed_ids,
+            'meals': day_recipes
+        }
+    
+    def replan(self, plan_id: int, preferences: UserPreferences,
+               banned_recipes: Optional[List[str]] = None,
+               locked_days: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Re-planifie un plan existant en ne recalculant que les créneaux impactés par le diff"""
+        from services.meal_service import MealService
+        from services.hybrid_recipe_service import HybridRecipeService
         
-        budget_estimate = self.calculate_budget_estimate(plan_id)
+        meal_service = MealService(self.db)
+        hybrid_service = HybridRecipeService(self.db)
+        
+        current_meals = self.db.get_plan_meals(plan_id)
+        changes = hybrid_service.replan_recipes(
+            preferences, plan_id, current_meals,
+            banned_recipes=set(banned_recipes or []),
+            locked_days=set(locked_days or [])
+        )
+        
+        # Diff minimal : recette remplacée en place (id conservé), suppression si aucune recette
+        updated = {c['meal']['id']: c['recipe'] for c in changes if c['recipe']}
+        removed = [c['meal']['id'] for c in changes if not c['recipe']]
+        if changes:
+            meal_service.apply_meal_changes(plan_id, updated, removed)
         
         return {
-            'total_meals': total_meals,
-            'avg_rating': round(avg_rating, 1),
-            'favorite_count': favorite_count,
-            'cuisine_distribution': cuisine_dist,
-            'budget_estimate': budget_estimate
+            'success': True,
+            'plan_id': plan_id,
+            'changed_slots': [{
+                'meal_id': c['meal']['id'],
+                'day_of_week': c['meal']['day_of_week'],
+                'meal_type': c['meal']['meal_type'],
+                'reason': c['reason'],
+                'previous_recipe': c['meal']['recipe_name'],
+                'recipe_name': c['recipe']['recipe_name'] if c['recipe'] else None
+            } for c in changes],
+            'removed_meal_ids': removed,
+            'unchanged_count': len(current_meals) - len(changes)
         }
+    
+    def calculate_budget_estimate(self, plan_id: int) -> float:
+        """Calcule une estimation du budget pour un plan"""
+        return self.analyzer.analyze(plan_id)['budget_estimate']
+    
+    def get_plan_statistics(self, plan_id: int) -> Dict[str, Any]:
+        """Récupère les statistiques d'un plan"""
+        return self.analyzer.analyze(plan_id)['statistics']
+    
+    def analyze_plans(self, plan_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Analyse (statistiques, budget, score qualité) de plusieurs plans en une requête"""
+        return self.analyzer.analyze_many(plan_ids)
@@ -0,0 +1,332 @@
+"""
+Solveur global de planification hebdomadaire (propagation + branch-and-bound)
+"""
+import time
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Set, Tuple, Union, Iterable
+import numpy as np
+from database import normalize_text
+from models import MealType
+from services.candidate_pool import CandidatePool
+from services.rule_engine import RuleSet
+
+DAYS_OF_WEEK = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+# Pénalité d'un créneau laissé vide (toujours supérieure au meilleur score d'une recette)
+UNASSIGNED_PENALTY = 1000.0
+
+# Amplitude du bruit ajouté aux scores des variantes (plans différents pour des préférences identiques)
+VARIANT_JITTER = 3.0
+
+@dataclass
+class PlanSlot:
+    day_of_week: str
+    meal_type: str = MealType.DINNER.value
+
+@dataclass
+class SolverResult:
+    assignments: List[Optional[Dict[str, Any]]]
+    score: float
+    optimal: bool
+    nodes: int
+    elapsed: float
+    slots: List[PlanSlot] = field(default_factory=list)
+
+class PlanSolver:
+    """Affecte les recettes à tous les créneaux de la semaine en une seule recherche.
+
+    Contraintes dures : pas de recette répétée dans le plan, pas de recette
+    utilisée récemment, au plus `ingredient_max[ingrédient]` repas par ingrédient
+    limité (règles ingredient_max_per_week), et pour les ingrédients de
+    `not_consecutive` ni deux repas le même jour ni deux jours de suite
+    (règles ingredient_not_consecutive). Les autres ingrédients ne sont que
+    pénalisés lorsqu'ils se répètent.
+    """
+
+    def __init__(self, ingredient_max: Optional[Dict[str, int]] = None,
+                 not_consecutive: Iterable[str] = (), time_budget: float = 0.5,
+                 max_candidates_per_slot: int = 40):
+        self.ingredient_max = {normalize_text(i): limit for i, limit in (ingredient_max or {}).items()}
+        self.not_consecutive = {normalize_text(i) for i in not_consecutive}
+        self.time_budget = time_budget
+        self.max_candidates_per_slot = max_candidates_per_slot
+
+        # Poids du score d'une recette
+        self.rating_weight = 2.0
+        self.favorite_bonus = 3.0
+        self.cameroon_bonus = 4.0
+        self.duplicate_ingredient_penalty = 2.0
+        self.lunch_time_weight = 0.02
+        self.affinity_weight = 3.0
+
+    @classmethod
+    def from_rules(cls, rules: RuleSet, **kwargs) -> 'PlanSolver':
+        """Solveur appliquant les règles d'ingrédients d'un jeu de règles"""
+        return cls(rules.ingredient_max, rules.not_consecutive_ingredients, **kwargs)
+
+    @property
+    def restricted_ingredients(self) -> Set[str]:
+        """Ingrédients soumis à au moins une contrainte dure"""
+        return set(self.ingredient_max) | self.not_consecutive
+
+    @staticmethod
+    def build_slots(include_lunch: bool = False) -> List[PlanSlot]:
+        """Construit les créneaux de la semaine (dîners, et déjeuners en option)"""
+        slots = []
+        for day in DAYS_OF_WEEK:
+            if include_lunch:
+                slots.append(PlanSlot(day, MealType.LUNCH.value))
+            slots.append(PlanSlot(day, MealType.DINNER.value))
+        return slots
+
+    def compile_pool(self, recipes: List[Dict[str, Any]]) -> CandidatePool:
+        """Compile une liste de recettes en pool vectorisé"""
+        return CandidatePool(recipes, self.restricted_ingredients)
+
+    def score_pool(self, pool: CandidatePool) -> np.ndarray:
+        """Score de chaque recette du pool indépendamment du créneau"""
+        return pool.scores(self.rating_weight, self.favorite_bonus, {'cameroun': self.cameroon_bonus},
+                           self.affinity_weight)
+
+    def _slot_adjustment(self, slot: PlanSlot, pool: CandidatePool, selected: np.ndarray) -> np.ndarray:
+        """Ajustement du score selon le créneau (déjeuners plus rapides)"""
+        if slot.meal_type == MealType.LUNCH.value:
+            return -pool.total_time[selected] * self.lunch_time_weight
+        return np.zeros(len(selected))
+
+    @staticmethod
+    def _spread_days(days: Set[int]) -> int:
+        """Nombre maximal de jours deux à deux non consécutifs parmi `days`"""
+        count, last = 0, None
+        for day in sorted(days):
+            if last is None or day > last + 1:
+                count += 1
+                last = day
+        return count
+
+    def ingredient_limits(self, pool: CandidatePool, days: Set[int],
+                          slot_count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Par ingrédient du pool : nombre maximal de repas et interdiction des jours consécutifs"""
+        caps = np.full(len(pool.ingredient_vocab), slot_count, dtype=np.int64)
+        consecutive = np.zeros(len(pool.ingredient_vocab), dtype=bool)
+        spread = self._spread_days(days)
+        for ingredient, ingredient_id in pool.ingredient_vocab.items():
+            if ingredient in self.ingredient_max:
+                caps[ingredient_id] = min(caps[ingredient_id], self.ingredient_max[ingredient])
+            if ingredient in self.not_consecutive:
+                consecutive[ingredient_id] = True
+                caps[ingredient_id] = min(caps[ingredient_id], spread)
+        return caps, consecutive
+
+    def _build_pool(self, pool: CandidatePool, used_recipes: Set[str], caps: np.ndarray,
+                    slot_count: int, variant: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Filtre (récence, doublons) puis garde les meilleures recettes en diversifiant les ingrédients"""
+        scores = self.score_pool(pool)
+        if variant:
+            # Bruit déterministe par recette : chaque variante favorise d'autres recettes
+            noise = np.random.default_rng(variant).uniform(0, VARIANT_JITTER, len(pool.name_vocab))
+            scores = scores + noise[pool.name_ids]
+        allowed = ~pool.recency_mask(used_recipes)
+        empty_name = pool.name_vocab.get('')
+        if empty_name is not None:
+            allowed &= pool.name_ids != empty_name
+
+        # Tri par score décroissant puis première occurrence de chaque nom
+        candidates = np.flatnonzero(allowed)
+        ranked = candidates[np.argsort(-scores[candidates], kind='stable')]
+        _, first = np.unique(pool.name_ids[ranked], return_index=True)
+        ranked = ranked[np.sort(first)]
+
+        # Inutile de garder plus de recettes d'un ingrédient que les règles n'en autorisent.
+        # Au-delà d'un créneau sur deux, les recettes d'un même ingrédient ne complètent le
+        # pool qu'en dernier (diversité sans jamais priver le plan de candidats valides)
+        diversity_cap = (slot_count + 1) // 2
+        per_ingredient: Dict[int, int] = {}
+        selected, overflow = [], []
+        for i in ranked:
+            ingredient = int(pool.ingredient_ids[i])
+            count = per_ingredient.get(ingredient, 0)
+            if ingredient != pool.empty_ingredient_id:
+                if count >= caps[ingredient]:
+                    continue
+                per_ingredient[ingredient] = count + 1
+                if count >= diversity_cap:
+                    overflow.append(i)
+                    continue
+            selected.append(i)
+            if len(selected) >= self.max_candidates_per_slot:
+                break
+        selected += overflow[:self.max_candidates_per_slot - len(selected)]
+        selected = np.array(selected, dtype=np.intp)
+        return selected, scores[selected]
+
+    def solve(self, recipes: Union[List[Dict[str, Any]], CandidatePool], slots: List[PlanSlot],
+              used_recipes: Optional[Set[str]] = None,
+              time_budget: Optional[float] = None,
+              fixed_meals: Optional[List[Dict[str, Any]]] = None,
+              variant: int = 0) -> SolverResult:
+        """Résout les créneaux donnés dans le budget de temps.
+
+        `fixed_meals` (repas déjà planifiés, avec day_of_week) restent en place
+        et contraignent les créneaux à résoudre comme s'ils avaient été choisis.
+        `variant` > 0 perturbe les scores de façon reproductible (plans en lot).
+        """
+        started = time.perf_counter()
+        budget = self.time_budget if time_budget is None else time_budget
+        deadline = started + budget
+        fixed_meals = fixed_meals or []
+        used_recipes = set(used_recipes or ()) | {m.get('recipe_name') or '' for m in fixed_meals}
+        pool = recipes if isinstance(recipes, CandidatePool) else self.compile_pool(recipes)
+
+        day_index = {day: i for i, day in enumerate(DAYS_OF_WEEK)}
+        slot_days = [day_index.get(s.day_of_week, 0) for s in slots]
+        fixed_days = {day_index.get(m.get('day_of_week'), 0) for m in fixed_meals}
+        caps, consecutive = self.ingredient_limits(pool, set(slot_days) | fixed_days,
+                                                   len(slots) + len(fixed_meals))
+        selected, base_scores = self._build_pool(pool, used_recipes, caps, len(slots), variant)
+
+        names = pool.name_ids[selected].tolist()
+        ingredients = [None if i == pool.empty_ingredient_id else i
+                       for i in pool.ingredient_ids[selected].tolist()]
+        candidate_caps = caps[pool.ingredient_ids[selected]].tolist()
+        candidate_consecutive = consecutive[pool.ingredient_ids[selected]].tolist()
+
+        # Matrice des scores (créneau x candidat), chaque ligne triée par score décroissant
+        matrix: List[List[Tuple[float, int]]] = []
+        for slot in slots:
+            row_scores = base_scores + self._slot_adjustment(slot, pool, selected)
+            order = np.argsort(-row_scores, kind='stable')
+            matrix.append(list(zip(row_scores[order].tolist(), order.tolist())))
+
+        used_names: Set[int] = set()
+        day_ingredients: List[Dict[int, int]] = [{} for _ in DAYS_OF_WEEK]
+        ingredient_count: Dict[int, int] = {}
+        assignment: List[Optional[int]] = [None] * len(slots)
+        unassigned = set(range(len(slots)))
+
+        # Les repas fixés occupent déjà leurs jours et ingrédients
+        for meal in fixed_meals:
+            ingredient = pool.ingredient_vocab.get(pool.normalize(meal.get('main_ingredient')))
+            if ingredient is None or ingredient == pool.empty_ingredient_id:
+                continue
+            day = day_ingredients[day_index.get(meal.get('day_of_week'), 0)]
+            day[ingredient] = day.get(ingredient, 0) + 1
+            ingredient_count[ingredient] = ingredient_count.get(ingredient, 0) + 1
+
+        best = {'score': float('-inf'), 'assignment': list(assignment)}
+        stats = {'nodes': 0, 'timed_out': False}
+
+        def is_valid(s: int, c: int) -> bool:
+            if names[c] in used_names:
+                return False
+            ingredient = ingredients[c]
+            if ingredient is None:
+                return True
+            if ingredient_count.get(ingredient, 0) >= candidate_caps[c]:
+                return False
+            if candidate_consecutive[c]:
+                day = slot_days[s]
+                for d in (day - 1, day, day + 1):
+                    if 0 <= d < len(day_ingredients) and day_ingredients[d].get(ingredient):
+                        return False
+            return True
+
+        def gain(s: int, score: float, c: int) -> float:
+            ingredient = ingredients[c]
+            if ingredient is not None and ingredient_count.get(ingredient):
+                return score - self.duplicate_ingredient_penalty
+            return score
+
+        def place(s: int, c: int):
+            assignment[s] = c
+            unassigned.discard(s)
+            used_names.add(names[c])
+            ingredient = ingredients[c]
+            if ingredient is not None:
+                day = day_ingredients[slot_days[s]]
+                day[ingredient] = day.get(ingredient, 0) + 1
+                ingredient_count[ingredient] = ingredient_count.get(ingredient, 0) + 1
+
+        def unplace(s: int, c: int):
+            assignment[s] = None
+            unassigned.add(s)
+            used_names.discard(names[c])
+            ingredient = ingredients[c]
+            if ingredient is not None:
+                day_ingredients[slot_days[s]][ingredient] -= 1
+                ingredient_count[ingredient] -= 1
+
+        def distinct_bound(candidate_best: Dict[int, float], remaining: int) -> float:
+            """Borne supérieure : chaque créneau libre reçoit une recette distincte,
+            un ingrédient déjà présent coûte la pénalité et ne dépasse jamais sa limite"""
+            values = []
+            seen: Dict[int, int] = {}
+            for c, score in sorted(candidate_best.items(), key=lambda x: x[1], reverse=True):
+                ingredient = ingredients[c]
+                if ingredient is None:
+                    values.append(score)
+                    continue
+                used = ingredient_count.get(ingredient, 0) + seen.get(ingredient, 0)
+                if used >= candidate_caps[c]:
+                    continue
+                seen[ingredient] = seen.get(ingredient, 0) + 1
+                values.append(score - self.duplicate_ingredient_penalty if used else score)
+            values.sort(reverse=True)
+            values = values[:remaining]
+            return sum(values) - UNASSIGNED_PENALTY * (remaining - len(values))
+
+        def search(current: float):
+            stats['nodes'] += 1
+            # La première descente (gloutonne) va toujours au bout
+            if best['score'] > float('-inf') and time.perf_counter() > deadline:
+                stats['timed_out'] = True
+                return
+
+            if not unassigned:
+                if current > best['score']:
+                    best['score'] = current
+                    best['assignment'] = list(assignment)
+                return
+
+            # Propagation : domaines encore valides de chaque créneau libre
+            slot_bound = current
+            candidate_best: Dict[int, float] = {}
+            chosen, chosen_domain = None, None
+            for s in unassigned:
+                domain = [(score, c) for score, c in matrix[s] if is_valid(s, c)]
+                slot_bound += domain[0][0] if domain else -UNASSIGNED_PENALTY
+                for score, c in domain:
+                    if score > candidate_best.get(c, float('-inf')):
+                        candidate_best[c] = score
+                if chosen_domain is None or len(domain) < len(chosen_domain):
+                    chosen, chosen_domain = s, domain
+
+            bound = min(slot_bound, current + distinct_bound(candidate_best, len(unassigned)))
+            if bound <= best['score']:
+                return
+
+            if not chosen_domain:
+                unassigned.discard(chosen)
+                search(current - UNASSIGNED_PENALTY)
+                unassigned.add(chosen)
+                return
+
+            for score, c in chosen_domain:
+                value = gain(chosen, score, c)
+                place(chosen, c)
+                search(current + value)
+                unplace(chosen, c)
+                if stats['timed_out']:
+                    return
+
+        search(0.0)
+
+        assignments = [pool.recipes[selected[c]] if c is not None else None for c in best['assignment']]
+        return SolverResult(
+            assignments=assignments,
+            score=best['score'],
+            optimal=not stats['timed_out'],
+            nodes=stats['nodes'],
+            elapsed=time.perf_counter() - started,
+            slots=list(slots)
+        )
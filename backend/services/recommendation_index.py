@@ -0,0 +1,323 @@
+"""
+Index de recommandation item-item (co-occurrence pondérée par les notes et favoris)
+"""
+import os
+import json
+import time
+import threading
+import uuid
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+import numpy as np
+from database import DatabaseManager, RATING_PRIOR_MEAN
+
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                 'data', 'recommendations')
+INDEX_DIR = os.getenv('RECOMMENDATION_INDEX_DIR', DEFAULT_INDEX_DIR)
+
+# Voisins conservés par recette
+DEFAULT_TOP_K = 20
+
+# Poids d'un repas dans son plan : note de l'utilisateur (1-5) puis bonus favori ;
+# un repas non noté compte pour la note moyenne a priori
+RATING_SCALE = 3.0
+FAVORITE_WEIGHT = 1.0
+
+def meal_weight(rating: Optional[int], is_favorite: bool) -> float:
+    return (rating or RATING_PRIOR_MEAN) / RATING_SCALE + (FAVORITE_WEIGHT if is_favorite else 0.0)
+
+def _pair_keys(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    return (rows.astype(np.int64) << 32) | cols.astype(np.int64)
+
+def _merge(keys: np.ndarray, values: np.ndarray,
+           new_keys: np.ndarray, new_values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Additionne deux listes creuses (clé de paire -> valeur)"""
+    all_keys = np.concatenate([keys, new_keys])
+    unique, inverse = np.unique(all_keys, return_inverse=True)
+    summed = np.bincount(inverse, weights=np.concatenate([values, new_values]), minlength=len(unique))
+    return unique, summed
+
+def basket_pairs(baskets: np.ndarray, items: np.ndarray,
+                 weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Paires (i, j) co-occurrentes de chaque panier, valeur w_i * w_j (entrées triées par panier)"""
+    if not len(items):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    starts = np.flatnonzero(np.r_[True, baskets[1:] != baskets[:-1]])
+    sizes = np.diff(np.r_[starts, len(items)])
+    basket_of = np.repeat(np.arange(len(starts)), sizes)
+
+    # Chaque repas est apparié à tous les repas de son panier
+    group = sizes[basket_of]
+    left = np.repeat(np.arange(len(items)), group)
+    block_start = np.repeat(np.cumsum(group) - group, group)
+    right = np.repeat(starts[basket_of], group) + (np.arange(group.sum()) - block_start)
+
+    keep = items[left] != items[right]
+    left, right = left[keep], right[keep]
+    return _pair_keys(items[left], items[right]), weights[left] * weights[right]
+
+class RecommendationIndexBuilder:
+    """Construit l'index hors ligne ; les reconstructions suivantes ne traitent que les nouveaux plans"""
+
+    def __init__(self, db_manager: DatabaseManager, index_dir: str = INDEX_DIR,
+                 top_k: int = DEFAULT_TOP_K):
+        self.db = db_manager
+        self.index_dir = index_dir
+        self.top_k = top_k
+
+    def _state_path(self) -> str:
+        return os.path.join(self.index_dir, 'state.npz')
+
+    def _load_state(self) -> Optional[Dict[str, Any]]:
+        try:
+            with np.load(self._state_path(), allow_pickle=False) as data:
+                return {
+                    'items': json.loads(str(data['items'])),
+                    'keys': data['keys'],
+                    'values': data['values'],
+                    'diag': data['diag'],
+                    'last_plan_id': int(data['last_plan_id']),
+                    'fingerprint': str(data['fingerprint'])
+                }
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _fingerprint(self, cursor, last_plan_id: int) -> str:
+        """Empreinte des plans déjà intégrés (change si une note, un favori, un repas ou un plan change).
+
+        weekly_plans.content_version est incrémenté par trigger à chaque écriture sur les repas
+        du plan : un remplacement de recette sur place change donc l'empreinte.
+        """
+        cursor.execute("""
+            SELECT COUNT(*), TOTAL(rating), TOTAL(is_favorite), COUNT(DISTINCT plan_id)
+            FROM meal_slots
+            WHERE plan_id IS NOT NULL AND plan_id <= ?
+        """, (last_plan_id,))
+        meals = cursor.fetchone()
+        cursor.execute("""
+            SELECT COUNT(*), TOTAL(content_version)
+            FROM weekly_plans
+            WHERE id <= ?
+        """, (last_plan_id,))
+        return ':'.join(str(value) for value in (*meals, *cursor.fetchone()))
+
+    def build(self, full: bool = False) -> Dict[str, Any]:
+        """Reconstruit l'index (incrémental si les plans déjà intégrés n'ont pas changé)"""
+        started = time.perf_counter()
+        state = None if full else self._load_state()
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            if state and self._fingerprint(cursor, state['last_plan_id']) != state['fingerprint']:
+                state = None
+            incremental = state is not None
+            if not state:
+                state = {'items': [], 'keys': np.zeros(0, dtype=np.int64), 'values': np.zeros(0),
+                         'diag': np.zeros(0), 'last_plan_id': 0}
+
+            cursor.execute("""
+                SELECT plan_id, recipe_name, rating, is_favorite
+                FROM meal_slots
+                WHERE plan_id > ?
+                ORDER BY plan_id
+            """, (state['last_plan_id'],))
+            rows = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT recipe_name FROM favorites
+                UNION
+                SELECT DISTINCT recipe_name FROM meal_slots WHERE is_favorite = 1
+            """)
+            favorites = [row[0] for row in cursor.fetchall()]
+
+            last_plan_id = max([state['last_plan_id']] + [row[0] for row in rows])
+            fingerprint = self._fingerprint(cursor, last_plan_id)
+
+        vocab = {name: i for i, name in enumerate(state['items'])}
+        for name in [row[1] for row in rows] + favorites:
+            if name not in vocab:
+                vocab[name] = len(vocab)
+        items = list(vocab)
+
+        # Contribution des nouveaux plans (accumulée d'une reconstruction à l'autre)
+        plan_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        item_ids = np.array([vocab[row[1]] for row in rows], dtype=np.int64)
+        weights = np.array([meal_weight(row[2], row[3]) for row in rows], dtype=np.float64)
+        new_keys, new_values = basket_pairs(plan_ids, item_ids, weights)
+        keys, values = _merge(state['keys'], state['values'], new_keys, new_values)
+        diag = np.zeros(len(items))
+        diag[:len(state['diag'])] = state['diag']
+        diag += np.bincount(item_ids, weights=weights ** 2, minlength=len(items))
+
+        self._save_state(items, keys, values, diag, last_plan_id, fingerprint)
+
+        # Les favoris forment un panier supplémentaire, recalculé à chaque fois
+        fav_ids = np.array(sorted({vocab[name] for name in favorites}), dtype=np.int64)
+        fav_keys, fav_values = basket_pairs(np.zeros(len(fav_ids), dtype=np.int64), fav_ids,
+                                            np.full(len(fav_ids), FAVORITE_WEIGHT))
+        all_keys, all_values = _merge(keys, values, fav_keys, fav_values)
+        all_diag = diag.copy()
+        all_diag[fav_ids] += FAVORITE_WEIGHT ** 2
+
+        neighbors, scores = self._top_k(all_keys, all_values, all_diag, len(items))
+        self._write_index(items, neighbors, scores)
+
+        return {
+            'items': len(items),
+            'pairs': int(len(all_keys)),
+            'new_meals': len(rows),
+            'incremental': incremental,
+            'elapsed': round(time.perf_counter() - started, 3)
+        }
+
+    def _top_k(self, keys: np.ndarray, values: np.ndarray, diag: np.ndarray,
+               n_items: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Similarité cosinus puis k meilleurs voisins de chaque recette"""
+        neighbors = np.full((n_items, self.top_k), -1, dtype=np.int32)
+        scores = np.zeros((n_items, self.top_k), dtype=np.float32)
+        if not len(keys):
+            return neighbors, scores
+
+        rows = (keys >> 32).astype(np.int64)
+        cols = (keys & 0xFFFFFFFF).astype(np.int64)
+        norms = np.sqrt(diag)
+        sims = values / np.maximum(norms[rows] * norms[cols], 1e-12)
+
+        order = np.lexsort((-sims, rows))
+        rows, cols, sims = rows[order], cols[order], sims[order]
+        row_start = np.searchsorted(rows, rows, side='left')
+        rank = np.arange(len(rows)) - row_start
+        keep = rank < self.top_k
+        neighbors[rows[keep], rank[keep]] = cols[keep]
+        scores[rows[keep], rank[keep]] = sims[keep]
+        return neighbors, scores
+
+    def _save_state(self, items, keys, values, diag, last_plan_id, fingerprint):
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_path = self._state_path() + '.tmp.npz'
+        np.savez(tmp_path, items=np.array(json.dumps(items, ensure_ascii=False)), keys=keys,
+                 values=values, diag=diag, last_plan_id=np.array(last_plan_id),
+                 fingerprint=np.array(fingerprint))
+        os.replace(tmp_path, self._state_path())
+
+    def _write_index(self, items: List[str], neighbors: np.ndarray, scores: np.ndarray):
+        """Écrit les fichiers versionnés puis bascule le manifeste de façon atomique"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        version = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}"
+        np.save(os.path.join(self.index_dir, f'neighbors-{version}.npy'), neighbors)
+        np.save(os.path.join(self.index_dir, f'scores-{version}.npy'), scores)
+
+        manifest_path = os.path.join(self.index_dir, 'manifest.json')
+        previous = None
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                previous = json.load(f).get('version')
+
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'top_k': self.top_k, 'items': items}, f, ensure_ascii=False)
+        os.replace(tmp_path, manifest_path)
+
+        # Les workers ayant encore l'ancienne version en mémoire gardent leur mapping ouvert
+        if previous:
+            for prefix in ('neighbors', 'scores'):
+                try:
+                    os.remove(os.path.join(self.index_dir, f'{prefix}-{previous}.npy'))
+                except OSError:
+                    pass
+
+class RecommendationIndex:
+    """Lecture de l'index (tableaux mappés en mémoire), rechargé quand le manifeste change"""
+
+    def __init__(self, index_dir: str = INDEX_DIR, check_interval: float = 30.0):
+        self.index_dir = index_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+        self._items: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._neighbors: Optional[np.ndarray] = None
+        self._scores: Optional[np.ndarray] = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._neighbors is not None and now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            self._last_check = now
+            manifest_path = os.path.join(self.index_dir, 'manifest.json')
+            try:
+                mtime = os.stat(manifest_path).st_mtime
+                if mtime == self._mtime:
+                    return
+                with open(manifest_path, encoding='utf-8') as f:
+                    manifest = json.load(f)
+                version = manifest['version']
+                neighbors = np.load(os.path.join(self.index_dir, f'neighbors-{version}.npy'), mmap_mode='r')
+                scores = np.load(os.path.join(self.index_dir, f'scores-{version}.npy'), mmap_mode='r')
+            except (OSError, ValueError, KeyError):
+                # Pas encore d'index (ou écriture en cours) : on garde l'état actuel
+                return
+            self._items = manifest['items']
+            self._rows = {name: i for i, name in enumerate(self._items)}
+            self._neighbors, self._scores = neighbors, scores
+            self._mtime = mtime
+
+    @property
+    def available(self) -> bool:
+        self._refresh()
+        return self._neighbors is not None
+
+    def neighbors(self, recipe_name: str, k: int = 10) -> List[Tuple[str, float]]:
+        """k recettes les plus proches (lecture directe d'une ligne de l'index)"""
+        self._refresh()
+        row = self._rows.get(recipe_name)
+        if row is None or self._neighbors is None:
+            return []
+        result = []
+        for neighbor, score in zip(self._neighbors[row, :k].tolist(), self._scores[row, :k].tolist()):
+            if neighbor < 0:
+                break
+            result.append((self._items[neighbor], score))
+        return result
+
+    def affinities(self, seed_recipes: Iterable[str], k: Optional[int] = None) -> Dict[str, float]:
+        """Affinité de chaque recette avec un ensemble de recettes appréciées (somme des similarités)"""
+        self._refresh()
+        if self._neighbors is None:
+            return {}
+        affinity: Dict[str, float] = {}
+        for seed in seed_recipes:
+            for name, score in self.neighbors(seed, k or self._neighbors.shape[1]):
+                affinity[name] = affinity.get(name, 0.0) + score
+        return affinity
+
+class IndexRebuilder:
+    """Thread de fond reconstruisant l'index périodiquement (un seul worker à la fois via un bail)"""
+
+    LEASE_NAME = 'recommendation_index'
+
+    def __init__(self, db_manager: DatabaseManager, interval: float = 3600.0,
+                 index_dir: str = INDEX_DIR):
+        self.db = db_manager
+        self.builder = RecommendationIndexBuilder(db_manager, index_dir)
+        self.interval = interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._stop = threading.Event()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if self.db.acquire_lease(self.LEASE_NAME, self.owner, self.interval):
+                    self.builder.build()
+            except Exception as e:
+                print(f"Erreur reconstruction index de recommandation: {e}")
+
+    def start(self):
+        threading.Thread(target=self._loop, name='recommendation-rebuilder', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+# Instance globale (une par worker)
+recommendation_index = RecommendationIndex(INDEX_DIR)
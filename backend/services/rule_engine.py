@@ -0,0 +1,231 @@
+"""
+Règles de planification déclaratives (JSON/YAML) compilées en SQL et en masques vectorisés
+"""
+import os
+import json
+import time
+import threading
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List, Dict, Any, Optional, Set, Tuple, Iterable
+import numpy as np
+from database import normalize_text
+from services.candidate_pool import CandidatePool
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  'rules', 'planning_rules.json')
+
+RULE_TYPES = {'recent_repeat', 'ingredient_max_per_week', 'ingredient_not_consecutive'}
+
+@dataclass
+class Rule:
+    id: str
+    type: str
+    ingredients: Set[str] = field(default_factory=set)
+    weeks: int = 0
+    max: int = 1
+
+@dataclass
+class RuleSet:
+    version: int
+    rules: List[Rule]
+    source: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], source: Optional[str] = None) -> 'RuleSet':
+        """Construit et valide un jeu de règles à partir de sa forme déclarative"""
+        if 'version' not in data:
+            raise ValueError("Jeu de règles invalide : 'version' manquant")
+
+        ingredient_sets = {
+            name: {normalize_text(i) for i in values}
+            for name, values in data.get('ingredient_sets', {}).items()
+        }
+
+        rules = []
+        for raw in data.get('rules', []):
+            rule_type = raw.get('type')
+            if rule_type not in RULE_TYPES:
+                raise ValueError(f"Type de règle inconnu: {rule_type}")
+
+            ingredients = {normalize_text(i) for i in raw.get('ingredients', [])}
+            set_name = raw.get('ingredient_set')
+            if set_name:
+                if set_name not in ingredient_sets:
+                    raise ValueError(f"Ensemble d'ingrédients inconnu: {set_name}")
+                ingredients |= ingredient_sets[set_name]
+
+            rules.append(Rule(
+                id=raw.get('id', rule_type),
+                type=rule_type,
+                ingredients=ingredients,
+                weeks=int(raw.get('weeks', 0)),
+                max=int(raw.get('max', 1))
+            ))
+
+        return cls(version=int(data['version']), rules=rules, source=source)
+
+    @classmethod
+    def load(cls, path: str) -> 'RuleSet':
+        """Charge un jeu de règles depuis un fichier JSON ou YAML"""
+        with open(path, encoding='utf-8') as f:
+            if path.endswith(('.yaml', '.yml')):
+                import yaml
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+        return cls.from_dict(data, source=path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'source': self.source,
+            'rules': [{
+                'id': rule.id,
+                'type': rule.type,
+                'ingredients': sorted(rule.ingredients),
+                'weeks': rule.weeks,
+                'max': rule.max
+            } for rule in self.rules]
+        }
+
+    def _of_type(self, rule_type: str) -> List[Rule]:
+        return [rule for rule in self.rules if rule.type == rule_type]
+
+    @property
+    def restricted_ingredients(self) -> Set[str]:
+        """Ingrédients soumis à une règle de fréquence ou de consécutivité"""
+        restricted = set()
+        for rule in self._of_type('ingredient_max_per_week') + self._of_type('ingredient_not_consecutive'):
+            restricted |= rule.ingredients
+        return restricted
+
+    @property
+    def ingredient_max(self) -> Dict[str, int]:
+        """Nombre maximal de repas par semaine de chaque ingrédient limité (règle la plus stricte)"""
+        limits: Dict[str, int] = {}
+        for rule in self._of_type('ingredient_max_per_week'):
+            for ingredient in rule.ingredients:
+                limits[ingredient] = min(rule.max, limits.get(ingredient, rule.max))
+        return limits
+
+    @property
+    def not_consecutive_ingredients(self) -> Set[str]:
+        """Ingrédients qui ne peuvent pas revenir le même jour ni le lendemain"""
+        ingredients = set()
+        for rule in self._of_type('ingredient_not_consecutive'):
+            ingredients |= rule.ingredients
+        return ingredients
+
+    @property
+    def recent_weeks(self) -> int:
+        """Fenêtre de non-répétition des recettes (0 si aucune règle)"""
+        return max((rule.weeks for rule in self._of_type('recent_repeat')), default=0)
+
+    def blocked_ingredients(self, current_plan_ingredients: Optional[Dict[str, int]] = None,
+                            previous_ingredient: Optional[str] = None) -> Set[str]:
+        """Ingrédients exclus compte tenu du plan en cours (commun aux deux compilations)"""
+        counts: Dict[str, int] = {}
+        for ingredient, count in (current_plan_ingredients or {}).items():
+            key = normalize_text(ingredient)
+            counts[key] = counts.get(key, 0) + (count or 0)
+
+        blocked = set()
+        for rule in self._of_type('ingredient_max_per_week'):
+            blocked |= {i for i in rule.ingredients if counts.get(i, 0) >= rule.max}
+
+        previous = normalize_text(previous_ingredient)
+        for rule in self._of_type('ingredient_not_consecutive'):
+            if previous in rule.ingredients:
+                blocked.add(previous)
+
+        return blocked
+
+    def compile_sql(self, current_plan_ingredients: Optional[Dict[str, int]] = None,
+                    previous_ingredient: Optional[str] = None,
+                    reference_date: Optional[date] = None,
+                    alias: str = 'c') -> Tuple[str, List[Any]]:
+        """Compile les règles en clause WHERE paramétrée sur la table des recettes `alias`"""
+        reference_date = reference_date or date.today()
+        clauses, params = [], []
+
+        # Non-répétition : anti-jointure sur l'historique (index recipe_name, used_date)
+        for rule in self._of_type('recent_repeat'):
+            clauses.append(f"""NOT EXISTS (
+                SELECT 1 FROM recipe_history h
+                WHERE h.recipe_name = {alias}.recipe_name AND h.used_date >= ?
+            )""")
+            params.append((reference_date - timedelta(weeks=rule.weeks)).isoformat())
+
+        blocked = self.blocked_ingredients(current_plan_ingredients, previous_ingredient)
+        if blocked:
+            placeholders = ', '.join('?' for _ in blocked)
+            clauses.append(f"normalize_text({alias}.main_ingredient) NOT IN ({placeholders})")
+            params.extend(sorted(blocked))
+
+        return ' AND '.join(clauses), params
+
+    def compile_mask(self, pool: CandidatePool, used_recipes: Iterable[str],
+                     current_plan_ingredients: Optional[Dict[str, int]] = None,
+                     previous_ingredient: Optional[str] = None,
+                     recent: Optional[np.ndarray] = None) -> np.ndarray:
+        """Évalue les règles sur un pool en mémoire (True = recette autorisée).
+
+        `recent` permet de réutiliser un masque de récence déjà calculé
+        (il ne change pas d'un jour à l'autre d'une même génération).
+        """
+        mask = np.ones(len(pool), dtype=bool)
+        if self.recent_weeks:
+            mask &= ~(pool.recency_mask(used_recipes) if recent is None else recent)
+
+        blocked = self.blocked_ingredients(current_plan_ingredients, previous_ingredient)
+        if blocked:
+            mask &= ~pool.ingredient_mask(blocked)
+
+        return mask
+
+class RuleRegistry:
+    """Jeu de règles courant, rechargé à chaud quand le fichier change"""
+
+    def __init__(self, path: str, check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._ruleset: Optional[RuleSet] = None
+        self._mtime: Optional[float] = None
+        self._last_check = 0.0
+
+    def get(self) -> RuleSet:
+        """Retourne le jeu de règles, en vérifiant au plus toutes les `check_interval` secondes le fichier"""
+        now = time.monotonic()
+        if self._ruleset is None or now - self._last_check >= self.check_interval:
+            with self._lock:
+                self._last_check = now
+                try:
+                    mtime = os.stat(self.path).st_mtime
+                except OSError as e:
+                    if self._ruleset is None:
+                        raise
+                    print(f"Erreur accès règles {self.path}: {e}")
+                    return self._ruleset
+                if mtime != self._mtime:
+                    self._reload(mtime)
+        return self._ruleset
+
+    def _reload(self, mtime: float):
+        try:
+            ruleset = RuleSet.load(self.path)
+        except Exception as e:
+            # Garder le jeu précédent si le nouveau fichier est invalide
+            if self._ruleset is None:
+                raise
+            print(f"Erreur rechargement règles {self.path}: {e}")
+            self._mtime = mtime
+            return
+        if self._ruleset is not None and ruleset.version != self._ruleset.version:
+            print(f"Règles de planification rechargées: v{self._ruleset.version} -> v{ruleset.version}")
+        self._ruleset = ruleset
+        self._mtime = mtime
+
+# Instance globale (une par worker)
+rule_registry = RuleRegistry(os.getenv('PLANNING_RULES_PATH', DEFAULT_RULES_PATH))
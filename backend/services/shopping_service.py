@@ -0,0 +1,127 @@
+"""
+Service de listes de courses (quantités agrégées par ingrédient)
+"""
+import json
+from datetime import date
+from typing import List, Dict, Any, Optional, Tuple
+from database import DatabaseManager
+from ingredient_units import display_quantity
+from metrics import record_cache
+
+# Nombre de portions par repas si le foyer ne le précise pas
+DEFAULT_SERVINGS = 4
+
+LIST_NAME = 'Liste de courses'
+
+class ShoppingListService:
+    def __init__(self, db_manager: DatabaseManager):
+        self.db = db_manager
+
+    @staticmethod
+    def make_etag(plan_id: int, versions: tuple, servings: int) -> str:
+        return f"plan-{plan_id}-{versions[0]}-{versions[1]}-{servings}"
+
+    def get_plan_etag(self, plan_id: int, servings: int = DEFAULT_SERVINGS) -> Optional[str]:
+        """ETag de la liste d'un plan, sans la construire (None si le plan n'existe pas)"""
+        versions = self.db.get_plan_versions(plan_id)
+        return self.make_etag(plan_id, versions, servings) if versions else None
+
+    def get_plan_list(self, plan_id: int, servings: int = DEFAULT_SERVINGS) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Liste de courses d'un plan pour `servings` portions par repas, et son ETag.
+        
+        La liste est enregistrée dans shopping_lists (quantités par portion) et réutilisée
+        tant que le plan n'a pas changé. Retourne None si le plan n'existe pas.
+        """
+        stored = self._get_stored_rows(plan_id)
+        if stored is None:
+            return None
+        rows, versions = stored
+        scaled = [dict(row, quantity=row['quantity'] * servings if row['quantity'] is not None else None)
+                  for row in rows]
+        shopping_list = {'plan_id': plan_id, 'servings': servings, 'items': self._format_items(scaled)}
+        return shopping_list, self.make_etag(plan_id, versions, servings)
+
+    def _get_stored_rows(self, plan_id: int) -> Optional[Tuple[List[Dict[str, Any]], tuple]]:
+        """Lignes par portion de la liste enregistrée, mise à jour si les repas du plan ont changé"""
+        versions = self.db.get_plan_versions(plan_id)
+        if versions is None:
+            return None
+        stored = self.db.get_shopping_list(plan_id)
+        if stored and (stored['content_version'], stored['ingredients_version']) == versions:
+            record_cache('shopping_list', True)
+            return json.loads(stored['ingredients']), versions
+        record_cache('shopping_list', False)
+
+        state = self.db.get_plan_shopping_state(plan_id)
+        if state is None:
+            return None
+        versions = (state['content_version'], state['ingredients_version'])
+        new_meals = state['meals']
+        rows, old_meals = [], {}
+        if stored and stored['meals']:
+            rows, old_meals = json.loads(stored['ingredients']), json.loads(stored['meals'])
+            # Ingrédients d'une recette réécrits depuis : sa contribution passée est perdue
+            if any(meal_id in new_meals and new_meals[meal_id][:2] == meal[:2] and new_meals[meal_id][2] != meal[2]
+                   for meal_id, meal in old_meals.items()):
+                rows, old_meals = [], {}
+
+        # Seuls les repas ajoutés, retirés ou modifiés sont agrégés
+        changes = [(meal[0], meal[1], -1) for meal_id, meal in old_meals.items()
+                   if new_meals.get(meal_id) != meal]
+        changes += [(meal[0], meal[1], 1) for meal_id, meal in new_meals.items()
+                    if old_meals.get(meal_id) != meal]
+        rows = self._merge_rows(rows, self.db.aggregate_meal_ingredients(changes))
+        self.db.save_shopping_list(plan_id, LIST_NAME, json.dumps(rows, ensure_ascii=False),
+                                   json.dumps(new_meals), *versions)
+        return rows, versions
+
+    @staticmethod
+    def _merge_rows(rows: List[Dict[str, Any]], delta: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Applique une différence (repas ajoutés et retirés) aux lignes d'une liste"""
+        merged = {(row['name'], row['unit']): dict(row) for row in rows}
+        for row in delta:
+            key = (row['name'], row['unit'])
+            if key not in merged:
+                merged[key] = dict(row)
+                continue
+            current = merged[key]
+            current['meal_count'] += row['meal_count']
+            if row['quantity'] is not None:
+                current['quantity'] = (current['quantity'] or 0) + row['quantity']
+        return sorted((row for row in merged.values() if row['meal_count'] > 0),
+                      key=lambda row: row['name'])
+
+    def get_range_list(self, start_date: date, end_date: date,
+                       servings: int = DEFAULT_SERVINGS) -> Dict[str, Any]:
+        """Liste de courses de tous les repas planifiés entre deux dates (incluses)"""
+        items = self.db.get_shopping_items(servings, start_date=start_date, end_date=end_date)
+        return {
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+            'servings': servings,
+            'items': self._format_items(items)
+        }
+
+    def _format_items(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Un ingrédient principal sans quantité est inutile s'il figure déjà avec une quantité
+        quantified = {row['name'] for row in rows if row['unit'] is not None}
+        items = []
+        for row in rows:
+            if row['unit'] is None and row['name'] in quantified:
+                continue
+            quantity, unit = display_quantity(row['quantity'], row['unit'] or '')
+            items.append({
+                'ingredient': row['display_name'],
+                'quantity': quantity,
+                'unit': unit or None,
+                'meal_count': row['meal_count'],
+                'label': self._label(row['display_name'], quantity, unit)
+            })
+        return items
+
+    @staticmethod
+    def _label(name: str, quantity: Optional[float], unit: str) -> str:
+        if quantity is None:
+            return name
+        amount = f"{quantity:g}"
+        return f"{name} : {amount} {unit}" if unit and unit != 'pièce' else f"{name} : {amount}"
@@ -0,0 +1,37 @@
+"""
+Configuration pytest : modules du backend importables et base SQLite temporaire
+"""
+import os
+import sys
+from datetime import date, timedelta
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager, DAYS_OF_WEEK
+from models import Meal, MealType, WeeklyPlan, CuisineType
+
+@pytest.fixture
+def db(tmp_path):
+    """Base neuve, migrée à SCHEMA_VERSION"""
+    return DatabaseManager(str(tmp_path / 'test.db'))
+
+def insert_catalog(db, recipes):
+    """Recettes du catalogue (plan_id NULL) : tuples (nom, ingrédient principal)"""
+    with db.get_connection() as conn:
+        conn.executemany("""
+            INSERT INTO meal_slots (plan_id, day_of_week, meal_type, recipe_name, main_ingredient, cuisine_type)
+            VALUES (NULL, 'Lundi', 'Dîner', ?, ?, 'cameroun')
+        """, recipes)
+        conn.commit()
+
+def this_monday() -> date:
+    return date.today() - timedelta(days=date.today().weekday())
+
+def create_plan(db, recipes, week_start_date=None, plan_name='Plan test'):
+    """Plan et ses repas (un dîner par jour, dans l'ordre) : tuples (nom, ingrédient principal)"""
+    plan = WeeklyPlan(id=None, plan_name=plan_name, week_start_date=week_start_date or this_monday())
+    meals = [Meal(id=None, day_of_week=DAYS_OF_WEEK[i % 7], meal_type=MealType.DINNER, recipe_name=name,
+                  main_ingredient=ingredient, cuisine_type=CuisineType.CAMEROUN)
+             for i, (name, ingredient) in enumerate(recipes)]
+    return db.create_plan_with_meals(plan, meals)
@@ -0,0 +1,31 @@
+"""
+Tests du cache des analyses IA (borné, avec expiration)
+"""
+import pytest
+from services import ai_service
+from services.ai_service import AIService
+
+@pytest.fixture
+def small_cache(monkeypatch):
+    monkeypatch.setattr(ai_service, 'ANALYSIS_CACHE_MAX_ENTRIES', 3)
+    ai_service._analysis_cache.clear()
+    yield ai_service._analysis_cache
+    ai_service._analysis_cache.clear()
+
+def test_cache_is_bounded_and_evicts_least_recently_used(small_cache):
+    for i in range(3):
+        AIService._set_cached(f"nutrition:{i}", i)
+    assert AIService._get_cached("nutrition:0") == 0
+    AIService._set_cached("nutrition:3", 3)
+    assert len(small_cache) == 3
+    assert AIService._get_cached("nutrition:1") is None
+    assert [AIService._get_cached(f"nutrition:{i}") for i in (0, 2, 3)] == [0, 2, 3]
+
+def test_expired_entries_are_evicted_first(small_cache, monkeypatch):
+    monkeypatch.setattr(ai_service, 'ANALYSIS_CACHE_TTL', -1)
+    AIService._set_cached("shopping:expired", 'old')
+    monkeypatch.setattr(ai_service, 'ANALYSIS_CACHE_TTL', 3600)
+    for i in range(3):
+        AIService._set_cached(f"shopping:{i}", i)
+    assert "shopping:expired" not in small_cache
+    assert [AIService._get_cached(f"shopping:{i}") for i in range(3)] == [0, 1, 2]
@@ -0,0 +1,33 @@
+"""
+Tests de la génération en lot : variantes des foyers aux préférences identiques
+"""
+from models import UserPreferences, CuisineType, BudgetLevel
+from services.batch_planner import HouseholdRequest, household_tasks, solve_batch
+from services.rule_engine import RuleSet
+
+RULES = RuleSet.from_dict({'version': 1, 'rules': [
+    {'type': 'ingredient_max_per_week', 'ingredients': ['riz'], 'max': 1}
+]})
+
+def household(name, vegetarian=False, include_lunch=False):
+    preferences = UserPreferences(cuisines=[CuisineType.CAMEROUN], budget=BudgetLevel.MODERATE,
+                                  vegetarian=vegetarian)
+    return HouseholdRequest(name, preferences, include_lunch)
+
+def test_identical_households_get_successive_variants():
+    tasks = household_tasks([household('A'), household('B'), household('C', vegetarian=True),
+                              household('D'), household('E', include_lunch=True)])
+    assert [task[3] for task in tasks] == [0, 1, 0, 2, 0]
+
+def test_identical_households_get_different_plans():
+    catalog = [{'recipe_name': f"Recette {i}", 'main_ingredient': f"ingrédient {i % 10}",
+                'cuisine_type': 'cameroun', 'rating': 3 + i % 3} for i in range(40)]
+    households = [household(str(i)) for i in range(6)]
+    tasks = household_tasks(households)
+    plans = dict(solve_batch({tasks[0][1]: catalog}, set(), tasks, RULES, workers=1))
+
+    assert len(plans) == 6
+    assert all(None not in picks for picks in plans.values())
+    assert len({tuple(picks) for picks in plans.values()}) > 1
+    # Reproductible : même lot, mêmes plans
+    assert dict(solve_batch({tasks[0][1]: catalog}, set(), tasks, RULES, workers=1)) == plans
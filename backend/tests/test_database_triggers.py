@@ -0,0 +1,85 @@
+"""
+Tests des triggers SQLite : agrégats de notes, version de contenu des plans et versions de tables
+"""
+from datetime import date
+from conftest import create_plan, insert_catalog
+from services.plan_service import PlanService
+
+def _execute(db, query, params=()):
+    with db.get_connection() as conn:
+        conn.execute(query, params)
+        conn.commit()
+
+def _table_version(db, name):
+    return db.get_table_versions([name])[name][0]
+
+def test_rating_aggregates_follow_meal_writes(db):
+    plan_id, meal_ids = create_plan(db, [('Ndolé', 'arachide'), ('Ndolé', 'arachide'), ('Eru', 'eru')])
+    assert db.get_recipe_rating('Ndolé') is None
+
+    db.update_meal(meal_ids[0], {'rating': 5})
+    db.update_meal(meal_ids[1], {'rating': 3})
+    rating = db.get_recipe_rating('Ndolé')
+    assert (rating['rating_count'], rating['rating_sum']) == (2, 8)
+
+    # Changement de note, puis de recette : l'ancienne contribution est retirée
+    db.update_meal(meal_ids[1], {'rating': 4})
+    assert db.get_recipe_rating('Ndolé')['rating_sum'] == 9
+    _execute(db, "UPDATE meal_slots SET recipe_name = 'Eru' WHERE id = ?", (meal_ids[1],))
+    assert db.get_recipe_rating('Ndolé')['rating_count'] == 1
+    assert db.get_recipe_rating('Eru')['rating_sum'] == 4
+
+    db.delete_plan(plan_id)
+    assert db.get_recipe_rating('Ndolé')['rating_count'] == 0
+    assert db.get_recipe_rating('Eru')['rating_count'] == 0
+
+def test_catalog_ratings_are_not_aggregated(db):
+    insert_catalog(db, [('Koki', 'haricot')])
+    _execute(db, "UPDATE meal_slots SET rating = 5 WHERE recipe_name = 'Koki'")
+    assert db.get_recipe_rating('Koki') is None
+
+def test_generated_meals_do_not_inherit_catalog_ratings(db):
+    meals = [{'recipe_name': 'Koki', 'day_of_week': 'Lundi', 'main_ingredient': 'haricot',
+              'cuisine_type': 'cameroun', 'rating': 5, 'is_favorite': True}]
+    plan_id = PlanService(db).save_generated_plan('Semaine', date.today(), meals)['plan_id']
+    assert db.get_recipe_rating('Koki') is None
+    with db.get_connection() as conn:
+        assert tuple(conn.execute("SELECT rating, is_favorite FROM meal_slots WHERE plan_id = ?",
+                                  (plan_id,)).fetchone()) == (0, 0)
+
+def test_plan_content_version_bumps_on_meal_writes(db):
+    plan_id, meal_ids = create_plan(db, [('Ndolé', 'arachide'), ('Eru', 'eru')])
+    other_id, _ = create_plan(db, [('Koki', 'haricot')])
+    version = db.get_plan_content_version(plan_id)[0]
+    other_version = db.get_plan_content_version(other_id)[0]
+
+    _execute(db, "UPDATE meal_slots SET recipe_name = 'Poulet DG' WHERE id = ?", (meal_ids[0],))
+    assert db.get_plan_content_version(plan_id)[0] == version + 1
+    _execute(db, "DELETE FROM meal_slots WHERE id = ?", (meal_ids[1],))
+    assert db.get_plan_content_version(plan_id)[0] == version + 2
+    assert db.get_plan_content_version(other_id)[0] == other_version
+
+def test_table_versions_bump_on_writes(db):
+    meal_version = _table_version(db, 'meal_slots')
+    plan_version = _table_version(db, 'weekly_plans')
+    plan_id, meal_ids = create_plan(db, [('Ndolé', 'arachide')])
+    assert _table_version(db, 'meal_slots') == meal_version + 1
+    assert _table_version(db, 'weekly_plans') == plan_version + 1
+
+    db.update_meal(meal_ids[0], {'rating': 4})
+    assert _table_version(db, 'meal_slots') == meal_version + 2
+    assert _table_version(db, 'weekly_plans') == plan_version + 1
+
+def test_migration_replaces_existing_triggers(db):
+    with db.get_connection() as conn:
+        conn.execute("DROP TRIGGER trg_recipe_ratings_insert")
+        conn.execute("CREATE TRIGGER trg_recipe_ratings_insert AFTER INSERT ON meal_slots BEGIN SELECT 1; END")
+        conn.execute("PRAGMA user_version = 0")
+        conn.commit()
+    assert db.ensure_schema()
+
+    _, meal_ids = create_plan(db, [('Ndolé', 'arachide')])
+    _execute(db, "INSERT INTO meal_slots (plan_id, day_of_week, meal_type, recipe_name, rating) "
+                 "SELECT plan_id, day_of_week, meal_type, recipe_name, 5 FROM meal_slots WHERE id = ?",
+             (meal_ids[0],))
+    assert db.get_recipe_rating('Ndolé')['rating_count'] == 1
@@ -0,0 +1,69 @@
+"""
+Tests de la promotion des brouillons pré-générés
+"""
+import json
+import pytest
+from datetime import date, datetime, timedelta
+from conftest import insert_catalog
+from models import UserPreferences, CuisineType, BudgetLevel, WeeklyPlan
+from services.draft_service import DraftService, profile_key
+from services.plan_service import PlanService
+from services.rule_engine import rule_registry
+
+PREFERENCES = UserPreferences(cuisines=[CuisineType.CAMEROUN], budget=BudgetLevel('modéré'))
+WEEK = date.today() + timedelta(days=7)
+
+def _save_draft(db, recipes=('Ndolé', 'Eru'), expires_in=timedelta(hours=1), catalog_version=None):
+    meals = [{'recipe_name': name, 'day_of_week': 'Lundi', 'meal_type': 'Dîner'} for name in recipes]
+    db.save_draft_plan(profile_key(PREFERENCES), WEEK, json.dumps(meals),
+                       catalog_version or db.get_catalog_version(), rule_registry.get().version,
+                       datetime.now() + expires_in)
+
+def _count(db, table):
+    with db.get_connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+def test_valid_draft_is_promoted_once_with_the_plan(db):
+    insert_catalog(db, [('Ndolé', 'arachide'), ('Eru', 'eru')])
+    _save_draft(db)
+    result = PlanService(db).generate_ai_plan(PREFERENCES, 'Semaine', WEEK)
+    assert result['from_draft'] and result['meals_added'] == 2
+    assert _count(db, 'draft_plans') == 0
+    assert _count(db, 'preference_profiles') == 1
+
+    _save_draft(db, recipes=('Okok',))
+    draft = DraftService(db).find_draft(PREFERENCES, WEEK)
+    db.create_plan_with_meals(WeeklyPlan(id=None, plan_name='A', week_start_date=WEEK), [], draft=draft)
+    with pytest.raises(LookupError):
+        db.create_plan_with_meals(WeeklyPlan(id=None, plan_name='B', week_start_date=WEEK), [], draft=draft)
+    assert _count(db, 'weekly_plans') == 2
+
+def test_failed_plan_insert_keeps_draft_and_profile_untouched(db, monkeypatch):
+    _save_draft(db)
+    monkeypatch.setattr(db, '_insert_plan_meal', lambda cursor, meal: 1 / 0)
+    result = PlanService(db).generate_ai_plan(PREFERENCES, 'Semaine', WEEK)
+    assert result['success'] is False
+    assert _count(db, 'draft_plans') == 1
+    assert _count(db, 'preference_profiles') == 0
+    assert _count(db, 'weekly_plans') == 0
+
+def test_stale_drafts_are_not_promoted(db):
+    drafts = DraftService(db)
+    _save_draft(db, catalog_version='ancien')
+    draft = drafts.find_draft(PREFERENCES, WEEK)
+    assert not draft['valid']
+    db.create_plan_with_meals(WeeklyPlan(id=None, plan_name='A', week_start_date=WEEK), [],
+                              stale_draft_id=draft['id'])
+    assert _count(db, 'draft_plans') == 0
+
+    _save_draft(db, expires_in=timedelta(hours=-1))
+    assert not drafts.find_draft(PREFERENCES, WEEK)['valid']
+
+def test_draft_with_recent_recipe_is_kept(db):
+    _save_draft(db)
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO recipe_history (jow_recipe_id, recipe_name, used_date) VALUES (?, ?, ?)",
+                     ('eru', 'Eru', date.today().isoformat()))
+        conn.commit()
+    assert DraftService(db).find_draft(PREFERENCES, WEEK) is None
+    assert _count(db, 'draft_plans') == 1
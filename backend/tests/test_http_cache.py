@@ -0,0 +1,33 @@
+"""
+Tests des GET conditionnels : ETag par représentation négociée
+"""
+from flask import Flask
+from http_cache import conditional
+from serialization import NDJSON_MIMETYPE, stream_response
+
+def _client():
+    app = Flask(__name__)
+
+    @app.route('/meals')
+    @conditional(lambda: ('v1', None), negotiated=True)
+    def meals():
+        return stream_response(iter([[{'id': 1}, {'id': 2}]]))
+
+    return app.test_client()
+
+def test_negotiated_format_changes_etag_and_varies_on_accept():
+    client = _client()
+    as_json = client.get('/meals')
+    as_ndjson = client.get('/meals', headers={'Accept': NDJSON_MIMETYPE})
+    assert as_ndjson.mimetype == NDJSON_MIMETYPE
+    assert as_json.headers['ETag'] != as_ndjson.headers['ETag']
+    assert as_ndjson.headers['ETag'] == client.get('/meals?format=ndjson').headers['ETag']
+    assert 'Accept' in as_json.headers['Vary'] and 'Accept' in as_ndjson.headers['Vary']
+
+    # Un ETag JSON ne valide pas la représentation NDJSON
+    revalidated = client.get('/meals', headers={'Accept': NDJSON_MIMETYPE,
+                                                'If-None-Match': as_json.headers['ETag']})
+    assert revalidated.status_code == 200
+    not_modified = client.get('/meals', headers={'Accept': NDJSON_MIMETYPE,
+                                                 'If-None-Match': as_ndjson.headers['ETag']})
+    assert not_modified.status_code == 304 and 'Accept' in not_modified.headers['Vary']
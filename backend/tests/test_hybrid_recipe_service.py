@@ -0,0 +1,107 @@
+"""
+Tests des candidats d'une génération (règles appliquées dans SQLite) et de la re-planification
+"""
+from datetime import date, timedelta
+from conftest import create_plan, insert_catalog, this_monday
+from database import RATING_PRIOR_MEAN
+from models import UserPreferences, CuisineType, BudgetLevel, Meal, MealType, WeeklyPlan
+from services.hybrid_recipe_service import HybridRecipeService, MIN_LOCAL_CANDIDATES
+from services.jow_service import JowService
+from services.plan_service import PlanService
+
+PREFERENCES = UserPreferences(cuisines=[CuisineType.CAMEROUN], budget=BudgetLevel('modéré'))
+
+def _use(db, recipe_name):
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO recipe_history (jow_recipe_id, recipe_name, used_date) VALUES (?, ?, ?)",
+                     (recipe_name, recipe_name, (date.today() - timedelta(days=2)).isoformat()))
+        conn.commit()
+
+def test_candidates_exclude_recently_used_recipes(db):
+    insert_catalog(db, [(f"Recette {i}", f"ingrédient {i}") for i in range(MIN_LOCAL_CANDIDATES + 2)])
+    _use(db, 'Recette 0')
+    cameroon_recipes, _ = HybridRecipeService(db).get_candidates(PREFERENCES)
+    names = {r['recipe_name'] for r in cameroon_recipes}
+    assert 'Recette 0' not in names
+    assert len(names) == MIN_LOCAL_CANDIDATES + 1
+
+def test_small_catalog_keeps_recent_recipes_as_last_resort(db):
+    insert_catalog(db, [(f"Recette {i}", f"ingrédient {i}") for i in range(3)])
+    _use(db, 'Recette 0')
+    cameroon_recipes, _ = HybridRecipeService(db).get_candidates(PREFERENCES)
+    assert {r['recipe_name'] for r in cameroon_recipes} == {'Recette 0', 'Recette 1', 'Recette 2'}
+
+def test_catalog_is_ranked_on_stored_rating_aggregates(db):
+    insert_catalog(db, [('Koki', 'haricot'), ('Eru', 'eru')])
+    with db.get_connection() as conn:
+        conn.execute("UPDATE meal_slots SET rating = 5 WHERE recipe_name = 'Koki'")
+        conn.execute("UPDATE meal_slots SET rating = 1 WHERE recipe_name = 'Eru'")
+        conn.commit()
+    _, meal_ids = create_plan(db, [('Eru', 'eru'), ('Eru', 'eru')])
+    for meal_id in meal_ids:
+        db.update_meal(meal_id, {'rating': 5})
+
+    recipes = HybridRecipeService(db)._get_cameroon_recipes()
+    assert [r['recipe_name'] for r in recipes] == ['Eru', 'Koki']
+    assert recipes[0]['avg_rating'] == db.get_recipe_rating('Eru')['bayesian_avg']
+    assert recipes[1]['avg_rating'] == RATING_PRIOR_MEAN
+
+def _jow_plan(db):
+    plan = WeeklyPlan(id=None, plan_name='Plan', week_start_date=this_monday())
+    meals = [Meal(id=None, day_of_week=day, meal_type=MealType.DINNER, recipe_name=name,
+                  jow_recipe_id=jow_id, main_ingredient=ingredient, cuisine_type=CuisineType.FRENCH)
+             for day, name, jow_id, ingredient in [('Lundi', 'Gratin', 'jow-1', 'pomme de terre'),
+                                                   ('Mardi', 'Quiche', 'jow-2', 'oeuf')]]
+    return db.create_plan_with_meals(plan, meals)
+
+def test_replan_replaces_recipes_removed_from_jow(db, monkeypatch):
+    insert_catalog(db, [(f"Recette {i}", f"ingrédient {i}") for i in range(MIN_LOCAL_CANDIDATES)])
+    with db.get_connection() as conn:
+        conn.execute("UPDATE meal_slots SET rating = 5, is_favorite = 1 WHERE plan_id IS NULL")
+        conn.commit()
+    plan_id, meal_ids = _jow_plan(db)
+    monkeypatch.setattr(JowService, 'get_recipe_suggestions', lambda self, preferences: [])
+    monkeypatch.setattr(JowService, 'recipe_exists', lambda self, recipe_id: recipe_id == 'jow-2')
+
+    preferences = UserPreferences(cuisines=[CuisineType.CAMEROUN, CuisineType.FRENCH],
+                                  budget=BudgetLevel('modéré'))
+    result = PlanService(db).replan(plan_id, preferences)
+    assert [(s['meal_id'], s['reason']) for s in result['changed_slots']] == [(meal_ids[0], 'unavailable')]
+
+    # La note et le favori de la recette du catalogue ne sont pas repris
+    replaced = db.get_meal(meal_ids[0])
+    assert replaced['recipe_name'].startswith('Recette')
+    assert (replaced['rating'], replaced['is_favorite']) == (0, 0)
+
+def test_replan_keeps_jow_recipes_when_jow_does_not_answer(db, monkeypatch):
+    insert_catalog(db, [(f"Recette {i}", f"ingrédient {i}") for i in range(MIN_LOCAL_CANDIDATES)])
+    plan_id, _ = _jow_plan(db)
+    monkeypatch.setattr(JowService, 'get_recipe_suggestions', lambda self, preferences: [])
+    monkeypatch.setattr(JowService, 'recipe_exists', lambda self, recipe_id: None)
+
+    preferences = UserPreferences(cuisines=[CuisineType.CAMEROUN, CuisineType.FRENCH],
+                                  budget=BudgetLevel('modéré'))
+    assert PlanService(db).replan(plan_id, preferences)['changed_slots'] == []
+
+def _jow_suggestions(self, preferences):
+    return [{'jow_recipe_id': f"jow-{i}", 'recipe_name': f"Jow {i}", 'cuisine_type': 'french',
+             'main_ingredient': f"légume {i}", 'servings': 2, 'source': 'jow',
+             'ingredients': [{'name': f"légume {i}", 'quantity': 200, 'unit': 'g'}]}
+            for i in range(10)]
+
+def _ingredient_recipes(db):
+    with db.get_connection() as conn:
+        return {row[0] for row in conn.execute("SELECT DISTINCT recipe_name FROM recipe_ingredients")}
+
+def test_jow_ingredients_are_saved_with_the_plan_only(db, monkeypatch):
+    insert_catalog(db, [('Ndolé', 'arachide'), ('Eru', 'eru')])
+    monkeypatch.setattr(JowService, 'get_recipe_suggestions', _jow_suggestions)
+    preferences = UserPreferences(cuisines=[CuisineType.CAMEROUN, CuisineType.FRENCH],
+                                  budget=BudgetLevel('modéré'))
+
+    preview = PlanService(db).generate_ai_plan(preferences, 'Aperçu', this_monday(), dry_run=True)
+    assert preview['dry_run'] and _ingredient_recipes(db) == set()
+
+    result = PlanService(db).generate_ai_plan(preferences, 'Semaine', this_monday())
+    planned = {m['recipe_name'] for m in db.get_plan_meals(result['plan_id']) if m['jow_recipe_id']}
+    assert planned and _ingredient_recipes(db) == planned
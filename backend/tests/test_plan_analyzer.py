@@ -0,0 +1,37 @@
+"""
+Tests des violations signalées par l'analyse d'un planning (mêmes règles que le solveur)
+"""
+from services.plan_analyzer import PlanAnalyzer
+from services.rule_engine import RuleSet
+
+RULES = RuleSet.from_dict({
+    'version': 1,
+    'rules': [
+        {'type': 'ingredient_max_per_week', 'ingredients': ['riz'], 'max': 1},
+        {'type': 'ingredient_max_per_week', 'ingredients': ['plantain'], 'max': 2},
+        {'type': 'ingredient_not_consecutive', 'ingredients': ['riz', 'pâtes']}
+    ]
+})
+
+def _meals(*entries):
+    return [{'day_of_week': day, 'meal_type': 'Dîner', 'recipe_name': f"{ingredient} {day}",
+             'main_ingredient': ingredient, 'cuisine_type': 'cameroun'} for day, ingredient in entries]
+
+def _violations(db, meals):
+    return PlanAnalyzer(db, RULES).analyze_meals(meals)['planning_statistics']['constraint_violations']
+
+def test_plan_within_rules_has_no_violation(db):
+    meals = _meals(('Lundi', 'plantain'), ('Mardi', 'plantain'), ('Mercredi', 'riz'),
+                   ('Jeudi', 'eru'), ('Vendredi', 'eru'), ('Samedi', 'pâtes'))
+    assert _violations(db, meals) == []
+
+def test_limits_come_from_the_rules(db):
+    meals = _meals(('Lundi', 'Riz'), ('Mercredi', 'riz'), ('Jeudi', 'plantain'),
+                   ('Vendredi', 'plantain'), ('Samedi', 'plantain'))
+    assert _violations(db, meals) == ["Ingrédient 'Riz' utilisé 2 fois (max 1)",
+                                      "Ingrédient 'plantain' utilisé 3 fois (max 2)"]
+
+def test_not_consecutive_rule_covers_same_and_next_day(db):
+    meals = _meals(('Lundi', 'pâtes'), ('Mardi', 'pâtes'), ('Jeudi', 'pâtes'), ('Jeudi', 'pâtes'))
+    assert _violations(db, meals) == ["Ingrédient 'pâtes' consécutif: Lundi -> Mardi",
+                                      "Ingrédient 'pâtes' consécutif: Jeudi -> Jeudi"]
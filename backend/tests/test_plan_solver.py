@@ -0,0 +1,61 @@
+"""
+Tests des contraintes du solveur : limites par ingrédient et jours consécutifs selon les règles
+"""
+from services.plan_solver import PlanSolver, PlanSlot, DAYS_OF_WEEK
+from services.rule_engine import RuleSet
+
+def recipe(name, ingredient, rating=3):
+    return {'recipe_name': name, 'main_ingredient': ingredient, 'cuisine_type': 'cameroun', 'rating': rating}
+
+def catalog(ingredient, count, rating=5):
+    return [recipe(f"{ingredient} {i}", ingredient, rating) for i in range(count)]
+
+def solve(solver, recipes, slots=None, **kwargs):
+    slots = slots or solver.build_slots()
+    result = solver.solve(recipes, slots, time_budget=2.0, **kwargs)
+    return [(slot.day_of_week, r['main_ingredient'] if r else None) for slot, r in zip(slots, result.assignments)]
+
+def count(plan, ingredient):
+    return sum(1 for _, i in plan if i == ingredient)
+
+def test_max_per_week_comes_from_rules():
+    recipes = catalog('riz', 7) + catalog('eru', 7, rating=1)
+    for limit in (1, 2, 3):
+        plan = solve(PlanSolver({'riz': limit}), recipes)
+        assert count(plan, 'riz') == limit
+
+def test_unruled_ingredient_may_repeat_on_consecutive_days():
+    plan = solve(PlanSolver({'riz': 1}, {'riz'}), catalog('poulet', 7))
+    assert count(plan, 'poulet') == 7
+
+def test_not_consecutive_applies_only_to_its_ingredients():
+    recipes = catalog('pâtes', 7) + catalog('poulet', 7, rating=4) + catalog('eru', 7, rating=1)
+    plan = solve(PlanSolver({}, {'pâtes'}), recipes)
+    days = [DAYS_OF_WEEK.index(day) for day, ingredient in plan if ingredient == 'pâtes']
+    assert len(days) == 4
+    assert all(b - a > 1 for a, b in zip(days, days[1:]))
+    assert count(plan, 'poulet') == 3
+
+def test_not_consecutive_blocks_lunch_and_dinner_same_day():
+    slots = [PlanSlot('Lundi', 'Déjeuner'), PlanSlot('Lundi', 'Dîner')]
+    plan = solve(PlanSolver({}, {'riz'}), catalog('riz', 2) + catalog('eru', 2, rating=1), slots)
+    assert count(plan, 'riz') == 1
+
+def test_fixed_meals_count_towards_limits():
+    slots = [PlanSlot(day) for day in DAYS_OF_WEEK[2:]]
+    fixed = [{'recipe_name': 'Riz au gras', 'main_ingredient': 'Riz', 'day_of_week': 'Lundi'}]
+    plan = solve(PlanSolver({'riz': 2}, {'riz'}), catalog('riz', 7) + catalog('eru', 7, rating=1),
+                 slots, fixed_meals=fixed)
+    riz_days = [day for day, ingredient in plan if ingredient == 'riz']
+    assert len(riz_days) == 1 and riz_days[0] != 'Mardi'
+
+def test_from_rules_follows_rule_file():
+    rules = RuleSet.from_dict({'version': 1, 'rules': [
+        {'type': 'ingredient_max_per_week', 'ingredients': ['Riz'], 'max': 2},
+        {'type': 'ingredient_not_consecutive', 'ingredients': ['pâtes']}
+    ]})
+    solver = PlanSolver.from_rules(rules)
+    assert solver.ingredient_max == {'riz': 2}
+    assert solver.not_consecutive == {'pâtes'}
+    plan = solve(solver, catalog('riz', 7) + catalog('eru', 7, rating=1))
+    assert count(plan, 'riz') == 2
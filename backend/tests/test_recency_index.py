@@ -0,0 +1,94 @@
+"""
+Tests de l'index de récence : mises à jour locales, rattrapage des autres workers, accès concurrents
+"""
+import sys
+import threading
+from datetime import date, timedelta
+from conftest import create_plan, this_monday
+from database import DatabaseManager
+from models import Meal, MealType
+from recency_index import RecencyIndex
+
+def other_worker(db) -> DatabaseManager:
+    """Second gestionnaire sur la même base (un autre worker gunicorn)"""
+    return DatabaseManager(db.db_path)
+
+def test_local_writes_are_applied_without_reload(db):
+    db.recency_index.load()
+    create_plan(db, [('Ndolé', 'arachides'), ('Eru', 'eru')])
+    assert db.recency_index.last_used('Ndolé') == this_monday().isoformat()
+    assert db.recency_index.used_since(this_monday()) == {'Ndolé', 'Eru'}
+
+def test_other_worker_inserts_are_caught_up(db):
+    db.recency_index.sync_interval = 0
+    db.recency_index.load()
+    create_plan(other_worker(db), [('Koki', 'haricots')])
+    assert db.recency_index.is_recent('Koki', this_monday())
+
+def test_other_worker_deletes_trigger_reload(db):
+    db.recency_index.sync_interval = 0
+    plan_id, _ = create_plan(db, [('Koki', 'haricots')])
+    create_plan(db, [('Eru', 'eru')])
+    assert 'Koki' in db.recency_index.used_since(this_monday())
+
+    worker = other_worker(db)
+    with worker.get_connection() as conn:
+        conn.execute("DELETE FROM recipe_history WHERE plan_id = ?", (plan_id,))
+        conn.commit()
+    assert db.recency_index.used_since(this_monday()) == {'Eru'}
+
+def test_other_worker_meal_replacements_are_caught_up(db):
+    db.recency_index.sync_interval = 0
+    plan_id, meal_ids = create_plan(db, [('Koki', 'haricots'), ('Eru', 'eru')])
+    assert db.recency_index.used_since(this_monday()) == {'Koki', 'Eru'}
+
+    replacement = Meal(id=meal_ids[0], day_of_week='Lundi', meal_type=MealType.DINNER,
+                       recipe_name='Ndolé', main_ingredient='arachides')
+    other_worker(db).apply_meal_changes(plan_id, {meal_ids[0]: replacement}, [])
+    assert db.recency_index.used_since(this_monday()) == {'Ndolé', 'Eru'}
+    assert db.recency_index.last_used('Ndolé') == this_monday().isoformat()
+
+def test_horizon_and_direct_reads_beyond_it(db):
+    index = RecencyIndex(db, horizon_weeks=2)
+    old_week = this_monday() - timedelta(weeks=5)
+    create_plan(db, [('Achu', 'taro')], week_start_date=old_week)
+    create_plan(db, [('Eru', 'eru')])
+    index.load()
+    assert index.last_used('Achu') is None
+    assert index.used_since(old_week) == {'Achu', 'Eru'}
+
+def test_concurrent_reads_during_reloads_and_writes(db):
+    index = db.recency_index
+    index.load()
+    for i in range(20000):
+        index.record(f"Ancienne {i}", date.today().isoformat())
+    errors = []
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            index.record(f"Recette {i}", date.today().isoformat())
+            i += 1
+
+    def reader():
+        try:
+            for _ in range(50):
+                index.used_since(date.today() - timedelta(days=1))
+        except RuntimeError as e:
+            errors.append(e)
+
+    # Changements de thread fréquents : l'itération d'un dictionnaire modifié échouerait
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads[1:]:
+            thread.join()
+    finally:
+        stop.set()
+        threads[0].join()
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
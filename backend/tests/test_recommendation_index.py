@@ -0,0 +1,33 @@
+"""
+Tests de la reconstruction incrémentale de l'index de recommandation
+"""
+from conftest import create_plan
+from database import RATING_PRIOR_MEAN
+from services.recommendation_index import RecommendationIndexBuilder, meal_weight
+
+def test_new_plans_are_added_incrementally(db, tmp_path):
+    builder = RecommendationIndexBuilder(db, str(tmp_path / 'index'))
+    create_plan(db, [('Ndolé', 'arachide'), ('Eru', 'eru')])
+    assert not builder.build()['incremental']
+
+    create_plan(db, [('Poulet DG', 'poulet'), ('Eru', 'eru')])
+    result = builder.build()
+    assert result['incremental']
+    assert result['new_meals'] == 2
+
+def test_in_place_recipe_swap_triggers_full_rebuild(db, tmp_path):
+    builder = RecommendationIndexBuilder(db, str(tmp_path / 'index'))
+    _, meal_ids = create_plan(db, [('Ndolé', 'arachide'), ('Eru', 'eru')])
+    builder.build()
+
+    with db.get_connection() as conn:
+        conn.execute("UPDATE meal_slots SET recipe_name = 'Koki' WHERE id = ?", (meal_ids[1],))
+        conn.commit()
+    result = builder.build()
+    assert not result['incremental']
+    assert result['items'] == 2
+
+def test_unrated_meal_weighs_like_an_average_rating():
+    assert meal_weight(None, False) == meal_weight(0, False) == meal_weight(RATING_PRIOR_MEAN, False)
+    assert meal_weight(1, False) < meal_weight(0, False) < meal_weight(5, False)
+    assert meal_weight(0, True) > meal_weight(0, False)
@@ -0,0 +1,114 @@
+"""
+Tests du moteur de règles : validation, compilations SQL et vectorisée, rechargement à chaud
+"""
+import json
+import os
+from datetime import date, timedelta
+import pytest
+from conftest import insert_catalog
+from services.candidate_pool import CandidatePool
+from services.rule_engine import RuleSet, RuleRegistry
+
+RULES = {
+    'version': 3,
+    'ingredient_sets': {'starch': ['Riz', 'pâtes']},
+    'rules': [
+        {'id': 'recent', 'type': 'recent_repeat', 'weeks': 4},
+        {'id': 'starch_max', 'type': 'ingredient_max_per_week', 'ingredient_set': 'starch', 'max': 2},
+        {'id': 'plantain_max', 'type': 'ingredient_max_per_week', 'ingredients': ['Plantain'], 'max': 3},
+        {'id': 'rice_max', 'type': 'ingredient_max_per_week', 'ingredients': ['riz'], 'max': 1},
+        {'id': 'starch_spread', 'type': 'ingredient_not_consecutive', 'ingredients': ['pâtes']}
+    ]
+}
+
+CATALOG = [('Riz sauté', 'riz'), ('Pâtes bolo', 'Pâtes'), ('Ndolé', 'arachides'),
+           ('Koki', 'haricots'), ('Poulet DG', 'plantain'), ('Eru', 'eru')]
+
+@pytest.fixture
+def rules():
+    return RuleSet.from_dict(RULES)
+
+def test_from_dict_expands_sets_and_normalizes(rules):
+    assert rules.version == 3
+    assert rules.recent_weeks == 4
+    assert rules.rules[1].ingredients == {'riz', 'pâtes'}
+    assert rules.restricted_ingredients == {'riz', 'pâtes', 'plantain'}
+
+@pytest.mark.parametrize('data, message', [
+    ({'rules': []}, 'version'),
+    ({'version': 1, 'rules': [{'type': 'unknown'}]}, 'Type de règle inconnu'),
+    ({'version': 1, 'rules': [{'type': 'ingredient_max_per_week', 'ingredient_set': 'x'}]}, 'Ensemble'),
+])
+def test_from_dict_rejects_invalid_rules(data, message):
+    with pytest.raises(ValueError, match=message):
+        RuleSet.from_dict(data)
+
+def test_load_yaml_rule_file(tmp_path):
+    path = tmp_path / 'rules.yaml'
+    path.write_text(
+        "version: 2\n"
+        "rules:\n"
+        "  - {id: rice_max, type: ingredient_max_per_week, ingredients: [riz], max: 1}\n",
+        encoding='utf-8'
+    )
+    rules = RuleSet.load(str(path))
+    assert (rules.version, rules.ingredient_max, rules.source) == (2, {'riz': 1}, str(path))
+
+def test_ingredient_max_keeps_strictest_rule(rules):
+    assert rules.ingredient_max == {'riz': 1, 'pâtes': 2, 'plantain': 3}
+
+def test_not_consecutive_is_separate_from_max_rules(rules):
+    assert rules.not_consecutive_ingredients == {'pâtes'}
+
+def test_blocked_ingredients(rules):
+    assert rules.blocked_ingredients({'Riz': 1, 'pâtes': 1, 'plantain': 2}) == {'riz'}
+    assert rules.blocked_ingredients({'pâtes': 2}) == {'pâtes'}
+    # Seuls les ingrédients d'une règle ingredient_not_consecutive bloquent le lendemain
+    assert rules.blocked_ingredients({}, previous_ingredient='Pâtes') == {'pâtes'}
+    assert rules.blocked_ingredients({}, previous_ingredient='riz') == set()
+
+def _history(db, recipe_name, used_date):
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO recipe_history (jow_recipe_id, recipe_name, used_date) VALUES (?, ?, ?)",
+                     (recipe_name, recipe_name, used_date.isoformat()))
+        conn.commit()
+
+def _sql_names(db, rules, *args):
+    where, params = rules.compile_sql(*args)
+    with db.get_connection() as conn:
+        rows = conn.execute(f"SELECT recipe_name FROM meal_slots c WHERE plan_id IS NULL AND {where}",
+                            params).fetchall()
+    return {row[0] for row in rows}
+
+def test_compile_sql_excludes_recent_and_blocked(db, rules):
+    insert_catalog(db, CATALOG)
+    _history(db, 'Ndolé', date.today() - timedelta(weeks=1))
+    _history(db, 'Koki', date.today() - timedelta(weeks=6))
+
+    names = _sql_names(db, rules, {'riz': 1}, 'pâtes')
+    assert names == {'Koki', 'Poulet DG', 'Eru'}
+
+def test_compile_mask_matches_compile_sql(db, rules):
+    insert_catalog(db, CATALOG)
+    _history(db, 'Eru', date.today() - timedelta(days=3))
+    pool = CandidatePool([{'recipe_name': n, 'main_ingredient': i} for n, i in CATALOG],
+                         rules.restricted_ingredients)
+
+    for plan_ingredients, previous in [({}, None), ({'plantain': 3}, None), ({'Pâtes': 1}, 'pâtes')]:
+        mask = rules.compile_mask(pool, db.recency_index.used_since(date.today() - timedelta(weeks=4)),
+                                  plan_ingredients, previous)
+        assert {r['recipe_name'] for r in pool.select(mask)} == _sql_names(db, rules, plan_ingredients, previous)
+
+def test_registry_reloads_changed_file_and_keeps_last_valid(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps(RULES), encoding='utf-8')
+    registry = RuleRegistry(str(path), check_interval=0)
+    assert registry.get().version == 3
+
+    path.write_text(json.dumps(dict(RULES, version=4)), encoding='utf-8')
+    os.utime(path, (1, 1))
+    assert registry.get().version == 4
+
+    path.write_text('{invalide', encoding='utf-8')
+    os.utime(path, (2, 2))
+    assert registry.get().version == 4
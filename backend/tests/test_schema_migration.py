@@ -0,0 +1,47 @@
+"""
+Tests de la migration du schéma (PRAGMA user_version)
+"""
+import sqlite3
+from database import DatabaseManager, SCHEMA_VERSION
+from models import Meal, MealType, CuisineType
+
+def _schema(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(conn.execute("SELECT type, name FROM sqlite_master WHERE tbl_name = 'meal_slots'").fetchall())
+    finally:
+        conn.close()
+
+def test_version_1_database_gets_nullable_catalog_columns(db, tmp_path):
+    # Base migrée en version 1 : plan_id et day_of_week NOT NULL
+    path = str(tmp_path / 'v1.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE weekly_plans (id INTEGER PRIMARY KEY AUTOINCREMENT, plan_name TEXT NOT NULL,
+                                   week_start_date DATE NOT NULL, total_budget_estimate REAL,
+                                   generated_by_ai BOOLEAN DEFAULT 1,
+                                   created_at DATETIME DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE meal_slots (id INTEGER PRIMARY KEY AUTOINCREMENT, plan_id INTEGER NOT NULL,
+                                 day_of_week TEXT NOT NULL, meal_type TEXT NOT NULL, recipe_name TEXT NOT NULL,
+                                 jow_recipe_id TEXT, jow_recipe_url TEXT, main_ingredient TEXT, cuisine_type TEXT,
+                                 image_url TEXT, video_url TEXT, prep_time INTEGER, cook_time INTEGER,
+                                 is_favorite BOOLEAN DEFAULT 0, rating INTEGER DEFAULT 0, notes TEXT,
+                                 FOREIGN KEY (plan_id) REFERENCES weekly_plans(id));
+        INSERT INTO weekly_plans (plan_name, week_start_date) VALUES ('Plan', '2026-10-19');
+        INSERT INTO meal_slots (plan_id, day_of_week, meal_type, recipe_name, rating)
+        VALUES (1, 'Lundi', 'Dîner', 'Ndolé', 4), (1, 'Mardi', 'Dîner', 'Eru', 0);
+        DELETE FROM meal_slots WHERE recipe_name = 'Eru';
+        PRAGMA user_version = 1;
+    """)
+    conn.close()
+
+    migrated = DatabaseManager(path)
+    assert migrated.schema_version() == SCHEMA_VERSION
+    assert _schema(path) == _schema(db.db_path)
+    assert migrated.get_recipe_rating('Ndolé')['rating_count'] == 1
+
+    recipe_id = migrated.add_base_recipe(Meal(id=None, day_of_week=None, meal_type=MealType.DINNER,
+                                              recipe_name='Koki', main_ingredient='haricot',
+                                              cuisine_type=CuisineType.CAMEROUN))
+    # Identifiant supprimé (2) jamais réattribué
+    assert recipe_id == 3
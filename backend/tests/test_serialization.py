@@ -0,0 +1,32 @@
+"""
+Tests du fournisseur JSON orjson et du formatage des repas
+"""
+import json
+import pytest
+from flask import Flask
+from serialization import OrjsonProvider, format_meal, orjson
+
+pytestmark = pytest.mark.skipif(orjson is None, reason="orjson non installé")
+
+MEAL = {
+    'id': 1, 'plan_id': 1, 'day_of_week': 'Lundi', 'meal_type': 'Dîner', 'recipe_name': 'Ndolé',
+    'jow_recipe_id': None, 'jow_recipe_url': None, 'main_ingredient': 'arachide',
+    'cuisine_type': 'cameroun', 'image_url': None, 'video_url': None, 'prep_time': 20,
+    'cook_time': 40, 'is_favorite': 0, 'rating': 4, 'notes': None
+}
+
+def test_orjson_provider_matches_default_provider():
+    app = Flask(__name__)
+    payload = {'b': 1, 'a': [format_meal(MEAL)], 'c': {'z': None, 'y': 2.5}}
+    default = app.json.dumps(payload)
+    app.json = OrjsonProvider(app)
+    assert app.json.dumps(payload) == json.dumps(json.loads(default), sort_keys=True,
+                                                 ensure_ascii=False, separators=(',', ':'))
+    with app.app_context():
+        assert app.json.response(payload).get_data(as_text=True).startswith('{"a":')
+
+def test_format_meal_reuses_compiled_formatter():
+    first = format_meal(MEAL)
+    second = format_meal(dict(MEAL, id=2, recipe_name='Eru'))
+    assert (first['name'], second['name']) == ('Ndolé', 'Eru')
+    assert second['id'] == 2 and second['rating'] == 4
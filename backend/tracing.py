@@ -0,0 +1,289 @@
+"""
+Traces par requête : arbre de spans (services, appels Jow / Gemini, requêtes SQL),
+journal des requêtes SQL lentes et profilage cProfile à la demande
+"""
+import cProfile
+import json
+import os
+import random
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import wraps
+from typing import Any, Dict, List, Optional
+from flask import request
+
+# Part des requêtes tracées et exportées (un administrateur peut forcer ?trace=1)
+TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+# Export des traces, une par ligne : 'json' (arbre de spans) ou 'otlp' (OTLP/JSON)
+TRACE_EXPORT_FORMAT = os.getenv('TRACE_EXPORT_FORMAT', 'json')
+TRACE_EXPORT_PATH = os.getenv('TRACE_EXPORT_PATH', 'logs/traces.jsonl')
+# Au-delà, les spans d'une trace sont seulement comptés
+MAX_SPANS_PER_TRACE = 5000
+
+# Requêtes SQL journalisées au-delà de ce seuil (ms), dans SLOW_QUERY_LOG ou sur la sortie standard
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_LOG = os.getenv('SLOW_QUERY_LOG')
+
+# Profils cProfile des requêtes ?profile=1 (fichiers .prof, lisibles avec snakeviz ou flameprof)
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'logs/profiles')
+
+# Catégories de spans résumées dans l'en-tête Server-Timing
+SERVER_TIMING_CATEGORIES = ('db', 'jow', 'gemini')
+
+@dataclass
+class Trace:
+    trace_id: str = field(default_factory=lambda: secrets.token_hex(16))
+    epoch_ns: int = field(default_factory=time.time_ns)
+    origin_ns: int = field(default_factory=time.perf_counter_ns)
+    span_count: int = 0
+    dropped_spans: int = 0
+
+@dataclass
+class Span:
+    name: str
+    trace: Trace = field(repr=False)
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    start_ns: int = field(default_factory=time.perf_counter_ns)
+    end_ns: Optional[int] = None
+    error: Optional[str] = None
+    children: List['Span'] = field(default_factory=list, repr=False)
+    span_id: str = field(default_factory=lambda: secrets.token_hex(8))
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.perf_counter_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Arbre de spans (début relatif au début de la trace, en ms)"""
+        node = {
+            'name': self.name,
+            'start_ms': round((self.start_ns - self.trace.origin_ns) / 1e6, 3),
+            'duration_ms': round(self.duration_ms, 3)
+        }
+        if self.attributes:
+            node['attributes'] = self.attributes
+        if self.error:
+            node['error'] = self.error
+        if self.children:
+            node['children'] = [child.to_dict() for child in self.children]
+        return node
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+_current_span: ContextVar[Optional[Span]] = ContextVar('jowafrique_current_span', default=None)
+
+def _new_child(parent: Span, name: str, attributes: Dict[str, Any]) -> Optional[Span]:
+    trace = parent.trace
+    if trace.span_count >= MAX_SPANS_PER_TRACE:
+        trace.dropped_spans += 1
+        return None
+    trace.span_count += 1
+    child = Span(name, trace, attributes)
+    parent.children.append(child)
+    return child
+
+@contextmanager
+def span(name: str, **attributes):
+    """Span enfant du span courant (sans effet si la requête n'est pas tracée)"""
+    parent = _current_span.get()
+    child = _new_child(parent, name, attributes) if parent is not None else None
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except Exception as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end_ns = time.perf_counter_ns()
+        _current_span.reset(token)
+
+def traced(name: str):
+    """Décorateur : exécute la fonction dans un span `name` si la requête est tracée"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return f(*args, **kwargs)
+            with span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def trace_methods(prefix: str):
+    """Décorateur de classe : un span `prefix.méthode` par appel de méthode publique"""
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            # Méthodes d'instance publiques uniquement (les staticmethod ne sont pas des fonctions)
+            if not attr.startswith('_') and callable(value) and hasattr(value, '__code__'):
+                setattr(cls, attr, traced(f"{prefix}.{attr}")(value))
+        return cls
+    return decorator
+
+def record_query(statement: str, sql: str, start_ns: int, end_ns: int):
+    """Requête SQL terminée : span de la trace courante et journal des requêtes lentes"""
+    parent = _current_span.get()
+    if parent is not None:
+        child = _new_child(parent, f"db.{statement}", {})
+        if child is not None:
+            child.start_ns, child.end_ns = start_ns, end_ns
+    duration_ms = (end_ns - start_ns) / 1e6
+    if duration_ms >= SLOW_QUERY_MS:
+        log_slow_query(statement, sql, duration_ms, parent.trace.trace_id if parent is not None else None)
+
+def log_slow_query(statement: str, sql: str, duration_ms: float, trace_id: Optional[str] = None):
+    entry = {
+        'time': datetime.now().isoformat(timespec='milliseconds'),
+        'statement': statement,
+        'duration_ms': round(duration_ms, 3),
+        'sql': ' '.join(sql.split())[:2000],
+        'trace_id': trace_id
+    }
+    if SLOW_QUERY_LOG:
+        _append_line(SLOW_QUERY_LOG, json.dumps(entry, ensure_ascii=False))
+    else:
+        print(f"Requête lente ({entry['duration_ms']} ms) {statement}: {entry['sql']}")
+
+def _append_line(path: str, line: str):
+    """Ajoute une ligne en un seul write (les workers gunicorn partagent le fichier)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, (line + '\n').encode('utf-8'))
+    finally:
+        os.close(fd)
+
+def to_otlp(root: Span) -> Dict[str, Any]:
+    """Trace au format OTLP/JSON (un resourceSpans, comme l'exportateur fichier d'OpenTelemetry)"""
+    trace = root.trace
+    spans = []
+
+    def add(node: Span, parent_id: Optional[str]):
+        start = trace.epoch_ns + node.start_ns - trace.origin_ns
+        end = trace.epoch_ns + (node.end_ns or node.start_ns) - trace.origin_ns
+        spans.append({
+            'traceId': trace.trace_id,
+            'spanId': node.span_id,
+            'parentSpanId': parent_id or '',
+            'name': node.name,
+            'kind': 2 if node is root else 1,
+            'startTimeUnixNano': str(start),
+            'endTimeUnixNano': str(end),
+            'attributes': [{'key': key, 'value': {'stringValue': str(value)}}
+                           for key, value in node.attributes.items()],
+            'status': {'code': 2, 'message': node.error} if node.error else {'code': 0}
+        })
+        for child in node.children:
+            add(child, node.span_id)
+
+    add(root, None)
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'jowafrique-backend'}}]},
+        'scopeSpans': [{'scope': {'name': 'jowafrique.tracing'}, 'spans': spans}]
+    }]}
+
+def export_trace(root: Span):
+    if TRACE_EXPORT_FORMAT == 'otlp':
+        payload = to_otlp(root)
+    else:
+        payload = {'trace_id': root.trace.trace_id, 'dropped_spans': root.trace.dropped_spans,
+                   'root': root.to_dict()}
+    _append_line(TRACE_EXPORT_PATH, json.dumps(payload, ensure_ascii=False, default=str))
+
+def server_timing(root: Span) -> str:
+    """En-tête Server-Timing : temps cumulé par catégorie de span et durée totale"""
+    totals = dict.fromkeys(SERVER_TIMING_CATEGORIES, 0.0)
+    for node in root.walk():
+        category = node.name.split('.', 1)[0]
+        if node is not root and category in totals:
+            totals[category] += node.duration_ms
+    parts = [f"{category};dur={duration:.1f}" for category, duration in totals.items()]
+    return ', '.join(parts + [f"total;dur={root.duration_ms:.1f}"])
+
+def install_tracing(app):
+    """Trace les requêtes échantillonnées ou demandées par un administrateur (?trace=1, ?profile=1).
+
+    La réponse porte alors X-Trace-Id et Server-Timing ; un profil cProfile est écrit dans
+    PROFILE_DIR pour ?profile=1 (nom du fichier dans X-Profile-File).
+    """
+    from security import is_admin_request
+
+    span_key, token_key, root_key = 'jowafrique.span', 'jowafrique.span_token', 'jowafrique.trace_root'
+    profiler_key = 'jowafrique.profiler'
+
+    @app.before_request
+    def start_request_span():
+        name = f"{request.method} {request.url_rule.rule if request.url_rule else request.path}"
+        parent = _current_span.get()
+        if parent is not None:
+            # Sous-requête de /api/batch : span enfant de la requête englobante
+            node = _new_child(parent, name, {})
+            if node is None:
+                return
+        else:
+            forced = request.args.get('trace') == '1' or request.args.get('profile') == '1'
+            sampled = TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE
+            if not sampled and not (forced and is_admin_request()):
+                return
+            node = Span(name, Trace(), {'http.method': request.method, 'http.target': request.full_path})
+            request.environ[root_key] = True
+            if request.args.get('profile') == '1' and is_admin_request():
+                profiler = cProfile.Profile()
+                request.environ[profiler_key] = profiler
+                profiler.enable()
+        request.environ[span_key] = node
+        request.environ[token_key] = _current_span.set(node)
+
+    @app.after_request
+    def finish_request_span(response):
+        node = request.environ.get(span_key)
+        if node is None:
+            return response
+        node.end_ns = time.perf_counter_ns()
+        node.attributes['http.status_code'] = response.status_code
+        if not request.environ.get(root_key):
+            return response
+
+        profiler = request.environ.pop(profiler_key, None)
+        if profiler is not None:
+            profiler.disable()
+            filename = f"{datetime.now():%Y%m%d-%H%M%S}-{request.endpoint or 'unmatched'}-{node.trace.trace_id[:8]}.prof"
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                profiler.dump_stats(os.path.join(PROFILE_DIR, filename))
+                response.headers['X-Profile-File'] = filename
+            except OSError as e:
+                print(f"Erreur écriture profil {filename}: {e}")
+
+        response.headers['X-Trace-Id'] = node.trace.trace_id
+        response.headers['Server-Timing'] = server_timing(node)
+        try:
+            export_trace(node)
+        except OSError as e:
+            print(f"Erreur export trace {node.trace.trace_id}: {e}")
+        return response
+
+    @app.teardown_request
+    def close_request_span(exc=None):
+        profiler = request.environ.pop(profiler_key, None)
+        if profiler is not None:
+            profiler.disable()
+        node = request.environ.pop(span_key, None)
+        token = request.environ.pop(token_key, None)
+        if token is not None:
+            _current_span.reset(token)
+        if node is not None and node.end_ns is None:
+            node.end_ns = time.perf_counter_ns()
+            if exc is not None:
+                node.error = f"{type(exc).__name__}: {exc}"
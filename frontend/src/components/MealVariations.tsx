@@ -57,14 +57,14 @@ export default function MealVariations({
               <div className="flex items-start justify-between">
                 <div className="flex-1">
                   <h5 className="font-medium text-gray-900 mb-2">
-                    {variation.name}
+                    {variation.name ?? variation.recipe_name}
                   </h5>
                   
                   <div className="flex items-center space-x-4 text-sm text-gray-600 mb-2">
-                    {variation.prepTime && (
+                    {(variation.prepTime ?? variation.prep_time) && (
                       <div className="flex items-center">
                         <Clock className="w-4 h-4 mr-1" />
-                        {variation.prepTime}min
+                        {variation.prepTime ?? variation.prep_time}min
                       </div>
                     )}
                     {variation.servings && (
@@ -76,7 +76,7 @@ export default function MealVariations({
                   </div>
                   
                   <p className="text-gray-700 text-sm mb-3">
-                    {variation.description}
+                    {variation.description ?? variation.notes}
                   </p>
                   
                   <div className="flex flex-wrap gap-2">
@@ -6,6 +6,7 @@ import {
   getMealVariations, 
   optimizeShoppingList, 
   analyzeNutrition, 
+  getPlanInsights,
   regeneratePlanDay 
 } from '@/services/api'
 import { UserPreferences } from '@/types'
@@ -98,6 +99,26 @@ export const useAiFeatures = () => {
     }
   }
 
+  const getInsights = async (planId: number, budget?: number) => {
+    setLoading(true)
+    setError(null)
+    
+    try {
+      const response = await getPlanInsights(planId, budget)
+      if (response.success) {
+        return response.data
+      } else {
+        setError(response.error || 'Erreur lors de l\'analyse du plan')
+        return null
+      }
+    } catch (err) {
+      setError('Erreur de connexion à l\'IA')
+      return null
+    } finally {
+      setLoading(false)
+    }
+  }
+
   const regenerateDay = async (planId: number, dayOfWeek: string) => {
     setLoading(true)
     setError(null)
@@ -125,6 +146,7 @@ export const useAiFeatures = () => {
     getVariations,
     optimizeShopping,
     analyzePlanNutrition,
+    getInsights,
     regenerateDay,
     clearError: () => setError(null)
   }
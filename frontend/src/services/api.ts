@@ -156,7 +156,7 @@ export const getStatistics = async (): Promise<ApiResponse<Statistics>> => {
 export const generateShoppingList = async (planId: number): Promise<ApiResponse<string[]>> => {
   try {
     const response = await api.get(`/api/plans/${planId}/shopping-list`)
-    return { success: true, data: response.data }
+    return { success: true, data: response.data.items.map((item: { label: string }) => item.label) }
   } catch (error) {
     return { success: false, error: 'Erreur lors de la génération de la liste de courses' }
   }
@@ -176,6 +176,32 @@ export const generateAiPlan = async (planData: {
   }
 }
 
+export const previewAiPlan = async (planData: {
+  planName: string
+  weekStartDate: string
+  preferences: UserPreferences
+}): Promise<ApiResponse<any>> => {
+  try {
+    const response = await api.post('/api/ai/generate-plan', { ...planData, dryRun: true })
+    return { success: true, data: response.data }
+  } catch (error) {
+    return { success: false, error: 'Erreur lors de l\'aperçu du plan IA' }
+  }
+}
+
+export const acceptPlanPreview = async (planData: {
+  planName: string
+  weekStartDate: string
+  meals: any[]
+}): Promise<ApiResponse<any>> => {
+  try {
+    const response = await api.post('/api/plans/accept', planData)
+    return { success: true, data: response.data }
+  } catch (error) {
+    return { success: false, error: 'Erreur lors de l\'enregistrement du plan' }
+  }
+}
+
 export const getMealVariations = async (mealId: number): Promise<ApiResponse<any[]>> => {
   try {
     const response = await api.get(`/api/ai/meal-variations/${mealId}`)
@@ -203,6 +229,15 @@ export const analyzeNutrition = async (planId: number): Promise<ApiResponse<any>
   }
 }
 
+export const getPlanInsights = async (planId: number, budget?: number): Promise<ApiResponse<any>> => {
+  try {
+    const response = await api.get(`/api/ai/plan-insights/${planId}`, { params: { budget } })
+    return { success: true, data: response.data }
+  } catch (error) {
+    return { success: false, error: 'Erreur lors de l\'analyse du plan' }
+  }
+}
+
 export const regeneratePlanDay = async (planId: number, dayOfWeek: string): Promise<ApiResponse<any>> => {
   try {
     const response = await api.post(`/api/ai/regenerate-day/${planId}`, { day_of_week: dayOfWeek })
@@ -212,4 +247,27 @@ export const regeneratePlanDay = async (planId: number, dayOfWeek: string): Prom
   }
 }
 
+// Batch : plusieurs appels en un seul aller-retour (20 sous-requêtes au plus)
+export interface BatchRequest {
+  path: string
+  method?: string
+  body?: any
+  headers?: Record<string, string>
+}
+
+export interface BatchResult {
+  status: number
+  body: any
+  etag?: string
+}
+
+export const batchRequests = async (requests: BatchRequest[]): Promise<ApiResponse<BatchResult[]>> => {
+  try {
+    const response = await api.post('/api/batch', { requests })
+    return { success: true, data: response.data }
+  } catch (error) {
+    return { success: false, error: 'Erreur lors de l\'exécution du lot de requêtes' }
+  }
+}
+
 export default api